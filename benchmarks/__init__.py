@@ -0,0 +1,4 @@
+"""
+In-process benchmarks for the VTOP Clone request paths.
+Run from the project root, e.g. ``python -m benchmarks.asgi_vs_wsgi``.
+"""
@@ -0,0 +1,135 @@
+"""
+End-to-end load benchmark.
+
+    python -m benchmarks --server wsgi --users 200 --todos-per-user 50 \
+        --concurrency 16 --iterations 5 --output bench-wsgi.json
+
+Seeds a throwaway database with users x todos, then runs `concurrency`
+virtual students, each repeating the student flow `iterations` times against
+vtopclone.wsgi.application (thread pool) or vtopclone.asgi.application
+(asyncio tasks). Reports throughput, p50/p95/p99 latency, SQL queries and
+response bytes per request, overall and per step. Compare two result files
+with ``python -m benchmarks.compare``.
+"""
+import argparse
+import asyncio
+import datetime
+import json
+import platform
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from .flows import run_async, run_sync, student_flow
+from .harness import Recorder, seed, setup_django, teardown_django
+
+PASSWORD = "bench-pass-123"
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"],
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_wsgi(usernames, args):
+    from vtopclone.wsgi import application
+    from .drivers import WSGIClient
+
+    def worker(index):
+        recorder = Recorder()
+        for iteration in range(args.iterations):
+            username = usernames[(index + iteration * args.concurrency) % len(usernames)]
+            run_sync(WSGIClient(application), student_flow(username, PASSWORD), recorder)
+        return recorder
+
+    recorder = Recorder()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        for part in pool.map(worker, range(args.concurrency)):
+            recorder.merge(part)
+    return recorder
+
+
+def run_asgi(usernames, args):
+    from vtopclone.asgi import application
+    from .drivers import ASGIClient
+
+    async def worker(index, recorder):
+        for iteration in range(args.iterations):
+            username = usernames[(index + iteration * args.concurrency) % len(usernames)]
+            await run_async(ASGIClient(application), student_flow(username, PASSWORD), recorder)
+
+    async def main():
+        recorder = Recorder()
+        await asyncio.gather(*(worker(i, recorder) for i in range(args.concurrency)))
+        return recorder
+
+    return asyncio.run(main())
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="python -m benchmarks", description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--server", choices=["wsgi", "asgi"], default="wsgi")
+    parser.add_argument("--sync-views", action="store_true",
+                        help="Under --server asgi, keep the sync views (VTOP_ASYNC_VIEWS=0)")
+    parser.add_argument("--users", type=int, default=100)
+    parser.add_argument("--todos-per-user", type=int, default=25)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--iterations", type=int, default=3,
+                        help="Student flows per virtual student")
+    parser.add_argument("--hasher", choices=["fast", "default"], default="fast",
+                        help="'fast' uses MD5 so login measures the request path, not PBKDF2")
+    parser.add_argument("--label", default="", help="Free-form tag stored with the results")
+    parser.add_argument("--output", help="Write the JSON results to this file")
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    async_views = args.server == "asgi" and not args.sync_views
+    old_name = setup_django(async_views=async_views, hasher=args.hasher)
+    try:
+        seed_started = time.perf_counter()
+        usernames = seed(args.users, args.todos_per_user, PASSWORD)
+        seed_seconds = time.perf_counter() - seed_started
+
+        started = time.perf_counter()
+        recorder = (run_asgi if args.server == "asgi" else run_wsgi)(usernames, args)
+        elapsed = time.perf_counter() - started
+    finally:
+        teardown_django(old_name)
+
+    import django
+    results = {
+        "meta": {
+            "label": args.label,
+            "commit": git_commit(),
+            "timestamp": datetime.datetime.now(datetime.timezone.utc).isoformat(timespec="seconds"),
+            "server": args.server,
+            "async_views": async_views,
+            "users": args.users,
+            "todos_per_user": args.todos_per_user,
+            "concurrency": args.concurrency,
+            "iterations": args.iterations,
+            "hasher": args.hasher,
+            "seed_seconds": round(seed_seconds, 3),
+            "python": platform.python_version(),
+            "django": django.get_version(),
+        },
+        **recorder.report(elapsed),
+    }
+
+    text = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, "w") as handle:
+            handle.write(text + "\n")
+    print(text)
+    return 1 if results["overall"]["errors"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,46 @@
+"""
+Compare the sync (WSGI) and native async (ASGI) request paths.
+
+    python -m benchmarks.asgi_vs_wsgi --concurrency 16 --iterations 5
+
+ASYNC_VIEWS is read when settings load, so each mode runs the full student
+flow benchmark (python -m benchmarks) in its own process; the results are
+then printed side by side with the WSGI run as the baseline.
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+from .compare import render
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=100)
+    parser.add_argument("--todos-per-user", type=int, default=25)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--iterations", type=int, default=3)
+    args = parser.parse_args(argv)
+
+    results, paths = [], []
+    with tempfile.TemporaryDirectory() as tmp:
+        for server in ("wsgi", "asgi"):
+            path = os.path.join(tmp, f"{server}.json")
+            subprocess.run(
+                [sys.executable, "-m", "benchmarks", "--server", server, "--label", server,
+                 "--users", str(args.users), "--todos-per-user", str(args.todos_per_user),
+                 "--concurrency", str(args.concurrency), "--iterations", str(args.iterations),
+                 "--output", path],
+                check=True, stdout=subprocess.DEVNULL,
+            )
+            with open(path) as handle:
+                results.append(json.load(handle))
+            paths.append(path)
+    print(render(results, paths))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,63 @@
+"""
+Compare benchmark result files, e.g. from two commits.
+
+    python -m benchmarks.compare before.json after.json [more.json ...]
+
+The first file is the baseline; every other file is shown with its change
+relative to it.
+"""
+import json
+import sys
+
+COLUMNS = ("rps", "p50_ms", "p95_ms", "p99_ms", "queries_per_request", "bytes_per_request")
+
+
+def _delta(base, value):
+    if not base:
+        return ""
+    return f" ({(value - base) / base * 100:+.0f}%)"
+
+
+def _name(result, path):
+    meta = result["meta"]
+    return meta.get("label") or f"{meta.get('commit') or path}:{meta['server']}"
+
+
+def render(results, paths):
+    base = results[0]
+    lines = []
+    for step in [None] + list(base["steps"]):
+        lines.append(f"[{step or 'overall'}]")
+        lines.append(f"  {'run':<24}" + "".join(f"{c:>22}" for c in COLUMNS))
+        reference = base["overall"] if step is None else base["steps"][step]
+        for result, path in zip(results, paths):
+            data = result["overall"] if step is None else result["steps"].get(step)
+            if data is None:
+                continue
+            cells = []
+            for column in COLUMNS:
+                if column not in data:
+                    cells.append(f"{'-':>22}")
+                    continue
+                suffix = "" if result is base else _delta(reference.get(column), data[column])
+                cells.append(f"{str(data[column]) + suffix:>22}")
+            lines.append(f"  {_name(result, path)[:24]:<24}" + "".join(cells))
+        lines.append("")
+    return "\n".join(lines)
+
+
+def main(argv=None):
+    paths = (argv if argv is not None else sys.argv[1:])
+    if len(paths) < 2:
+        print(__doc__.strip())
+        return 2
+    results = []
+    for path in paths:
+        with open(path) as handle:
+            results.append(json.load(handle))
+    print(render(results, paths))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,181 @@
+"""
+Minimal in-process HTTP clients that call the real WSGI/ASGI callables
+(vtopclone.wsgi.application / vtopclone.asgi.application) with a cookie jar,
+so the full middleware stack, CSRF checks and session cookies are exercised.
+"""
+import asyncio
+import io
+import json
+import sys
+from http.cookies import SimpleCookie
+from typing import NamedTuple
+from urllib.parse import urlencode
+
+
+class Request(NamedTuple):
+    step: str
+    method: str
+    path: str
+    form: dict = None
+    json: object = None
+    expect: tuple = (200,)
+    headers: dict = None
+
+
+class Response(NamedTuple):
+    status: int
+    headers: dict
+    body: bytes
+
+    def json(self):
+        return json.loads(self.body)
+
+
+class _CookieJar:
+    def __init__(self):
+        self.cookies = {}
+
+    def header(self):
+        return "; ".join(f"{k}={v}" for k, v in self.cookies.items())
+
+    def update(self, set_cookie_values):
+        for value in set_cookie_values:
+            parsed = SimpleCookie()
+            parsed.load(value)
+            for name, morsel in parsed.items():
+                if morsel["max-age"] == "0" or "1970" in morsel["expires"]:
+                    self.cookies.pop(name, None)
+                else:
+                    self.cookies[name] = morsel.value
+
+
+def _encode(req):
+    if req.json is not None:
+        return json.dumps(req.json).encode(), "application/json"
+    if req.form is not None:
+        return urlencode(req.form).encode(), "application/x-www-form-urlencoded"
+    return b"", ""
+
+
+class WSGIClient:
+    def __init__(self, app):
+        self.app = app
+        self.jar = _CookieJar()
+
+    def request(self, req):
+        body, content_type = _encode(req)
+        path, _, query = req.path.partition("?")
+        environ = {
+            "REQUEST_METHOD": req.method,
+            "SCRIPT_NAME": "",
+            "PATH_INFO": path,
+            "QUERY_STRING": query,
+            "SERVER_NAME": "localhost",
+            "SERVER_PORT": "80",
+            "SERVER_PROTOCOL": "HTTP/1.1",
+            "REMOTE_ADDR": "127.0.0.1",
+            "HTTP_HOST": "localhost",
+            "CONTENT_TYPE": content_type,
+            "CONTENT_LENGTH": str(len(body)),
+            "wsgi.version": (1, 0),
+            "wsgi.url_scheme": "http",
+            "wsgi.input": io.BytesIO(body),
+            "wsgi.errors": sys.stderr,
+            "wsgi.multithread": True,
+            "wsgi.multiprocess": False,
+            "wsgi.run_once": False,
+        }
+        if self.jar.cookies:
+            environ["HTTP_COOKIE"] = self.jar.header()
+        if "csrftoken" in self.jar.cookies:
+            environ["HTTP_X_CSRFTOKEN"] = self.jar.cookies["csrftoken"]
+        for name, value in (req.headers or {}).items():
+            environ["HTTP_" + name.upper().replace("-", "_")] = value
+
+        captured = {}
+
+        def start_response(status, headers, exc_info=None):
+            captured["status"] = int(status.split(" ", 1)[0])
+            captured["headers"] = headers
+
+        result = self.app(environ, start_response)
+        try:
+            content = b"".join(result)
+        finally:
+            if hasattr(result, "close"):
+                result.close()
+
+        headers = {}
+        cookies = []
+        for name, value in captured["headers"]:
+            if name.lower() == "set-cookie":
+                cookies.append(value)
+            else:
+                headers[name.lower()] = value
+        self.jar.update(cookies)
+        return Response(captured["status"], headers, content)
+
+
+class ASGIClient:
+    def __init__(self, app):
+        self.app = app
+        self.jar = _CookieJar()
+
+    async def request(self, req):
+        body, content_type = _encode(req)
+        path, _, query = req.path.partition("?")
+        headers = [(b"host", b"localhost"), (b"content-length", str(len(body)).encode())]
+        if content_type:
+            headers.append((b"content-type", content_type.encode()))
+        if self.jar.cookies:
+            headers.append((b"cookie", self.jar.header().encode()))
+        if "csrftoken" in self.jar.cookies:
+            headers.append((b"x-csrftoken", self.jar.cookies["csrftoken"].encode()))
+        for name, value in (req.headers or {}).items():
+            headers.append((name.lower().encode(), value.encode()))
+        scope = {
+            "type": "http",
+            "asgi": {"version": "3.0"},
+            "http_version": "1.1",
+            "method": req.method,
+            "scheme": "http",
+            "path": path,
+            "raw_path": path.encode(),
+            "query_string": query.encode(),
+            "root_path": "",
+            "headers": headers,
+            "client": ("127.0.0.1", 50000),
+            "server": ("localhost", 80),
+        }
+
+        delivered = False
+
+        async def receive():
+            nonlocal delivered
+            if not delivered:
+                delivered = True
+                return {"type": "http.request", "body": body, "more_body": False}
+            # Never disconnect; Django cancels this wait once the response is sent
+            await asyncio.Future()
+
+        captured = {"body": []}
+
+        async def send(message):
+            if message["type"] == "http.response.start":
+                captured["status"] = message["status"]
+                captured["headers"] = message.get("headers", [])
+            elif message["type"] == "http.response.body":
+                captured["body"].append(message.get("body", b""))
+
+        await self.app(scope, receive, send)
+
+        response_headers = {}
+        cookies = []
+        for name, value in captured["headers"]:
+            name, value = name.decode("latin-1").lower(), value.decode("latin-1")
+            if name == "set-cookie":
+                cookies.append(value)
+            else:
+                response_headers[name] = value
+        self.jar.update(cookies)
+        return Response(captured["status"], response_headers, b"".join(captured["body"]))
@@ -0,0 +1,74 @@
+"""
+Realistic student sessions written as generators: each yields a Request and
+receives the Response, so the same flow drives the sync and async clients.
+"""
+import re
+import time
+
+from .drivers import Request
+from .harness import finish, measure
+
+_SID = re.compile(rb'data-sid="([^"]+)"')
+
+
+def student_flow(username, password):
+    """Log in, use the dashboard and to-do widget, open the ID pages, log out"""
+    yield Request("login_form", "GET", "/login/")
+    response = yield Request("login", "POST", "/login/",
+                             form={"username": username, "password": password}, expect=(302,))
+    if response.status != 302:
+        return
+
+    response = yield Request("dashboard", "GET", "/dashboard/")
+    match = _SID.search(response.body)
+    # What session.js hands back on every request from this tab
+    tab = {"X-Tab-Session": match.group(1).decode()} if match else {}
+
+    # The dashboard embeds the first to-do page, so the widget makes no
+    # initial /api/todos/ request
+    response = yield Request("todo_add", "POST", "/api/todos/add/", json={"text": "Submit lab record"})
+    if response.status != 200:
+        return
+    todo_id = response.json()["id"]
+    yield Request("todo_toggle", "POST", f"/api/todos/toggle/{todo_id}/")
+    yield Request("todos_list", "GET", "/api/todos/")
+    yield Request("todo_delete", "POST", f"/api/todos/delete/{todo_id}/")
+
+    yield Request("id_card", "GET", "/id-card/", headers=tab)
+    yield Request("credentials", "GET", "/credentials/", headers=tab)
+    yield Request("dashboard", "GET", "/dashboard/", headers=tab)
+    yield Request("logout", "GET", "/logout/", expect=(302,))
+
+
+def run_sync(client, flow, recorder):
+    response = None
+    while True:
+        try:
+            req = flow.send(response)
+        except StopIteration:
+            return
+        stats, token = measure()
+        start = time.perf_counter()
+        try:
+            response = client.request(req)
+        finally:
+            finish(token)
+        recorder.add(req.step, time.perf_counter() - start, stats,
+                     len(response.body), response.status in req.expect)
+
+
+async def run_async(client, flow, recorder):
+    response = None
+    while True:
+        try:
+            req = flow.send(response)
+        except StopIteration:
+            return
+        stats, token = measure()
+        start = time.perf_counter()
+        try:
+            response = await client.request(req)
+        finally:
+            finish(token)
+        recorder.add(req.step, time.perf_counter() - start, stats,
+                     len(response.body), response.status in req.expect)
@@ -0,0 +1,156 @@
+"""
+Benchmark plumbing: throwaway database, dataset seeding, per-request SQL
+accounting and latency statistics.
+"""
+import math
+import os
+import tempfile
+
+# Hashers used with --hasher fast. Login still runs authenticate() end to end,
+# just without spending ~0.5s of PBKDF2 per sign-in.
+FAST_HASHERS = ["django.contrib.auth.hashers.MD5PasswordHasher"]
+
+
+def measure():
+    """
+    Start attributing queries to fresh stats; returns (stats, token). Uses
+    core.metrics' counter, whose stats nest, so queries made inside a
+    request MetricsMiddleware is measuring count here too. asgiref copies
+    contextvars into sync_to_async threads, so queries issued from the
+    async handler are attributed to the right request as well.
+    """
+    from core.metrics import track_queries
+    return track_queries()
+
+
+def finish(token):
+    from core.metrics import untrack_queries
+    untrack_queries(token)
+
+
+def setup_django(async_views, hasher="fast"):
+    """
+    Configure Django against a temporary SQLite file and return the name of
+    the real database so teardown_django() can restore it.
+    """
+    os.environ["DJANGO_SETTINGS_MODULE"] = "vtopclone.settings"
+    os.environ["VTOP_ASYNC_VIEWS"] = "1" if async_views else "0"
+
+    import django
+    django.setup()
+
+    from django.conf import settings
+    from django.db import connection
+    from django.test.utils import setup_test_environment
+
+    from core.metrics import install_query_counter
+
+    setup_test_environment()
+    settings.ALLOWED_HOSTS = ["localhost"]
+    if hasher == "fast":
+        settings.PASSWORD_HASHERS = FAST_HASHERS
+
+    # Every virtual student logs in from 127.0.0.1; keep the per-IP login
+    # throttle out of the measurements and its counters out of later runs.
+    from core.login_admission import throttle
+    throttle.alias = "default"
+    throttle.ip_limit = (10 ** 9, 60)
+
+    # A file database: shared-cache :memory: SQLite takes table-level locks
+    # that fail outright under concurrent threads instead of waiting.
+    connection.settings_dict["TEST"]["NAME"] = os.path.join(
+        tempfile.gettempdir(), f"vtop_bench_{os.getpid()}.sqlite3")
+    old_name = connection.settings_dict["NAME"]
+    connection.creation.create_test_db(verbosity=0, autoclobber=True)
+
+    # Every thread opens its own connection; count queries on all of them
+    install_query_counter()
+    return old_name
+
+
+def teardown_django(old_name):
+    from django.db import connection
+
+    # The activity writer thread holds its own connection to the test database
+    from core.activity import activity_log
+    activity_log.close()
+    connection.creation.destroy_test_db(old_name, verbosity=0)
+
+
+def seed(users, todos_per_user, password):
+    """Create users x todos_per_user rows; returns the usernames"""
+    from django.contrib.auth.hashers import make_password
+    from django.contrib.auth.models import User
+    from django.db import transaction
+
+    from core.models import StudentCredentials, ToDo, build_credentials
+
+    hashed = make_password(password)
+    usernames = [f"21BCE{i:05d}" for i in range(users)]
+    with transaction.atomic():
+        created = User.objects.bulk_create([User(username=name, password=hashed) for name in usernames])
+        StudentCredentials.objects.bulk_create([build_credentials(user) for user in created])
+        ToDo.objects.bulk_create(
+            [
+                ToDo(user=user, text=f"Task {j} for {user.username}", is_done=j % 3 == 0)
+                for user in created
+                for j in range(todos_per_user)
+            ],
+            batch_size=2000,
+        )
+    return usernames
+
+
+def percentile(samples, pct):
+    """Nearest-rank percentile of an unsorted sample list"""
+    ordered = sorted(samples)
+    if not ordered:
+        return 0.0
+    k = min(len(ordered) - 1, max(0, math.ceil(pct / 100 * len(ordered)) - 1))
+    return ordered[k]
+
+
+class Recorder:
+    """Collects latency, SQL and payload size per flow step"""
+
+    def __init__(self):
+        self.samples = {}
+        self.errors = 0
+
+    def add(self, step, seconds, stats, size, ok):
+        self.samples.setdefault(step, []).append((seconds, stats.queries, stats.db_seconds, size))
+        if not ok:
+            self.errors += 1
+
+    def merge(self, other):
+        for step, rows in other.samples.items():
+            self.samples.setdefault(step, []).extend(rows)
+        self.errors += other.errors
+
+    @staticmethod
+    def summarize(rows, elapsed=None):
+        latencies = [row[0] for row in rows]
+        n = len(rows)
+        summary = {
+            "requests": n,
+            "mean_ms": round(sum(latencies) / n * 1000, 3) if n else 0.0,
+            "p50_ms": round(percentile(latencies, 50) * 1000, 3),
+            "p95_ms": round(percentile(latencies, 95) * 1000, 3),
+            "p99_ms": round(percentile(latencies, 99) * 1000, 3),
+            "queries_per_request": round(sum(row[1] for row in rows) / n, 2) if n else 0.0,
+            "sql_ms_per_request": round(sum(row[2] for row in rows) / n * 1000, 3) if n else 0.0,
+            "bytes_per_request": round(sum(row[3] for row in rows) / n, 1) if n else 0.0,
+        }
+        if elapsed is not None:
+            summary["seconds"] = round(elapsed, 3)
+            summary["rps"] = round(n / elapsed, 1) if elapsed else 0.0
+        return summary
+
+    def report(self, elapsed):
+        everything = [row for rows in self.samples.values() for row in rows]
+        overall = self.summarize(everything, elapsed)
+        overall["errors"] = self.errors
+        return {
+            "overall": overall,
+            "steps": {step: self.summarize(rows) for step, rows in sorted(self.samples.items())},
+        }
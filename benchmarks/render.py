@@ -0,0 +1,102 @@
+"""
+Dashboard render-time comparison.
+
+    python -m benchmarks.render --iterations 2000
+
+Renders core/dashboard.html (with base.html) for a seeded student under
+three template setups and reports per-render latency:
+
+- uncached:   filesystem/app loaders, fragment cache disabled (template is
+              re-read and re-compiled on every render)
+- loader:     cached template loader, fragment cache disabled
+- fragments:  cached loader plus the {% cache %} fragments (current settings)
+
+Only template work is timed; the student is loaded once up front.
+"""
+import argparse
+import time
+
+from .harness import percentile, seed, setup_django, teardown_django
+
+DUMMY_FRAGMENTS = {"BACKEND": "django.core.cache.backends.dummy.DummyCache"}
+
+
+def _time_renders(template, make_context, iterations):
+    samples = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        template().render(make_context())
+        samples.append(time.perf_counter() - start)
+    return samples
+
+
+def run(iterations):
+    from django.conf import settings
+    from django.contrib.auth.models import User
+    from django.template import RequestContext, engines
+    from django.template.engine import Engine
+    from django.test import RequestFactory
+    from django.test.utils import override_settings
+
+    from core.student import StudentContext
+
+    seed(1, 0, "render-pass-123")
+    user = User.objects.select_related("studentcredentials").get()
+    student = StudentContext(user, user.studentcredentials)
+
+    request = RequestFactory().get("/dashboard/")
+    request.user = user
+
+    def make_context():
+        return RequestContext(request, {"user": student.user, "creds": student.creds})
+
+    cached = engines["django"].engine
+    uncached = Engine(
+        dirs=cached.dirs,
+        loaders=[
+            "django.template.loaders.filesystem.Loader",
+            "django.template.loaders.app_directories.Loader",
+        ],
+        context_processors=cached.context_processors,
+        libraries=cached.libraries,
+        debug=cached.debug,
+    )
+
+    caches = {**settings.CACHES, "fragments": DUMMY_FRAGMENTS}
+    results = {}
+    with override_settings(CACHES=caches):
+        results["uncached"] = _time_renders(
+            lambda: uncached.get_template("core/dashboard.html"), make_context, iterations)
+        results["loader"] = _time_renders(
+            lambda: cached.get_template("core/dashboard.html"), make_context, iterations)
+    results["fragments"] = _time_renders(
+        lambda: cached.get_template("core/dashboard.html"), make_context, iterations)
+    return results
+
+
+def render(results):
+    base = sum(results["uncached"]) / len(results["uncached"])
+    lines = [f"{'setup':<12}{'mean_us':>10}{'p50_us':>10}{'p99_us':>10}{'speedup':>10}"]
+    for name, samples in results.items():
+        mean = sum(samples) / len(samples)
+        lines.append(
+            f"{name:<12}{mean * 1e6:>10.1f}{percentile(samples, 50) * 1e6:>10.1f}"
+            f"{percentile(samples, 99) * 1e6:>10.1f}{base / mean:>9.1f}x"
+        )
+    return "\n".join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--iterations", type=int, default=2000)
+    args = parser.parse_args(argv)
+
+    old_name = setup_django(async_views=False)
+    try:
+        print(render(run(args.iterations)))
+    finally:
+        teardown_django(old_name)
+
+
+if __name__ == "__main__":
+    main()
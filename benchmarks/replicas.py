@@ -0,0 +1,165 @@
+"""
+Read-replica scaling benchmark.
+
+    python -m benchmarks.replicas --max-replicas 2 --readers 8 --writers 2 --seconds 10
+
+Runs the same workload with 0, 1, ... --max-replicas read replicas (temporary
+SQLite copies of the seeded primary, configured through VTOP_READ_REPLICAS),
+each in its own process: reader threads do what a dashboard request reads
+(student credentials plus the first to-do page) while writer threads keep
+adding and toggling to-dos on the primary. Every operation runs in the
+routing context a request would get, so PrimaryReplicaRouter picks the
+database exactly as it does for real traffic. Reports read and write
+throughput, read latency and how reads were spread over the databases.
+"""
+import argparse
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+
+from .harness import percentile, seed, setup_django, teardown_django
+
+
+def run_replicas(args):
+    old_name = setup_django(async_views=False)
+    from django.contrib.auth.models import User
+    from django.db import close_old_connections, connections, transaction
+    from django.db.backends.signals import connection_created
+
+    from core.models import StudentCredentials, ToDo
+    from core.replicas import READ_REPLICAS, _routing, _RoutingState, sync_replica
+    from core.todos import page_query
+
+    reads_by_alias = Counter()
+    lock = threading.Lock()
+
+    def count_alias(execute, sql, params, many, context):
+        if sql.lstrip().upper().startswith("SELECT"):
+            with lock:
+                reads_by_alias[context["connection"].alias] += 1
+        return execute(sql, params, many, context)
+
+    def install(sender=None, connection=None, **kwargs):
+        if count_alias not in connection.execute_wrappers:
+            connection.execute_wrappers.append(count_alias)
+
+    try:
+        seed(args.users, args.todos_per_user, "replica-pass-123")
+        for alias in READ_REPLICAS:
+            sync_replica(alias)
+        user_ids = list(User.objects.values_list("id", flat=True))
+        connection_created.connect(install)
+
+        deadline = time.perf_counter() + args.seconds
+        results = {"readers": [], "writers": []}
+
+        def read_once(rng):
+            user_id = rng.choice(user_ids)
+            StudentCredentials.objects.select_related("user").filter(user_id=user_id).first()
+            list(page_query(user_id, None, 50))
+
+        def write_once(rng):
+            user_id = rng.choice(user_ids)
+            with transaction.atomic():
+                todo = ToDo.objects.alive().filter(user_id=user_id).order_by("?").first()
+                if todo is not None:
+                    todo.is_done = not todo.is_done
+                    todo.save(update_fields=["is_done", "updated_at"])
+                ToDo.objects.create(user_id=user_id, text="Replica bench task")
+
+        def worker(kind, operation, seed_value):
+            rng = random.Random(seed_value)
+            latencies = []
+            while time.perf_counter() < deadline:
+                close_old_connections()
+                token = _routing.set(_RoutingState(pinned=False))
+                start = time.perf_counter()
+                try:
+                    operation(rng)
+                finally:
+                    _routing.reset(token)
+                latencies.append(time.perf_counter() - start)
+            connections.close_all()
+            with lock:
+                results[kind].append(latencies)
+
+        threads = [threading.Thread(target=worker, args=("readers", read_once, i)) for i in range(args.readers)]
+        threads += [threading.Thread(target=worker, args=("writers", write_once, -i - 1)) for i in range(args.writers)]
+        start = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - start
+
+        report = {"replicas": len(READ_REPLICAS), "reads_by_alias": dict(reads_by_alias)}
+        for kind, parts in results.items():
+            latencies = [value for part in parts for value in part]
+            report[kind] = {
+                "ops_per_sec": round(len(latencies) / elapsed, 1),
+                "p50_ms": round(percentile(latencies, 50) * 1000, 3),
+                "p99_ms": round(percentile(latencies, 99) * 1000, 3),
+            }
+        return report
+    finally:
+        connections.close_all()
+        for alias in READ_REPLICAS:
+            path = connections[alias].settings_dict["NAME"]
+            for suffix in ("", "-wal", "-shm"):
+                if os.path.exists(path + suffix):
+                    os.remove(path + suffix)
+        teardown_django(old_name)
+
+
+def render(reports):
+    base = reports[0]
+    lines = [f"{'replicas':<10}{'reads/s':>12}{'read p50_ms':>14}{'read p99_ms':>14}"
+             f"{'writes/s':>12}{'read change':>14}  reads by database"]
+    for r in reports:
+        change = (r["readers"]["ops_per_sec"] - base["readers"]["ops_per_sec"]) / base["readers"]["ops_per_sec"] * 100
+        spread = ", ".join(f"{alias}={count}" for alias, count in sorted(r["reads_by_alias"].items()))
+        lines.append(
+            f"{r['replicas']:<10}{r['readers']['ops_per_sec']:>12}{r['readers']['p50_ms']:>14}"
+            f"{r['readers']['p99_ms']:>14}{r['writers']['ops_per_sec']:>12}{change:>+13.1f}%  {spread}"
+        )
+    return "\n".join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--max-replicas", type=int, default=2)
+    parser.add_argument("--readers", type=int, default=8)
+    parser.add_argument("--writers", type=int, default=2)
+    parser.add_argument("--seconds", type=float, default=10.0)
+    parser.add_argument("--users", type=int, default=50)
+    parser.add_argument("--todos-per-user", type=int, default=50)
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.child:
+        # Child process: the replicas were configured when settings loaded
+        print(json.dumps(run_replicas(args)))
+        return
+
+    reports = []
+    for count in range(args.max_replicas + 1):
+        paths = [os.path.join(tempfile.gettempdir(), f"vtop_replica_{os.getpid()}_{n}.sqlite3")
+                 for n in range(1, count + 1)]
+        out = subprocess.run(
+            [sys.executable, "-m", "benchmarks.replicas", "--child",
+             *(argv if argv is not None else sys.argv[1:])],
+            env={**os.environ, "VTOP_READ_REPLICAS": ",".join(paths)},
+            check=True, capture_output=True, text=True,
+        ).stdout
+        reports.append(json.loads(out.strip().splitlines()[-1]))
+    print(render(reports))
+
+
+if __name__ == "__main__":
+    main()
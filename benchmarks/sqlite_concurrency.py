@@ -0,0 +1,151 @@
+"""
+SQLite write-contention stress test.
+
+    python -m benchmarks.sqlite_concurrency --writers 8 --readers 8 --seconds 10
+
+Runs the same mixed workload against each SQLite profile (settings
+SQLITE_PROFILE, chosen via VTOP_SQLITE_PROFILE) in its own process:
+writer threads add/toggle to-dos and save sessions inside transactions the
+way the views do, while reader threads list to-dos. Every operation closes
+stale connections first, like a request boundary. Reports ops/s, p50/p99
+latency and "database is locked" failures, with the stock rollback-journal
+profile as the baseline.
+"""
+import argparse
+import json
+import os
+import random
+import subprocess
+import sys
+import threading
+import time
+
+from .harness import percentile, seed, setup_django, teardown_django
+
+PROFILES = ("default", "concurrent")
+
+
+def _summary(latencies, locked, elapsed):
+    return {
+        "ops": len(latencies),
+        "ops_per_sec": round(len(latencies) / elapsed, 1) if elapsed else 0.0,
+        "p50_ms": round(percentile(latencies, 50) * 1000, 3),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 3),
+        "locked": locked,
+    }
+
+
+def run_profile(args):
+    old_name = setup_django(async_views=False)
+    from django.contrib.auth.models import User
+    from django.contrib.sessions.backends.db import SessionStore
+    from django.db import OperationalError, close_old_connections, connection, transaction
+
+    from core.models import ToDo
+    from core.todos import page_query
+
+    try:
+        seed(args.users, args.todos_per_user, "stress-pass-123")
+        user_ids = list(User.objects.values_list("id", flat=True))
+        journal = connection.cursor().execute("PRAGMA journal_mode").fetchone()[0]
+
+        deadline = time.perf_counter() + args.seconds
+        results = {"writers": [], "readers": []}
+        lock = threading.Lock()
+
+        def write_once(rng):
+            user_id = rng.choice(user_ids)
+            with transaction.atomic():
+                # Read-then-write, like toggle_todo: under DEFERRED the lock
+                # upgrade is where SQLite gives up instead of waiting.
+                todo = ToDo.objects.alive().filter(user_id=user_id).order_by("?").first()
+                if todo is not None:
+                    todo.is_done = not todo.is_done
+                    todo.save(update_fields=["is_done", "updated_at"])
+                ToDo.objects.create(user_id=user_id, text="Stress task")
+            session = SessionStore()
+            session["tab_session_id"] = str(rng.random())
+            session.save()
+
+        def read_once(rng):
+            list(page_query(rng.choice(user_ids), None, 200))
+
+        def worker(kind, operation, seed_value):
+            rng = random.Random(seed_value)
+            latencies, locked = [], 0
+            while time.perf_counter() < deadline:
+                close_old_connections()
+                start = time.perf_counter()
+                try:
+                    operation(rng)
+                except OperationalError as exc:
+                    if "locked" not in str(exc):
+                        raise
+                    locked += 1
+                    continue
+                latencies.append(time.perf_counter() - start)
+            connection.close()
+            with lock:
+                results[kind].append((latencies, locked))
+
+        threads = [threading.Thread(target=worker, args=("writers", write_once, i)) for i in range(args.writers)]
+        threads += [threading.Thread(target=worker, args=("readers", read_once, -i - 1)) for i in range(args.readers)]
+        start = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - start
+
+        report = {"profile": os.environ.get("VTOP_SQLITE_PROFILE"), "journal_mode": journal}
+        for kind, parts in results.items():
+            latencies = [value for part, _ in parts for value in part]
+            report[kind] = _summary(latencies, sum(locked for _, locked in parts), elapsed)
+        return report
+    finally:
+        teardown_django(old_name)
+
+
+def render(reports):
+    base = reports[0]
+    lines = [f"{'':<28}" + "".join(f"{r['profile']:>16}" for r in reports) + f"{'change':>12}"]
+    lines.append(f"{'journal_mode':<28}" + "".join(f"{r['journal_mode']:>16}" for r in reports))
+    for kind in ("writers", "readers"):
+        for metric in ("ops_per_sec", "p50_ms", "p99_ms", "locked"):
+            values = [r[kind][metric] for r in reports]
+            change = ""
+            if base[kind][metric]:
+                change = f"{(values[-1] - base[kind][metric]) / base[kind][metric] * 100:+.1f}%"
+            lines.append(f"{kind + ' ' + metric:<28}" + "".join(f"{v:>16}" for v in values) + f"{change:>12}")
+    return "\n".join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--writers", type=int, default=8)
+    parser.add_argument("--readers", type=int, default=8)
+    parser.add_argument("--seconds", type=float, default=10.0)
+    parser.add_argument("--users", type=int, default=50)
+    parser.add_argument("--todos-per-user", type=int, default=50)
+    parser.add_argument("--profile", choices=PROFILES, help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.profile:
+        # Child process: the profile was already applied when settings loaded
+        print(json.dumps(run_profile(args)))
+        return
+
+    reports = []
+    for profile in PROFILES:
+        out = subprocess.run(
+            [sys.executable, "-m", "benchmarks.sqlite_concurrency", "--profile", profile,
+             *(argv if argv is not None else sys.argv[1:])],
+            env={**os.environ, "VTOP_SQLITE_PROFILE": profile},
+            check=True, capture_output=True, text=True,
+        ).stdout
+        reports.append(json.loads(out.strip().splitlines()[-1]))
+    print(render(reports))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,185 @@
+"""
+Buffered activity / audit log.
+
+Views call record() (or log_event()), which only puts a tuple on a bounded
+in-process queue and never touches the database. A background writer
+thread drains the queue and stores the events with one bulk_create per
+batch, either when ACTIVITY_LOG_BATCH_SIZE events are waiting or
+ACTIVITY_LOG_FLUSH_INTERVAL seconds after the first one arrived, so the
+audit trail costs SQLite one write transaction per batch instead of one
+per request.
+
+When the queue is full (the writer cannot keep up or the database is
+locked for long) new events are dropped and counted rather than making
+requests wait. Remaining events are written on interpreter exit. Counters
+are exported on /metrics/.
+"""
+import atexit
+import logging
+import os
+import queue
+import threading
+import time
+
+from django.conf import settings
+from django.db import close_old_connections, connection, transaction
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+_STOP = object()
+
+
+class _Flush:
+    def __init__(self):
+        self.done = threading.Event()
+
+
+class ActivityLog:
+    def __init__(self, queue_size, batch_size, flush_interval, enabled=True):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.enabled = enabled
+        self._queue = queue.Queue(queue_size)
+        self._lock = threading.Lock()
+        self._thread = None
+        self._pid = None
+        self.recorded = 0
+        self.dropped = 0
+        self.written = 0
+        self.batches = 0
+        self.failed = 0
+
+    def record(self, action, user_id=None, ip=None, detail=""):
+        """Queue one event; never blocks and never raises"""
+        if not self.enabled:
+            return
+        self._ensure_writer()
+        try:
+            self._queue.put_nowait((action, user_id, ip or None, detail[:255], timezone.now()))
+        except queue.Full:
+            with self._lock:
+                self.dropped += 1
+            return
+        with self._lock:
+            self.recorded += 1
+
+    def _ensure_writer(self):
+        # Started on first use, and again in a forked worker process
+        if self._thread is not None and self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._thread is not None and self._pid == os.getpid():
+                return
+            if self._pid != os.getpid():
+                # Inherited from the parent: not ours to drain
+                self._queue = queue.Queue(self._queue.maxsize)
+            self._pid = os.getpid()
+            self._thread = threading.Thread(target=self._run, name="activity-log-writer", daemon=True)
+            self._thread.start()
+
+    def flush(self, timeout=5.0):
+        """Block until everything queued so far is written (tests, benchmarks)"""
+        if self._thread is None or self._pid != os.getpid():
+            return True
+        marker = _Flush()
+        try:
+            self._queue.put(marker, timeout=timeout)
+        except queue.Full:
+            return False
+        return marker.done.wait(timeout)
+
+    def close(self, timeout=5.0):
+        """Write what is queued and stop the writer"""
+        if self._thread is None or self._pid != os.getpid():
+            return
+        try:
+            self._queue.put(_STOP, timeout=timeout)
+        except queue.Full:
+            pass
+        self._thread.join(timeout)
+        self._thread = None
+
+    def _run(self):
+        batch, deadline = [], None
+        try:
+            while True:
+                timeout = None if deadline is None else max(0.0, deadline - time.monotonic())
+                try:
+                    item = self._queue.get(timeout=timeout)
+                except queue.Empty:
+                    item = None
+
+                if item is None or item is _STOP or isinstance(item, _Flush):
+                    self._write(batch)
+                    batch, deadline = [], None
+                    if isinstance(item, _Flush):
+                        item.done.set()
+                    if item is _STOP:
+                        return
+                    continue
+
+                batch.append(item)
+                if deadline is None:
+                    deadline = time.monotonic() + self.flush_interval
+                if len(batch) >= self.batch_size:
+                    self._write(batch)
+                    batch, deadline = [], None
+        finally:
+            connection.close()
+
+    def _write(self, batch):
+        if not batch:
+            return
+        from .models import ActivityEvent
+
+        close_old_connections()
+        events = [
+            ActivityEvent(action=action, user_id=user_id, ip=ip, detail=detail, created_at=created_at)
+            for action, user_id, ip, detail, created_at in batch
+        ]
+        try:
+            with transaction.atomic():
+                ActivityEvent.objects.bulk_create(events)
+        except Exception:
+            logger.exception("Dropping %d activity events", len(events))
+            with self._lock:
+                self.failed += len(events)
+            return
+        with self._lock:
+            self.written += len(events)
+            self.batches += 1
+
+    def stats(self):
+        with self._lock:
+            return {
+                "queued": self._queue.qsize(),
+                "recorded": self.recorded,
+                "dropped": self.dropped,
+                "written": self.written,
+                "batches": self.batches,
+                "failed": self.failed,
+            }
+
+
+activity_log = ActivityLog(
+    queue_size=getattr(settings, "ACTIVITY_LOG_QUEUE_SIZE", 10000),
+    batch_size=getattr(settings, "ACTIVITY_LOG_BATCH_SIZE", 500),
+    flush_interval=getattr(settings, "ACTIVITY_LOG_FLUSH_INTERVAL", 1.0),
+    enabled=getattr(settings, "ACTIVITY_LOG_ENABLED", True),
+)
+atexit.register(activity_log.close)
+
+
+def log_event(request, action, detail="", user_id=None):
+    """record() for the current request's user and client address"""
+    if user_id is None:
+        user = getattr(request, "user", None)
+        user_id = user.pk if user is not None and user.is_authenticated else None
+    activity_log.record(action, user_id, request.META.get("REMOTE_ADDR"), detail)
+
+
+def recent_events(user_id, limit=50):
+    """Last limit events for a user, newest first (activity_user_created_idx)"""
+    from .models import ActivityEvent
+    return ActivityEvent.objects.filter(user_id=user_id).order_by("-created_at", "-id")[:limit]
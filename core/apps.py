@@ -4,3 +4,17 @@ from django.apps import AppConfig
 class CoreConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'core'
+
+    def ready(self):
+        from django.conf import settings
+        from django.db.models.signals import post_migrate
+        if 'core.metrics.MetricsMiddleware' in settings.MIDDLEWARE:
+            from .metrics import install_query_counter
+            install_query_counter()
+        post_migrate.connect(restore_search_triggers, sender=self)
+
+
+def restore_search_triggers(sender, using, **kwargs):
+    """Table rebuilds during migrate drop core_todo's FTS triggers; put them back"""
+    from .search import install_triggers
+    install_triggers(using)
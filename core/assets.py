@@ -0,0 +1,207 @@
+"""
+Fingerprinted, precompressed static bundles.
+
+`python manage.py build_assets` minifies and concatenates the sources of each
+bundle in BUNDLES, names the result after its content hash and writes it,
+plus a gzipped copy, into settings.ASSETS_ROOT together with manifest.json.
+Templates reference bundles with {% asset_tags %}, which points at the
+hashed file when a manifest exists and falls back to the individual source
+files under STATIC_URL otherwise (a fresh checkout, or while editing JS).
+
+Hashed files never change, so serve_asset() marks them immutable for a year
+and hands out the .gz copy to clients that accept gzip; a repeat visit then
+costs no asset requests at all. A front-end server can do the same straight
+from ASSETS_ROOT (e.g. nginx `gzip_static on`).
+"""
+import gzip
+import hashlib
+import json
+import mimetypes
+import os
+import re
+import threading
+
+from django.conf import settings
+from django.contrib.staticfiles import finders
+from django.http import Http404, HttpResponse
+from django.templatetags.static import static
+from django.urls import reverse
+from django.utils.html import format_html_join
+from django.views.decorators.http import require_safe
+
+# Bundle name -> source files (static paths), concatenated in this order
+BUNDLES = {
+    "base.css": ["core/css/style.css"],
+    "base.js": ["core/js/darkmode.js"],
+    "dashboard.js": ["core/js/todo.js", "core/js/dashboard.js", "core/js/sidebar.js"],
+    "session.js": ["core/js/session.js"],
+}
+
+MANIFEST_NAME = "manifest.json"
+IMMUTABLE = "public, max-age=31536000, immutable"
+
+_ACCEPTS_GZIP = re.compile(r"\bgzip\b")
+# What hashed_name() produces; no separators, so it cannot leave ASSETS_ROOT
+_HASHED_NAME = re.compile(r"[\w-]+\.[0-9a-f]{12}\.(?:js|css)")
+_CSS_TOKENS = re.compile(r'("(?:\\.|[^"\\])*"|\'(?:\\.|[^\'\\])*\')|/\*.*?\*/|\s+', re.S)
+_CSS_PUNCT = re.compile(r"\s*([{};,>])\s*")
+
+
+def minify_css(source):
+    """Drop comments and redundant whitespace, leaving string literals alone"""
+    def token(match):
+        if match.group(1):
+            return match.group(1)
+        return "" if match.group(0).startswith("/*") else " "
+
+    parts = re.split(r'("(?:\\.|[^"\\])*"|\'(?:\\.|[^\'\\])*\')', _CSS_TOKENS.sub(token, source))
+    # Even indexes are outside strings. A space before ':' is kept, since
+    # "a :hover" and "a:hover" are different selectors.
+    for i in range(0, len(parts), 2):
+        parts[i] = _CSS_PUNCT.sub(r"\1", parts[i]).replace(": ", ":").replace(";}", "}")
+    return "".join(parts).strip()
+
+
+def minify_js(source):
+    """
+    Conservative line-level minification: strip indentation, blank lines and
+    whole-line // comments. Line breaks stay so automatic semicolon insertion
+    behaves exactly as in the source.
+    """
+    lines = (line.strip() for line in source.splitlines())
+    return "\n".join(line for line in lines if line and not line.startswith("//"))
+
+
+def _read_source(path):
+    found = finders.find(path)
+    if not found:
+        raise FileNotFoundError(f"Static file not found: {path}")
+    with open(found, encoding="utf-8") as handle:
+        return handle.read()
+
+
+def build_bundle(name, sources):
+    """Minified, concatenated bundle content for name"""
+    if name.endswith(".css"):
+        return "\n".join(minify_css(_read_source(path)) for path in sources)
+    # A leading ';' guards against a file that ends without one
+    return "\n;".join(minify_js(_read_source(path)) for path in sources)
+
+
+def hashed_name(name, content):
+    stem, ext = os.path.splitext(name)
+    digest = hashlib.sha256(content).hexdigest()[:12]
+    return f"{stem}.{digest}{ext}"
+
+
+def build_all(root=None, bundles=BUNDLES):
+    """
+    Write every bundle and its .gz twin into root and replace the manifest.
+    Files from earlier builds are left in place, so pages rendered before a
+    deploy keep working. Returns [(bundle, filename, source, minified, gzipped)] sizes.
+    """
+    root = root or settings.ASSETS_ROOT
+    os.makedirs(root, exist_ok=True)
+    manifest, report = {}, []
+    for name, sources in bundles.items():
+        source_size = sum(len(_read_source(path).encode("utf-8")) for path in sources)
+        content = build_bundle(name, sources).encode("utf-8")
+        filename = hashed_name(name, content)
+        # mtime=0 keeps the .gz byte-identical across builds
+        compressed = gzip.compress(content, compresslevel=9, mtime=0)
+        for path, data in ((filename, content), (filename + ".gz", compressed)):
+            with open(os.path.join(root, path), "wb") as handle:
+                handle.write(data)
+        manifest[name] = filename
+        report.append((name, filename, source_size, len(content), len(compressed)))
+
+    tmp = os.path.join(root, MANIFEST_NAME + ".tmp")
+    with open(tmp, "w") as handle:
+        json.dump({"bundles": manifest}, handle, indent=2, sort_keys=True)
+    os.replace(tmp, os.path.join(root, MANIFEST_NAME))
+    _manifest.clear()
+    return report
+
+
+_manifest = {}
+_manifest_lock = threading.Lock()
+
+
+def load_manifest():
+    """
+    Bundle name -> hashed filename, or {} before the first build. Read once
+    per process; with DEBUG on, a rebuild is picked up without a restart.
+    """
+    path = os.path.join(settings.ASSETS_ROOT, MANIFEST_NAME)
+    if _manifest and not settings.DEBUG:
+        return _manifest["bundles"]
+    try:
+        mtime = os.stat(path).st_mtime
+    except FileNotFoundError:
+        return {}
+    with _manifest_lock:
+        if _manifest.get("mtime") != mtime:
+            with open(path) as handle:
+                _manifest["bundles"] = json.load(handle)["bundles"]
+            _manifest["mtime"] = mtime
+        return _manifest["bundles"]
+
+
+def asset_urls(name):
+    """URLs to load bundle name: the hashed bundle if built, else its sources"""
+    filename = load_manifest().get(name)
+    if filename:
+        return [reverse("asset", args=[filename])]
+    return [static(path) for path in BUNDLES[name]]
+
+
+def asset_tags(name):
+    urls = asset_urls(name)
+    if name.endswith(".css"):
+        return format_html_join("\n", '<link rel="stylesheet" href="{}" />', ((url,) for url in urls))
+    return format_html_join("\n", '<script src="{}"></script>', ((url,) for url in urls))
+
+
+def asset_url(name):
+    """Single URL for a one-file bundle (used for the injected session.js)"""
+    return asset_urls(name)[0]
+
+
+# Hashed filename -> (body, gzipped body). Content never changes for a
+# given name, so entries never need invalidating.
+_bodies = {}
+
+
+def _load_body(filename):
+    # Any build's files, not only the current manifest's: pages rendered
+    # before a rebuild still reference the previous bundles
+    body = _bodies.get(filename)
+    if body is None:
+        if not _HASHED_NAME.fullmatch(filename):
+            return None
+        root = settings.ASSETS_ROOT
+        try:
+            with open(os.path.join(root, filename), "rb") as plain, \
+                    open(os.path.join(root, filename + ".gz"), "rb") as packed:
+                body = _bodies[filename] = (plain.read(), packed.read())
+        except FileNotFoundError:
+            return None
+    return body
+
+
+@require_safe
+def serve_asset(request, filename):
+    """Serve a built bundle with far-future caching"""
+    body = _load_body(filename)
+    if body is None:
+        raise Http404("Unknown asset")
+    plain, packed = body
+    content_type = mimetypes.guess_type(filename)[0] or "application/octet-stream"
+    if _ACCEPTS_GZIP.search(request.headers.get("Accept-Encoding", "")):
+        response = HttpResponse(packed, content_type=content_type)
+        response["Content-Encoding"] = "gzip"
+    else:
+        response = HttpResponse(plain, content_type=content_type)
+    response["Cache-Control"] = IMMUTABLE
+    response["Vary"] = "Accept-Encoding"
+    return response
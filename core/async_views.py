@@ -0,0 +1,318 @@
+"""
+Async variants of the authenticated pages and the to-do API.
+
+Used instead of core/views.py when ASYNC_VIEWS is enabled (the default under
+vtopclone/asgi.py), so requests stay on the event loop and use the async
+ORM instead of hopping through sync_to_async for every view.
+"""
+from asgiref.sync import sync_to_async
+from django.contrib.admin.views.decorators import staff_member_required
+from django.contrib.auth.decorators import login_required
+from django.http import HttpResponse, JsonResponse
+from django.shortcuts import render
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
+from django.views.decorators.csrf import csrf_exempt
+import json
+
+from .activity import log_event
+from .directory import parse_directory_params
+from .exports import (
+    CREDENTIALS_EXPORT_FIELDS, EXPORT_CHUNK_ROWS, TODO_EXPORT_FIELDS, ExportEncoder,
+    astream, credentials_export_query, export_response, parse_export_params, todo_export_query,
+)
+from .id_cards import aget_badge
+from .models import ActivityEvent, ToDo
+from .replicas import is_primary, read_alias
+from .search import parse_search_params, search_payload, search_query
+from .student import aget_student_context
+from .todo_cache import todo_cache
+from .todos import (
+    TODO_PAGE_SIZE, apply_batch, archived_payload, archived_query, cursor_expired,
+    decode_rank_cursor, delta_payload, delta_query, etag_for, is_default_listing,
+    listing_body, move_todo, page_payload, page_query, parse_batch, parse_list_params,
+    parse_move, state_query,
+)
+
+
+# ==================== AUTHENTICATED VIEWS ====================
+
+@login_required(login_url='login')
+async def dashboard(request):
+    """Main dashboard page"""
+    student = await aget_student_context(request)
+    return render(request, 'core/dashboard.html', {
+        'user': student.user,
+        'creds': student.creds,
+        'todos': await _initial_todos(student.user.id),
+    })
+
+
+async def _initial_todos(user_id):
+    """Async counterpart of views._initial_todos"""
+    cached, generation = todo_cache.get(user_id)
+    if cached is not None:
+        return json.loads(cached[1])
+    db = read_alias(ToDo)
+    state = await state_query(user_id).using(db).afirst()
+    rows = [row async for row in page_query(user_id, None, TODO_PAGE_SIZE).using(db)]
+    payload = page_payload(rows, TODO_PAGE_SIZE, state)
+    if is_primary(db):
+        todo_cache.set(user_id, generation, state, listing_body(payload))
+    return payload
+
+
+@login_required
+async def profile_view(request):
+    """User profile page"""
+    student = await aget_student_context(request)
+    return render(request, "core/profile.html", {"user": student.user, "creds": student.creds})
+
+
+@login_required
+async def id_card(request):
+    """Student ID card page"""
+    student = await aget_student_context(request)
+    return render(request, "core/id_card.html", {
+        "user": student.user,
+        "creds": student.creds,
+        "badge": await aget_badge(student.user, student.creds),
+    })
+
+
+@login_required
+async def credentials_view(request):
+    """Student credentials page"""
+    student = await aget_student_context(request)
+    log_event(request, ActivityEvent.Action.CREDENTIALS_VIEW, user_id=student.user.id)
+    return render(request, "core/credentials.html", {"user": student.user, "creds": student.creds})
+
+
+# ==================== TODO API ENDPOINTS ====================
+
+@csrf_exempt
+@login_required
+async def get_todos(request):
+    """Async get_todos; same parameters, payloads and validators"""
+    try:
+        limit, since, after = parse_list_params(request, decode_after=decode_rank_cursor)
+    except ValueError:
+        return JsonResponse({"error": "Invalid cursor or limit"}, status=400)
+    if since and cursor_expired(since):
+        return JsonResponse({"error": "Sync cursor expired, reload the full list"}, status=410)
+
+    user = await request.auser()
+    cached = generation = None
+    if is_default_listing(request):
+        cached, generation = todo_cache.get(user.id)
+    db = read_alias(ToDo)
+    if cached is not None:
+        state, body = cached
+    else:
+        state, body = await state_query(user.id).using(db).afirst(), None
+
+    # condition() calls its validators synchronously, so check them here
+    etag = quote_etag(etag_for(state, request))
+    last_modified = int(state[0].timestamp()) if state else None
+    response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if response is None:
+        if body is not None:
+            response = HttpResponse(body, content_type="application/json")
+        elif since:
+            rows = [row async for row in delta_query(user.id, since, limit)]
+            response = JsonResponse(delta_payload(rows, limit, request.GET["since"]))
+        else:
+            rows = [row async for row in page_query(user.id, after, limit).using(db)]
+            response = JsonResponse(page_payload(rows, limit, state))
+            if is_default_listing(request) and is_primary(db):
+                todo_cache.set(user.id, generation, state, response.content)
+
+    if request.method in ("GET", "HEAD"):
+        response.headers.setdefault("ETag", etag)
+        if last_modified:
+            response.headers.setdefault("Last-Modified", http_date(last_modified))
+    return response
+
+
+@csrf_exempt
+@login_required
+async def add_todo(request):
+    """Add new todo"""
+    if request.method != 'POST':
+        return JsonResponse({"error": "Method not allowed"}, status=405)
+
+    try:
+        data = json.loads(request.body)
+        task_text = data.get("text", "").strip()
+
+        if not task_text:
+            return JsonResponse({"error": "Task cannot be empty"}, status=400)
+
+        user = await request.auser()
+        todo = await ToDo.objects.acreate(user=user, text=task_text)
+        todo_cache.invalidate(user.id)
+        log_event(request, ActivityEvent.Action.TODO_ADD, str(todo.id), user_id=user.id)
+
+        return JsonResponse({
+            "id": todo.id,
+            "text": todo.text,
+            "is_done": todo.is_done,
+            "rank": todo.rank
+        })
+
+    except json.JSONDecodeError:
+        return JsonResponse({"error": "Invalid JSON"}, status=400)
+    except Exception as e:
+        return JsonResponse({"error": str(e)}, status=500)
+
+
+@csrf_exempt
+@login_required
+async def toggle_todo(request, todo_id):
+    """Toggle todo completion status"""
+    if request.method != 'POST':
+        return JsonResponse({"error": "Method not allowed"}, status=405)
+
+    try:
+        user = await request.auser()
+        todo = await ToDo.objects.alive().aget(id=todo_id, user=user)
+        todo.is_done = not todo.is_done
+        await todo.asave()
+        todo_cache.invalidate(user.id)
+        log_event(request, ActivityEvent.Action.TODO_TOGGLE, str(todo.id), user_id=user.id)
+
+        return JsonResponse({
+            "status": "updated",
+            "is_done": todo.is_done
+        })
+
+    except ToDo.DoesNotExist:
+        return JsonResponse({"error": "Todo not found"}, status=404)
+    except Exception as e:
+        return JsonResponse({"error": str(e)}, status=500)
+
+
+@csrf_exempt
+@login_required
+async def delete_todo(request, todo_id):
+    """Delete todo"""
+    if request.method != 'POST':
+        return JsonResponse({"error": "Method not allowed"}, status=405)
+
+    try:
+        user = await request.auser()
+        deleted = await ToDo.objects.filter(id=todo_id, user=user).asoft_delete()
+        todo_cache.invalidate(user.id)
+
+        if deleted == 0:
+            return JsonResponse({"error": "Todo not found"}, status=404)
+
+        log_event(request, ActivityEvent.Action.TODO_DELETE, str(todo_id), user_id=user.id)
+        return JsonResponse({"status": "deleted"})
+
+    except Exception as e:
+        return JsonResponse({"error": str(e)}, status=500)
+
+
+@csrf_exempt
+@login_required
+async def move_todo_view(request, todo_id):
+    """Move a todo within the list (drag to reorder)"""
+    if request.method != 'POST':
+        return JsonResponse({"error": "Method not allowed"}, status=405)
+
+    try:
+        after_id = parse_move(json.loads(request.body))
+    except json.JSONDecodeError:
+        return JsonResponse({"error": "Invalid JSON"}, status=400)
+    except ValueError as e:
+        return JsonResponse({"error": str(e)}, status=400)
+
+    user = await request.auser()
+    try:
+        # Reads the neighbours and writes in one transaction
+        rank = await sync_to_async(move_todo)(user.id, todo_id, after_id)
+    except ToDo.DoesNotExist:
+        return JsonResponse({"error": "Todo not found"}, status=404)
+    except Exception as e:
+        return JsonResponse({"error": str(e)}, status=500)
+
+    todo_cache.invalidate(user.id)
+    log_event(request, ActivityEvent.Action.TODO_MOVE, str(todo_id), user_id=user.id)
+    return JsonResponse({"id": todo_id, "rank": rank})
+
+
+@login_required
+async def archived_todos(request):
+    """Async archived_todos"""
+    try:
+        limit, _, after = parse_list_params(request)
+    except ValueError:
+        return JsonResponse({"error": "Invalid cursor or limit"}, status=400)
+    user = await request.auser()
+    rows = [row async for row in archived_query(user.id, after, limit)]
+    return JsonResponse(archived_payload(rows, limit))
+
+
+@login_required
+async def search_todos(request):
+    """Async search_todos"""
+    user = await request.auser()
+    try:
+        q, offset, limit = parse_search_params(request.GET)
+        rows = [row async for row in search_query(user.id, q, offset, limit)]
+    except ValueError as e:
+        return JsonResponse({"error": str(e)}, status=400)
+    return JsonResponse(search_payload(rows, offset, limit))
+
+
+@login_required
+async def export_todos(request):
+    """Async export_todos, streamed from the async ORM"""
+    try:
+        fmt, gzip = parse_export_params(request.GET)
+    except ValueError as e:
+        return JsonResponse({"error": str(e)}, status=400)
+    user = await request.auser()
+    rows = todo_export_query(user.id).aiterator(chunk_size=EXPORT_CHUNK_ROWS)
+    return export_response(astream(rows, ExportEncoder(fmt, TODO_EXPORT_FIELDS, gzip)), "todos", fmt, gzip)
+
+
+@staff_member_required
+async def export_credentials(request):
+    """Async export_credentials, streamed from the async ORM"""
+    try:
+        fmt, gzip = parse_export_params(request.GET)
+        branch = parse_directory_params(request.GET)["branch"]
+    except ValueError as e:
+        return JsonResponse({"error": str(e)}, status=400)
+    rows = credentials_export_query(branch).aiterator(chunk_size=EXPORT_CHUNK_ROWS)
+    encoder = ExportEncoder(fmt, CREDENTIALS_EXPORT_FIELDS, gzip)
+    return export_response(astream(rows, encoder), "student_credentials", fmt, gzip)
+
+
+@csrf_exempt
+@login_required
+async def batch_todos(request):
+    """Apply a list of add/toggle/delete operations in one transaction"""
+    if request.method != 'POST':
+        return JsonResponse({"error": "Method not allowed"}, status=405)
+
+    user = await request.auser()
+    try:
+        batch = parse_batch(json.loads(request.body), user)
+    except json.JSONDecodeError:
+        return JsonResponse({"error": "Invalid JSON"}, status=400)
+    except ValueError as e:
+        return JsonResponse({"error": str(e)}, status=400)
+
+    try:
+        # The async ORM has no transactions; run the atomic block in one thread
+        results = await sync_to_async(apply_batch)(user, *batch)
+    except Exception as e:
+        return JsonResponse({"error": str(e)}, status=500)
+    finally:
+        todo_cache.invalidate(user.id)
+
+    log_event(request, ActivityEvent.Action.TODO_BATCH, f"{len(results)} ops", user_id=user.id)
+    return JsonResponse({"results": results})
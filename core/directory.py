@@ -0,0 +1,92 @@
+"""
+Staff student directory: filter students by branch, username prefix and
+library ID with keyset pagination.
+
+Every page is an index range read in the index's own order, never a sort:
+- with a username prefix, a range scan on auth_user's unique username index
+  (LIKE would be case-insensitive on SQLite and skip it), in username order
+- otherwise (branch_code, user) or the user index on StudentCredentials,
+  in user id order
+library_id is indexed, and per-branch totals come from BranchCount.
+"""
+from django.db.models import F
+
+from .models import BRANCH_CODE_MAP, BranchCount, StudentCredentials
+
+DIRECTORY_PAGE_SIZE = 50
+DIRECTORY_MAX_PAGE_SIZE = 200
+
+DIRECTORY_FIELDS = ("branch_code", "branch_name", "library_id")
+DIRECTORY_USER_FIELDS = ("username", "first_name", "last_name", "email")
+
+
+def parse_directory_params(params):
+    """Filters and cursor from a QueryDict; raises ValueError"""
+    branch = params.get("branch", "").strip().upper()
+    if branch and branch not in BRANCH_CODE_MAP:
+        raise ValueError("Unknown branch")
+    limit = min(int(params.get("limit", DIRECTORY_PAGE_SIZE)), DIRECTORY_MAX_PAGE_SIZE)
+    if limit < 1:
+        raise ValueError("limit must be positive")
+    return {
+        "branch": branch,
+        # Usernames follow the upper-case 00ABC00000 pattern
+        "prefix": params.get("prefix", "").strip().upper(),
+        "library_id": params.get("library_id", "").strip().upper(),
+        "after": params.get("after", ""),
+        "limit": limit,
+    }
+
+
+def directory_query(branch="", prefix="", library_id="", after="", limit=DIRECTORY_PAGE_SIZE):
+    """
+    One page of students, one extra row to detect a next page. after is
+    the "next" value of the previous page with the same filters; raises
+    ValueError for a malformed one.
+    """
+    students = StudentCredentials.objects.all()
+    if branch:
+        students = students.filter(branch_code=branch)
+    if library_id:
+        students = students.filter(library_id=library_id)
+    if prefix:
+        # Half-open range [prefix, prefix with its last character bumped)
+        upper = prefix[:-1] + chr(ord(prefix[-1]) + 1)
+        students = students.filter(user__username__gte=prefix, user__username__lt=upper)
+        if after:
+            students = students.filter(user__username__gt=after)
+        order = "user__username"
+    else:
+        if after:
+            after_id = int(after)
+            # SQLite integers are 64-bit; larger values fail in the query
+            if not 0 <= after_id < 2 ** 63:
+                raise ValueError("cursor out of range")
+            students = students.filter(user_id__gt=after_id)
+        order = "user_id"
+    return (
+        students.order_by(order)
+        .values(*DIRECTORY_FIELDS, "user_id", **{name: F(f"user__{name}") for name in DIRECTORY_USER_FIELDS})[:limit + 1]
+    )
+
+
+def _cursor(row, prefix):
+    return row["username"] if prefix else str(row["user_id"])
+
+
+def branch_counts():
+    """[{code, name, students}] from the precomputed BranchCount table"""
+    return [
+        {"code": code, "name": BRANCH_CODE_MAP.get(code, "Unrecognised"), "students": students}
+        for code, students in BranchCount.objects.order_by("branch_code").values_list("branch_code", "students")
+    ]
+
+
+def directory_payload(rows, limit, prefix=""):
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = _cursor(rows[-1], prefix)
+    for row in rows:
+        del row["user_id"]
+    return {"items": rows, "next": next_cursor, "branches": branch_counts()}
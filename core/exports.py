@@ -0,0 +1,124 @@
+"""
+Streaming CSV / NDJSON exports.
+
+Rows are read with .iterator() / .aiterator() and encoded into ~64 KB
+pieces as they arrive, optionally gzipped on the fly, so an export of the
+whole student body runs in constant memory and the first bytes (the CSV
+header) go out before the query has even started. Under ASGI the async
+views use the async generator, since Django would otherwise buffer a sync
+iterator completely before sending it.
+"""
+import csv
+import io
+import json
+import zlib
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import F
+from django.http import StreamingHttpResponse
+
+from .models import StudentCredentials, ToDo
+
+EXPORT_FORMATS = {"csv": "text/csv", "ndjson": "application/x-ndjson"}
+
+# Rows fetched per database round trip, and bytes buffered per piece sent
+EXPORT_CHUNK_ROWS = 2000
+EXPORT_PIECE_BYTES = 64 * 1024
+
+TODO_EXPORT_FIELDS = ("id", "text", "is_done", "created_at", "updated_at")
+CREDENTIALS_EXPORT_FIELDS = (
+    "username", "first_name", "last_name", "email",
+    "branch_code", "branch_name", "library_id", "wifi_username", "wifi_password",
+)
+
+
+def todo_export_query(user_id):
+    return ToDo.objects.alive().filter(user_id=user_id).order_by("rank", "id").values(*TODO_EXPORT_FIELDS)
+
+
+def credentials_export_query(branch=""):
+    creds = StudentCredentials.objects.all()
+    if branch:
+        creds = creds.filter(branch_code=branch)
+    user_fields = {name: F(f"user__{name}") for name in ("username", "first_name", "last_name", "email")}
+    return (
+        creds.order_by("user_id")
+        .values("branch_code", "branch_name", "library_id", "wifi_username", "wifi_password", **user_fields)
+    )
+
+
+class ExportEncoder:
+    """Turns rows into CSV or NDJSON and batches the output into pieces"""
+
+    def __init__(self, fmt, fields, gzip=False):
+        self.fmt = fmt
+        self.fields = fields
+        self.buffer = io.StringIO()
+        self.writer = csv.writer(self.buffer) if fmt == "csv" else None
+        # wbits=31: gzip container rather than a raw zlib stream
+        self.compressor = zlib.compressobj(6, zlib.DEFLATED, 31) if gzip else None
+
+    def header(self):
+        if self.writer:
+            self.writer.writerow(self.fields)
+        return self.drain()
+
+    def add(self, row):
+        """Encode one row; returns a piece once enough output is buffered"""
+        if self.writer:
+            self.writer.writerow([row[field] for field in self.fields])
+        else:
+            self.buffer.write(json.dumps({field: row[field] for field in self.fields}, cls=DjangoJSONEncoder))
+            self.buffer.write("\n")
+        if self.buffer.tell() >= EXPORT_PIECE_BYTES:
+            return self.drain()
+        return None
+
+    def drain(self, final=False):
+        data = self.buffer.getvalue().encode("utf-8")
+        self.buffer.seek(0)
+        self.buffer.truncate()
+        if self.compressor:
+            # A sync flush makes every piece decodable as soon as it arrives
+            data = self.compressor.compress(data) + self.compressor.flush(
+                zlib.Z_FINISH if final else zlib.Z_SYNC_FLUSH)
+        return data
+
+
+def stream(rows, encoder):
+    yield encoder.header()
+    for row in rows:
+        piece = encoder.add(row)
+        if piece:
+            yield piece
+    yield encoder.drain(final=True)
+
+
+async def astream(rows, encoder):
+    yield encoder.header()
+    async for row in rows:
+        piece = encoder.add(row)
+        if piece:
+            yield piece
+    yield encoder.drain(final=True)
+
+
+def parse_export_params(params):
+    """(format, gzip) from the query string; raises ValueError"""
+    fmt = params.get("format", "csv")
+    if fmt not in EXPORT_FORMATS:
+        raise ValueError("format must be csv or ndjson")
+    return fmt, params.get("gzip") == "1"
+
+
+def export_response(content, name, fmt, gzip):
+    """StreamingHttpResponse that downloads content as name.<fmt>[.gz]"""
+    filename = f"{name}.{fmt}"
+    if gzip:
+        filename += ".gz"
+    response = StreamingHttpResponse(
+        content, content_type="application/gzip" if gzip else f"{EXPORT_FORMATS[fmt]}; charset=utf-8",
+    )
+    response["Content-Disposition"] = f'attachment; filename="{filename}"'
+    response["Cache-Control"] = "no-store"
+    return response
@@ -0,0 +1,59 @@
+"""
+Rendered ID card badges.
+
+The badge (core/id_card_badge.html) depends only on a few User and
+StudentCredentials fields, so each student's rendered HTML is kept in the
+ID_CARD_CACHE_ALIAS cache under a key that includes a digest of those
+values. Editing the student changes the key in every worker process at
+once, without having to reach their caches; superseded badges simply
+expire. `manage.py render_id_cards` renders the same template for printing.
+"""
+import hashlib
+
+from django.conf import settings
+from django.core.cache import caches
+from django.template.loader import render_to_string
+from django.utils.safestring import mark_safe
+
+ID_CARD_CACHE_ALIAS = getattr(settings, "ID_CARD_CACHE_ALIAS", "id_cards")
+BADGE_TEMPLATE = "core/id_card_badge.html"
+
+# Everything the template shows; keep in step with id_card_badge.html
+BADGE_USER_FIELDS = ("username", "first_name", "last_name", "email")
+BADGE_CREDS_FIELDS = ("branch_name",)
+
+
+def _field(obj, name):
+    return obj[name] if isinstance(obj, dict) else getattr(obj, name)
+
+
+def id_card_key(user, creds):
+    values = [_field(user, name) for name in BADGE_USER_FIELDS]
+    values += [_field(creds, name) for name in BADGE_CREDS_FIELDS]
+    stamp = hashlib.blake2b(repr(values).encode(), digest_size=8).hexdigest()
+    return f"id_card:{user.pk}:{stamp}"
+
+
+def render_badge(user, creds):
+    """Badge HTML; user and creds may be model instances or plain dicts"""
+    return render_to_string(BADGE_TEMPLATE, {"user": user, "creds": creds})
+
+
+def get_badge(user, creds):
+    cache = caches[ID_CARD_CACHE_ALIAS]
+    key = id_card_key(user, creds)
+    html = cache.get(key)
+    if html is None:
+        html = render_badge(user, creds)
+        cache.set(key, html)
+    return mark_safe(html)
+
+
+async def aget_badge(user, creds):
+    cache = caches[ID_CARD_CACHE_ALIAS]
+    key = id_card_key(user, creds)
+    html = await cache.aget(key)
+    if html is None:
+        html = render_badge(user, creds)
+        await cache.aset(key, html)
+    return mark_safe(html)
@@ -0,0 +1,184 @@
+"""
+Admission control for login_page.
+
+Every authenticate() call runs a full PBKDF2 hash, even for unknown
+usernames, so a login storm can occupy every worker and starve the dashboard
+and to-do API. Logins therefore go through two gates before hashing:
+
+- throttling: failed attempts per (username, client IP), failed attempts
+  per username from any address (a much higher cap, so guessing a whole
+  intake's passwords can't lock those students out) and attempts per
+  client IP are counted in fixed windows in the Django cache named by
+  LOGIN_THROTTLE_ALIAS (shared between workers when that cache is); over a
+  limit -> 429
+- hash slots: at most LOGIN_HASH_SLOTS hashes run at once in this process,
+  up to LOGIN_QUEUE_SIZE logins wait LOGIN_QUEUE_TIMEOUT seconds for a slot,
+  anything beyond that -> 503, both with Retry-After
+
+Counters are exported on /metrics/.
+"""
+import threading
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.core.cache import caches
+
+
+class Rejected(Exception):
+    """Login turned away before hashing; status and retry_after for the response"""
+
+    def __init__(self, reason, status, retry_after):
+        super().__init__(reason)
+        self.reason = reason
+        self.status = status
+        self.retry_after = retry_after
+
+
+class LoginThrottle:
+    """Fixed-window counters keyed by username, client IP and both"""
+
+    def __init__(self, alias, failure_limit, username_limit, ip_limit):
+        self.alias = alias
+        self.failure_limit = failure_limit      # (failures, window seconds) per username and IP
+        self.username_limit = username_limit    # (failures, window seconds) per username
+        self.ip_limit = ip_limit                # (attempts, window seconds)
+
+    @property
+    def backend(self):
+        return caches[self.alias]
+
+    @staticmethod
+    def _key(scope, *values):
+        return f"login:{scope}:" + ":".join(value.lower() for value in values)
+
+    def _window_count(self, key):
+        return self.backend.get(key, 0)
+
+    def _hit(self, key, window):
+        # add() only sets a missing key, so the window starts at the first hit
+        if not self.backend.add(key, 1, window):
+            try:
+                self.backend.incr(key)
+            except ValueError:
+                # expired between add() and incr()
+                self.backend.add(key, 1, window)
+
+    def check(self, username, ip):
+        """Raise Rejected if the username, the IP or the pair is over its limit"""
+        if username:
+            limit, window = self.failure_limit
+            if self._window_count(self._key("fail", username, ip)) >= limit:
+                raise Rejected("failures", 429, window)
+            limit, window = self.username_limit
+            if self._window_count(self._key("user", username)) >= limit:
+                raise Rejected("username", 429, window)
+        limit, window = self.ip_limit
+        key = self._key("ip", ip)
+        if self._window_count(key) >= limit:
+            raise Rejected("ip", 429, window)
+        self._hit(key, window)
+
+    def failed(self, username, ip):
+        if username:
+            self._hit(self._key("fail", username, ip), self.failure_limit[1])
+            self._hit(self._key("user", username), self.username_limit[1])
+
+    def succeeded(self, username, ip):
+        # Only this address's failures: a student logging in doesn't reset
+        # the count of someone guessing from elsewhere
+        self.backend.delete(self._key("fail", username, ip))
+
+
+class HashSlots:
+    """
+    Bounded concurrency with a short, bounded wait queue. Waiters past the
+    queue size or the timeout are rejected instead of piling up on workers.
+    """
+
+    def __init__(self, slots, queue_size, timeout, retry_after):
+        self.slots = slots
+        self.queue_size = queue_size
+        self.timeout = timeout
+        self.retry_after = retry_after
+        self._cond = threading.Condition()
+        self.active = 0
+        self.waiting = 0
+        self.admitted = 0
+        self.wait_seconds = 0.0
+        self.rejected = {"queue_full": 0, "timeout": 0, "failures": 0, "username": 0, "ip": 0}
+
+    @contextmanager
+    def slot(self):
+        self._acquire()
+        try:
+            yield
+        finally:
+            with self._cond:
+                self.active -= 1
+                self._cond.notify()
+
+    def _acquire(self):
+        with self._cond:
+            if self.active < self.slots and not self.waiting:
+                self.active += 1
+                self.admitted += 1
+                return
+            if self.waiting >= self.queue_size:
+                self.rejected["queue_full"] += 1
+                raise Rejected("queue_full", 503, self.retry_after)
+
+            self.waiting += 1
+            start = time.monotonic()
+            try:
+                admitted = self._cond.wait_for(lambda: self.active < self.slots, self.timeout)
+            finally:
+                self.waiting -= 1
+                self.wait_seconds += time.monotonic() - start
+            if not admitted:
+                self.rejected["timeout"] += 1
+                raise Rejected("timeout", 503, self.retry_after)
+            self.active += 1
+            self.admitted += 1
+
+    def record_throttled(self, reason):
+        with self._cond:
+            self.rejected[reason] += 1
+
+    def stats(self):
+        with self._cond:
+            return {
+                "slots": self.slots,
+                "active": self.active,
+                "waiting": self.waiting,
+                "admitted": self.admitted,
+                "wait_seconds": round(self.wait_seconds, 6),
+                "rejected": dict(self.rejected),
+            }
+
+
+throttle = LoginThrottle(
+    alias=getattr(settings, "LOGIN_THROTTLE_ALIAS", "default"),
+    failure_limit=getattr(settings, "LOGIN_FAILURE_LIMIT", (5, 300)),
+    username_limit=getattr(settings, "LOGIN_USERNAME_LIMIT", (100, 300)),
+    ip_limit=getattr(settings, "LOGIN_IP_LIMIT", (300, 60)),
+)
+
+hash_slots = HashSlots(
+    slots=getattr(settings, "LOGIN_HASH_SLOTS", 2),
+    queue_size=getattr(settings, "LOGIN_QUEUE_SIZE", 16),
+    timeout=getattr(settings, "LOGIN_QUEUE_TIMEOUT", 2.0),
+    retry_after=getattr(settings, "LOGIN_RETRY_AFTER", 5),
+)
+
+
+@contextmanager
+def admit(username, ip):
+    """Throttle check plus a hash slot for one login attempt; raises Rejected"""
+    try:
+        throttle.check(username, ip)
+    except Rejected as exc:
+        hash_slots.record_throttled(exc.reason)
+        raise
+    with hash_slots.slot():
+        yield
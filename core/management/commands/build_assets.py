@@ -0,0 +1,28 @@
+"""
+Build the fingerprinted static bundles declared in core.assets.BUNDLES.
+
+    python manage.py build_assets
+
+Run on every deploy, after collectstatic if you use it. Writes hashed,
+minified bundles, their .gz copies and manifest.json into ASSETS_ROOT.
+"""
+from django.core.management.base import BaseCommand, CommandError
+
+from core.assets import build_all
+
+
+class Command(BaseCommand):
+    help = "Minify, concatenate, fingerprint and gzip the static bundles"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--output', help="Directory to write to (default: settings.ASSETS_ROOT)")
+
+    def handle(self, *args, **options):
+        try:
+            report = build_all(options['output'])
+        except FileNotFoundError as exc:
+            raise CommandError(str(exc))
+
+        for name, filename, source, minified, packed in report:
+            self.stdout.write(f"  {name:<14} {filename:<32} {source:>7} B -> {minified:>7} B, {packed:>6} B gzipped")
+        self.stdout.write(self.style.SUCCESS(f"Built {len(report)} bundles"))
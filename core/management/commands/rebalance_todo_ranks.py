@@ -0,0 +1,55 @@
+"""
+Re-space to-do rank keys that have grown long.
+
+    python manage.py rebalance_todo_ranks --max-length 16 --pause 0.1
+
+Moving a to-do only rewrites its own key, halving the gap between its new
+neighbours, so keys in a spot that sees many moves get longer. This finds
+the users with a live key longer than --max-length and gives each of their
+lists evenly spaced short keys in the same order, one user per transaction.
+Run it periodically alongside archive_todos; moves never wait for it.
+"""
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models.functions import Length
+
+from core.models import ToDo
+from core.todo_cache import todo_cache
+from core.todos import rebalance_ranks
+
+
+class Command(BaseCommand):
+    help = "Rewrite to-do lists whose rank keys have grown long"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--max-length', type=int,
+                            default=getattr(settings, 'TODO_RANK_REBALANCE_LENGTH', 16),
+                            help="Rebalance lists with a key longer than this")
+        parser.add_argument('--pause', type=float, default=0.0,
+                            help="Seconds to sleep between users")
+
+    def handle(self, *args, **options):
+        if options['max_length'] < 1:
+            raise CommandError("--max-length must be positive")
+
+        started = time.perf_counter()
+        # Only needs (user_id, rank), so this reads todo_alive_user_rank_idx
+        user_ids = list(
+            ToDo.objects.alive().annotate(rank_length=Length('rank'))
+            .filter(rank_length__gt=options['max_length'])
+            .order_by().values_list('user_id', flat=True).distinct()
+        )
+        rewritten = 0
+        for done, user_id in enumerate(user_ids, 1):
+            rewritten += rebalance_ranks(user_id)
+            todo_cache.invalidate(user_id)
+            self.stdout.write(f"  {done}/{len(user_ids)} lists rebalanced", ending='\r')
+            if options['pause']:
+                time.sleep(options['pause'])
+
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(
+            f"Rebalanced {len(user_ids)} lists ({rewritten} to-dos) in {elapsed:.1f}s"
+        ))
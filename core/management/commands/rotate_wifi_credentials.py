@@ -0,0 +1,90 @@
+"""
+Rotate hostel WiFi passwords in bulk.
+
+    python manage.py rotate_wifi_credentials --branch BCE --chunk-size 1000
+
+Credentials are streamed in primary-key order with .iterator(), so memory
+stays flat however many students there are, and each chunk gets its new
+passwords from one batched draw and is written with a single bulk_update
+in its own transaction.
+
+Every rotated row is stamped with wifi_rotated_at. Rows already rotated at
+or after --not-since (default: midnight today) are skipped, so rerunning
+the same command after an interruption resumes where it stopped instead
+of rotating everyone again.
+"""
+import time
+from datetime import datetime, time as dt_time
+from itertools import islice
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from core.models import (
+    BRANCH_CODE_MAP, StudentCredentials, generate_wifi_passwords, student_cache, student_cache_key,
+)
+
+
+class Command(BaseCommand):
+    help = "Generate new WiFi passwords for students, in resumable chunks"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--branch', action='append', default=[],
+                            help="Only this branch code (repeatable), e.g. --branch BCE --branch BAI")
+        parser.add_argument('--chunk-size', type=int, default=1000,
+                            help="Rows per transaction")
+        parser.add_argument('--length', type=int, default=12,
+                            help="Password length")
+        parser.add_argument('--not-since', metavar='YYYY-MM-DD',
+                            help="Skip rows rotated on or after this date (default: today)")
+
+    def handle(self, *args, **options):
+        chunk_size = options['chunk_size']
+        if chunk_size < 1 or options['length'] < 8:
+            raise CommandError("--chunk-size must be positive and --length at least 8")
+
+        branches = [code.upper() for code in options['branch']]
+        unknown = set(branches) - BRANCH_CODE_MAP.keys()
+        if unknown:
+            raise CommandError(f"Unknown branch code(s): {', '.join(sorted(unknown))}")
+
+        try:
+            day = (datetime.strptime(options['not_since'], '%Y-%m-%d').date()
+                   if options['not_since'] else timezone.localdate())
+        except ValueError:
+            raise CommandError("--not-since must be YYYY-MM-DD")
+        cutoff = timezone.make_aware(datetime.combine(day, dt_time.min))
+
+        pending = StudentCredentials.objects.filter(
+            Q(wifi_rotated_at__isnull=True) | Q(wifi_rotated_at__lt=cutoff)
+        )
+        if branches:
+            pending = pending.filter(branch_code__in=branches)
+        rows = pending.order_by('pk').only('pk', 'user_id').iterator(chunk_size=chunk_size)
+
+        rotated = 0
+        started = time.perf_counter()
+        while True:
+            chunk = list(islice(rows, chunk_size))
+            if not chunk:
+                break
+            now = timezone.now()
+            for creds, password in zip(chunk, generate_wifi_passwords(len(chunk), options['length'])):
+                creds.wifi_password = password
+                creds.wifi_rotated_at = now
+            with transaction.atomic():
+                StudentCredentials.objects.bulk_update(chunk, ['wifi_password', 'wifi_rotated_at'])
+            # bulk_update skips post_save, so drop the cached student pages here
+            student_cache().delete_many([student_cache_key(creds.user_id) for creds in chunk])
+
+            rotated += len(chunk)
+            elapsed = time.perf_counter() - started
+            self.stdout.write(f"  {rotated} rotated ({rotated / elapsed:.0f} rows/s)", ending='\r')
+
+        elapsed = time.perf_counter() - started
+        rate = rotated / elapsed if elapsed else 0
+        self.stdout.write(self.style.SUCCESS(
+            f"Rotated {rotated} WiFi passwords in {elapsed:.1f}s ({rate:.0f} rows/s)"
+        ))
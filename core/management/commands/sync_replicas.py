@@ -0,0 +1,39 @@
+"""
+Refresh the local read replicas from the primary database.
+
+    python manage.py sync_replicas
+    python manage.py sync_replicas --interval 2
+
+Copies 'default' into every alias in settings.READ_REPLICAS (SQLite files
+configured through VTOP_READ_REPLICAS) with SQLite's online backup API.
+With --interval it keeps doing so, which gives replicas a realistic lag
+for trying out the router locally.
+"""
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core.replicas import READ_REPLICAS, sync_replica
+
+
+class Command(BaseCommand):
+    help = "Copy the primary SQLite database into the read replica files"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--interval', type=float,
+                            help="Repeat every this many seconds until interrupted")
+
+    def handle(self, *args, **options):
+        if not READ_REPLICAS:
+            raise CommandError("No replicas configured; set VTOP_READ_REPLICAS=path1.sqlite3,path2.sqlite3")
+
+        while True:
+            started = time.perf_counter()
+            for alias in READ_REPLICAS:
+                sync_replica(alias)
+            self.stdout.write(self.style.SUCCESS(
+                f"Synced {len(READ_REPLICAS)} replica(s) in {time.perf_counter() - started:.2f}s"
+            ))
+            if not options['interval']:
+                return
+            time.sleep(options['interval'])
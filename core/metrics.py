@@ -0,0 +1,347 @@
+"""
+Per-request instrumentation exposed in Prometheus text format.
+
+MetricsMiddleware (first in MIDDLEWARE) records, per URL name:
+- request latency histogram
+- DB query count and time
+- response bytes
+and the exclusive time spent in every middleware below it, so a slow page
+can be pinned on the session save, the session-script injection, the view or
+SQLite. Counters live in per-thread shards that are only merged when
+/metrics/ is scraped, so recording never takes a lock, and the number of
+URL-name series is capped.
+"""
+import contextvars
+import threading
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import connections
+from django.db.backends.signals import connection_created
+
+# Latency histogram upper bounds in seconds
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# URL names beyond this many are folded into view="other"
+MAX_VIEWS = getattr(settings, "METRICS_MAX_VIEWS", 200)
+
+_current = contextvars.ContextVar("metrics_request", default=None)
+
+
+class QueryStats:
+    """
+    Queries issued while this is current (see track_queries). Stats nest:
+    each also counts into the one that was current when it started, so an
+    outer measurement (a benchmark step) still sees the queries of the
+    request MetricsMiddleware is measuring inside it.
+    """
+    __slots__ = ("queries", "db_seconds", "parent")
+
+    def __init__(self):
+        self.queries = 0
+        self.db_seconds = 0.0
+        self.parent = _current.get()
+
+
+class _RequestStats(QueryStats):
+    __slots__ = ("inclusive",)
+
+    def __init__(self):
+        super().__init__()
+        # middleware chain position -> inclusive seconds
+        self.inclusive = {}
+
+
+def track_queries(stats=None):
+    """Make stats (a new QueryStats by default) current; returns (stats, token)"""
+    stats = stats if stats is not None else QueryStats()
+    return stats, _current.set(stats)
+
+
+def untrack_queries(token):
+    _current.reset(token)
+
+
+class _ViewSeries:
+    __slots__ = ("count", "seconds", "buckets", "queries", "db_seconds", "bytes")
+
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+        self.buckets = [0] * len(BUCKETS)
+        self.queries = 0
+        self.db_seconds = 0.0
+        self.bytes = 0
+
+
+class _Shard:
+    """Counters written by exactly one thread"""
+
+    def __init__(self):
+        self.views = {}
+        self.middleware = {}
+
+
+class MetricsRegistry:
+    def __init__(self, max_views=MAX_VIEWS):
+        self.max_views = max_views
+        self._local = threading.local()
+        self._shards = []
+        self._known_views = set()
+        self._lock = threading.Lock()
+
+    def _shard(self):
+        shard = getattr(self._local, "shard", None)
+        if shard is None:
+            shard = self._local.shard = _Shard()
+            with self._lock:
+                self._shards.append(shard)
+        return shard
+
+    def _label(self, view):
+        if view in self._known_views:
+            return view
+        with self._lock:
+            if len(self._known_views) < self.max_views:
+                self._known_views.add(view)
+                return view
+        return "other"
+
+    def observe(self, view, seconds, queries, db_seconds, size, middleware):
+        shard = self._shard()
+        label = self._label(view)
+        series = shard.views.get(label)
+        if series is None:
+            series = shard.views[label] = _ViewSeries()
+        series.count += 1
+        series.seconds += seconds
+        for i, bound in enumerate(BUCKETS):
+            if seconds <= bound:
+                series.buckets[i] += 1
+                break
+        series.queries += queries
+        series.db_seconds += db_seconds
+        series.bytes += size
+        for name, spent in middleware:
+            totals = shard.middleware.get(name)
+            if totals is None:
+                totals = shard.middleware[name] = [0, 0.0]
+            totals[0] += 1
+            totals[1] += spent
+
+    def _merged(self):
+        with self._lock:
+            shards = list(self._shards)
+        views, middleware = {}, {}
+        for shard in shards:
+            for view, s in list(shard.views.items()):
+                total = views.setdefault(view, _ViewSeries())
+                total.count += s.count
+                total.seconds += s.seconds
+                total.buckets = [a + b for a, b in zip(total.buckets, s.buckets)]
+                total.queries += s.queries
+                total.db_seconds += s.db_seconds
+                total.bytes += s.bytes
+            for name, (count, spent) in list(shard.middleware.items()):
+                total = middleware.setdefault(name, [0, 0.0])
+                total[0] += count
+                total[1] += spent
+        return views, middleware
+
+    def render(self):
+        """Prometheus text exposition format"""
+        views, middleware = self._merged()
+        lines = [
+            "# HELP vtop_request_duration_seconds Request latency by URL name.",
+            "# TYPE vtop_request_duration_seconds histogram",
+        ]
+        for view, s in sorted(views.items()):
+            cumulative = 0
+            for bound, hits in zip(BUCKETS, s.buckets):
+                cumulative += hits
+                lines.append(f'vtop_request_duration_seconds_bucket{{view="{view}",le="{bound}"}} {cumulative}')
+            lines.append(f'vtop_request_duration_seconds_bucket{{view="{view}",le="+Inf"}} {s.count}')
+            lines.append(f'vtop_request_duration_seconds_sum{{view="{view}"}} {s.seconds:.6f}')
+            lines.append(f'vtop_request_duration_seconds_count{{view="{view}"}} {s.count}')
+
+        for metric, help_text, attr, fmt in (
+            ("vtop_request_db_queries_total", "SQL queries issued.", "queries", "{}"),
+            ("vtop_request_db_seconds_total", "Time spent executing SQL.", "db_seconds", "{:.6f}"),
+            ("vtop_response_bytes_total", "Response body bytes sent.", "bytes", "{}"),
+        ):
+            lines.append(f"# HELP {metric} {help_text}")
+            lines.append(f"# TYPE {metric} counter")
+            for view, s in sorted(views.items()):
+                lines.append(f'{metric}{{view="{view}"}} {fmt.format(getattr(s, attr))}')
+
+        lines.append("# HELP vtop_middleware_seconds_total Exclusive time spent in each middleware (and the view).")
+        lines.append("# TYPE vtop_middleware_seconds_total counter")
+        for name, (count, spent) in sorted(middleware.items()):
+            lines.append(f'vtop_middleware_seconds_total{{middleware="{name}"}} {spent:.6f}')
+        lines.append("# TYPE vtop_middleware_calls_total counter")
+        for name, (count, spent) in sorted(middleware.items()):
+            lines.append(f'vtop_middleware_calls_total{{middleware="{name}"}} {count}')
+
+        from .todo_cache import todo_cache
+        lines.append("# HELP vtop_todo_cache_events_total Per-user to-do cache events in this process.")
+        lines.append("# TYPE vtop_todo_cache_events_total counter")
+        stats = todo_cache.stats()
+        for event in ("hits", "misses", "evictions", "invalidations"):
+            lines.append(f'vtop_todo_cache_events_total{{event="{event}"}} {stats[event]}')
+
+        from .login_admission import hash_slots
+        stats = hash_slots.stats()
+        lines.append("# HELP vtop_login_hash_slots_active Logins currently hashing a password.")
+        lines.append("# TYPE vtop_login_hash_slots_active gauge")
+        lines.append(f"vtop_login_hash_slots_active {stats['active']}")
+        lines.append("# HELP vtop_login_queue_depth Logins waiting for a hash slot.")
+        lines.append("# TYPE vtop_login_queue_depth gauge")
+        lines.append(f"vtop_login_queue_depth {stats['waiting']}")
+        lines.append("# TYPE vtop_login_admitted_total counter")
+        lines.append(f"vtop_login_admitted_total {stats['admitted']}")
+        lines.append("# TYPE vtop_login_queue_wait_seconds_total counter")
+        lines.append(f"vtop_login_queue_wait_seconds_total {stats['wait_seconds']:.6f}")
+        lines.append("# HELP vtop_login_rejected_total Logins turned away before hashing.")
+        lines.append("# TYPE vtop_login_rejected_total counter")
+        for reason, count in sorted(stats["rejected"].items()):
+            lines.append(f'vtop_login_rejected_total{{reason="{reason}"}} {count}')
+
+        from .activity import activity_log
+        stats = activity_log.stats()
+        lines.append("# HELP vtop_activity_queue_depth Activity events waiting for the writer thread.")
+        lines.append("# TYPE vtop_activity_queue_depth gauge")
+        lines.append(f"vtop_activity_queue_depth {stats['queued']}")
+        lines.append("# HELP vtop_activity_events_total Activity events by outcome in this process.")
+        lines.append("# TYPE vtop_activity_events_total counter")
+        for outcome in ("recorded", "dropped", "written", "failed"):
+            lines.append(f'vtop_activity_events_total{{outcome="{outcome}"}} {stats[outcome]}')
+        lines.append("# TYPE vtop_activity_batches_total counter")
+        lines.append(f"vtop_activity_batches_total {stats['batches']}")
+        return "\n".join(lines) + "\n"
+
+
+registry = MetricsRegistry()
+
+
+def _count_queries(execute, sql, params, many, context):
+    stats = _current.get()
+    if stats is None:
+        return execute(sql, params, many, context)
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        elapsed = time.perf_counter() - start
+        while stats is not None:
+            stats.queries += 1
+            stats.db_seconds += elapsed
+            stats = stats.parent
+
+
+def _install_query_counter(sender=None, connection=None, **kwargs):
+    if _count_queries not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_count_queries)
+
+
+def install_query_counter():
+    """
+    Count queries on every connection. Called from CoreConfig.ready() so it
+    is in place before any thread opens its connection.
+    """
+    connection_created.connect(_install_query_counter, dispatch_uid="vtop_metrics_query_counter")
+    for connection in connections.all(initialized_only=True):
+        _install_query_counter(connection=connection)
+
+
+def _timed_link(position, callee):
+    """Wrap one link of the middleware chain to record its inclusive time"""
+    if iscoroutinefunction(callee):
+        async def link(request):
+            start = time.perf_counter()
+            try:
+                return await callee(request)
+            finally:
+                stats = _current.get()
+                if stats is not None:
+                    stats.inclusive[position] = time.perf_counter() - start
+        markcoroutinefunction(link)
+    else:
+        def link(request):
+            start = time.perf_counter()
+            try:
+                return callee(request)
+            finally:
+                stats = _current.get()
+                if stats is not None:
+                    stats.inclusive[position] = time.perf_counter() - start
+    return link
+
+
+class MetricsMiddleware:
+    """
+    Outermost middleware. Each link of the chain below it is timed, so
+    exclusive time per middleware is its inclusive time minus that of the
+    next link; the last link is the view (including template rendering).
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+        # Django hands each middleware the next one wrapped by
+        # convert_exception_to_response(); __wrapped__ leads to the instance.
+        self.names = []
+        self.get_response = _timed_link(0, get_response)
+        node = get_response
+        while True:
+            instance = getattr(node, "__wrapped__", None)
+            if instance is None or not hasattr(instance, "get_response"):
+                self.names.append("view")
+                break
+            self.names.append(type(instance).__name__)
+            node = instance.get_response
+            instance.get_response = _timed_link(len(self.names), node)
+
+        install_query_counter()
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        stats, token = track_queries(_RequestStats())
+        start = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            untrack_queries(token)
+        self.record(request, response, time.perf_counter() - start, stats)
+        return response
+
+    async def __acall__(self, request):
+        stats, token = track_queries(_RequestStats())
+        start = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            untrack_queries(token)
+        self.record(request, response, time.perf_counter() - start, stats)
+        return response
+
+    def record(self, request, response, seconds, stats):
+        match = getattr(request, "resolver_match", None)
+        view = (match.view_name if match else None) or "unmatched"
+
+        middleware = []
+        for position, name in enumerate(self.names):
+            inclusive = stats.inclusive.get(position)
+            if inclusive is None:
+                break  # a middleware short-circuited the rest of the chain
+            exclusive = inclusive - stats.inclusive.get(position + 1, 0.0)
+            middleware.append((name, exclusive))
+
+        # CommonMiddleware sets Content-Length on every non-streaming response
+        size = int(response.get("Content-Length", 0) or 0)
+        registry.observe(view, seconds, stats.queries, stats.db_seconds, size, middleware)
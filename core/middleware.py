@@ -3,11 +3,25 @@ Custom middleware for strict single-session management
 One session per browser - simple and reliable
 Timeout handled by Django's SESSION_COOKIE_AGE setting
 """
-from django.contrib.auth import logout
+from django.contrib.auth import alogout, logout
 from django.shortcuts import redirect
+from django.utils.html import format_html
 from django.utils.deprecation import MiddlewareMixin
+import re
 import uuid
 
+from .assets import asset_url
+
+# How a tab proves it is the tab the session was started in. The token is
+# never read from the request body, so POSTs (including uploads) are not
+# parsed before the view runs, and page URLs stay free of ?_sid=:
+# - fetch() calls send it in the X-Tab-Session header
+# - navigations (links, form posts, reloads) carry it in a one-shot cookie
+#   that session.js sets right before the tab leaves the page; it lives a
+#   few seconds and is cleared again once the next page is served
+TAB_HEADER = 'X-Tab-Session'
+TAB_COOKIE = 'vtop_tab'
+
 
 class SingleSessionMiddleware(MiddlewareMixin):
     """
@@ -16,12 +30,21 @@ class SingleSessionMiddleware(MiddlewareMixin):
     - Closing browser = session ends
     - One user per browser at a time
     - Timeout handled by SESSION_COOKIE_AGE in settings.py
+    Runs natively in either sync (WSGI) or async (ASGI) mode.
     """
     
+    # Skip middleware for login, logout, static files and bundles, API calls and metrics scrapes
+    exempt_paths = ('/login/', '/logout/', '/static/', '/assets/', '/api/', '/metrics/')
+    # One precompiled prefix match instead of a startswith() per path
+    is_exempt = re.compile('|'.join(map(re.escape, exempt_paths))).match
+
+    @staticmethod
+    def client_session_id(request):
+        """Tab token from the header or the hand-off cookie, never the body"""
+        return request.headers.get(TAB_HEADER) or request.COOKIES.get(TAB_COOKIE)
+
     def process_request(self, request):
-        # Skip middleware for login, logout, static files, and API calls
-        exempt_paths = ['/login/', '/logout/', '/static/', '/api/']
-        if any(request.path.startswith(p) for p in exempt_paths):
+        if self.is_exempt(request.path):
             return None
 
         # Only check authenticated users
@@ -32,7 +55,7 @@ class SingleSessionMiddleware(MiddlewareMixin):
         session_id = request.session.get('tab_session_id')
         
         # Get session ID from client (JavaScript sends this)
-        client_session_id = request.GET.get('_sid') or request.POST.get('_sid')
+        client_session_id = self.client_session_id(request)
         
         # First time login - create new session ID
         if not session_id:
@@ -48,82 +71,172 @@ class SingleSessionMiddleware(MiddlewareMixin):
             request.session.flush()
             return redirect('/login/')
         
-        # Valid session - continue
-        request.session['is_new_login'] = False
+        # Valid session - continue (only write the flag when it changes)
+        if request.session.get('is_new_login') is not False:
+            request.session['is_new_login'] = False
         return None
     
+    async def aprocess_request(self, request):
+        """process_request using the async auth and session APIs"""
+        if self.is_exempt(request.path):
+            return None
+
+        user = await request.auser()
+        if not user.is_authenticated:
+            return None
+
+        session_id = await request.session.aget('tab_session_id')
+        client_session_id = self.client_session_id(request)
+
+        if not session_id:
+            await request.session.aset('tab_session_id', str(uuid.uuid4()))
+            await request.session.aset('is_new_login', True)
+            return None
+
+        if not client_session_id or client_session_id != session_id:
+            await alogout(request)
+            await request.session.aflush()
+            return redirect('/login/')
+
+        if await request.session.aget('is_new_login') is not False:
+            await request.session.aset('is_new_login', False)
+        return None
+
     def process_response(self, request, response):
         # Add JavaScript session validator to authenticated pages
-        if hasattr(request, 'user') and request.user.is_authenticated:
-            session_id = request.session.get('tab_session_id')
-            is_new = request.session.get('is_new_login', False)
-            
-            if session_id and hasattr(response, 'content') and b'<body' in response.content:
-                # Inject JavaScript to handle session validation
-                script = f'''
-                <script>
-                (function() {{
-                    const SID_KEY = 'vtop_sid';
-                    const stored = sessionStorage.getItem(SID_KEY);
-                    const server = '{session_id}';
-                    const isNew = {str(is_new).lower()};
-                    
-                    if (isNew) {{
-                        // New login - save session ID
-                        sessionStorage.setItem(SID_KEY, server);
-                    }} else if (!stored) {{
-                        // No stored ID = new tab without proper login
-                        window.location.href = '/logout/';
-                        return;
-                    }} else if (stored !== server) {{
-                        // Mismatched session = logout
-                        window.location.href = '/logout/';
-                        return;
-                    }}
-                    
-                    // Attach session ID to all requests
-                    
-                    // 1. Form submissions
-                    document.addEventListener('submit', function(e) {{
-                        const form = e.target;
-                        if (!form.querySelector('input[name="_sid"]')) {{
-                            const inp = document.createElement('input');
-                            inp.type = 'hidden';
-                            inp.name = '_sid';
-                            inp.value = server;
-                            form.appendChild(inp);
-                        }}
-                    }}, true);
-                    
-                    // 2. AJAX/Fetch requests
-                    const _fetch = window.fetch;
-                    window.fetch = function(...args) {{
-                        if (args[0] && typeof args[0] === 'string') {{
-                            const u = new URL(args[0], location.origin);
-                            u.searchParams.set('_sid', server);
-                            args[0] = u.toString();
-                        }}
-                        return _fetch.apply(this, args);
-                    }};
-                    
-                    // 3. Navigation links
-                    document.addEventListener('click', function(e) {{
-                        if (e.target.tagName === 'A' && e.target.href) {{
-                            const u = new URL(e.target.href);
-                            if (u.origin === location.origin && 
-                                !u.pathname.startsWith('/static/') &&
-                                !u.pathname.startsWith('/login/') &&
-                                !u.pathname.startsWith('/logout/')) {{
-                                u.searchParams.set('_sid', server);
-                                e.target.href = u.toString();
-                            }}
-                        }}
-                    }}, true);
-                }})();
-                </script>
-                </body>
-                '''.encode('utf-8')
-                
-                response.content = response.content.replace(b'</body>', script)
-        
-        return response
\ No newline at end of file
+        if not (hasattr(request, 'user') and request.user.is_authenticated):
+            return response
+        return self.add_session_script(
+            response,
+            request.session.get('tab_session_id'),
+            request.session.get('is_new_login', False),
+            TAB_COOKIE in request.COOKIES,
+        )
+
+    async def aprocess_response(self, request, response):
+        if not hasattr(request, 'auser'):
+            return response
+        user = await request.auser()
+        if not user.is_authenticated:
+            return response
+        return self.add_session_script(
+            response,
+            await request.session.aget('tab_session_id'),
+            await request.session.aget('is_new_login', False),
+            TAB_COOKIE in request.COOKIES,
+        )
+
+    async def __acall__(self, request):
+        # Native async path: no thread-sensitive sync_to_async hop
+        response = await self.aprocess_request(request)
+        response = response or await self.get_response(request)
+        return await self.aprocess_response(request, response)
+
+    def add_session_script(self, response, session_id, is_new, has_tab_cookie=False):
+        # JSON (e.g. /api/todos/), files and redirects never carry the validator
+        # (redirects are text/html too, so check the status as well)
+        if not response.get('Content-Type', '').startswith('text/html'):
+            return response
+        if 300 <= response.status_code < 400:
+            return response
+
+        if not session_id:
+            return response
+
+        # The page's validator hands the token off again on the way out;
+        # redirects keep the cookie so the followed request still has it
+        if has_tab_cookie:
+            response.delete_cookie(TAB_COOKIE, samesite='Strict')
+
+        tag = session_script_tag(session_id, is_new)
+
+        if response.streaming:
+            injector = _BodyCloseInjector(tag)
+            if response.is_async:
+                response.streaming_content = injector.wrap_async(response.streaming_content)
+            else:
+                response.streaming_content = injector.wrap(response.streaming_content)
+            if response.has_header('Content-Length'):
+                del response['Content-Length']
+        else:
+            response.content = inject_before_body_close(response.content, tag)
+            if response.has_header('Content-Length'):
+                response['Content-Length'] = str(len(response.content))
+
+        return response
+
+
+# The validator itself lives in core/js/session.js so browsers can cache it;
+# only this small tag carrying the per-session values is added to each page.
+BODY_CLOSE = b'</body>'
+
+# </body> sits at the very end of every template, so buffered pages are only
+# searched this far back from the end instead of scanning the whole document.
+BODY_CLOSE_WINDOW = 4096
+
+
+def session_script_tag(session_id, is_new):
+    """Build the <script> tag that loads the validator for this session"""
+    return format_html(
+        '<script src="{}" data-sid="{}" data-new="{}"></script>',
+        asset_url('session.js'),
+        session_id,
+        'true' if is_new else 'false',
+    ).encode('utf-8')
+
+
+def inject_before_body_close(content, tag):
+    """Insert tag in front of the last </body> near the end of content"""
+    idx = content.rfind(BODY_CLOSE, max(0, len(content) - BODY_CLOSE_WINDOW))
+    if idx == -1:
+        return content
+    return b''.join((content[:idx], tag, content[idx:]))
+
+
+class _BodyCloseInjector:
+    """
+    Inserts the tag in front of the first </body> of a streamed response.
+    Only the current chunk plus a few held-back bytes (in case </body> is
+    split across chunks) are ever inspected; once the tag is placed the
+    remaining chunks pass through untouched.
+    """
+
+    def __init__(self, tag):
+        self.tag = tag
+        self.pending = b''
+        self.done = False
+
+    def feed(self, chunk):
+        if self.done:
+            return chunk
+        buf = self.pending + chunk
+        idx = buf.find(BODY_CLOSE)
+        if idx != -1:
+            self.done = True
+            self.pending = b''
+            return b''.join((buf[:idx], self.tag, buf[idx:]))
+        keep = len(BODY_CLOSE) - 1
+        self.pending = buf[-keep:]
+        return buf[:-keep]
+
+    def close(self):
+        rest, self.pending = self.pending, b''
+        return rest
+
+    def wrap(self, chunks):
+        for chunk in chunks:
+            out = self.feed(chunk)
+            if out:
+                yield out
+        rest = self.close()
+        if rest:
+            yield rest
+
+    async def wrap_async(self, chunks):
+        async for chunk in chunks:
+            out = self.feed(chunk)
+            if out:
+                yield out
+        rest = self.close()
+        if rest:
+            yield rest
@@ -0,0 +1,33 @@
+# Generated by Django 5.2.8 on 2026-10-18 09:12
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0004_studentcredentials_branch_code_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='todo',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, default=django.utils.timezone.now),
+            preserve_default=False,
+        ),
+        migrations.AddField(
+            model_name='todo',
+            name='deleted_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='todo',
+            index=models.Index(fields=['user', 'created_at', 'id'], name='todo_user_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='todo',
+            index=models.Index(fields=['user', 'updated_at', 'id'], name='todo_user_updated_idx'),
+        ),
+    ]
@@ -0,0 +1,88 @@
+# Generated by Django 5.2.8 on 2026-10-18 10:03
+
+import secrets
+import string
+
+from django.conf import settings
+from django.db import migrations
+
+BATCH_SIZE = 1000
+
+# Frozen copies of the core.models helpers as of this migration, so it
+# keeps running the same way when those change
+BRANCH_CODE_MAP = {
+    "BCE": "B.Tech in Computer Science and Engineering (Core)",
+    "BAI": "B.Tech in Computer Science and Engineering (AI/ML)",
+    "BCY": "B.Tech in Computer Science and Engineering (Cyber Security)",
+    "BHI": "B.Tech in Computer Science and Engineering (Health Informatics)",
+}
+WIFI_PASSWORD_ALPHABET = string.ascii_letters + string.digits + "!@#$%^&*"
+
+
+def extract_branch_from_username(username):
+    """(code, name) from a 00ABC00000 username, or ("", "")"""
+    if not username or len(username) < 5:
+        return "", ""
+    code = username[2:5].upper()
+    name = BRANCH_CODE_MAP.get(code, "")
+    return code if name else "", name
+
+
+def generate_wifi_password(length=12):
+    return "".join(secrets.choice(WIFI_PASSWORD_ALPHABET) for _ in range(length))
+
+
+def _keyset_chunks(queryset):
+    """Walk queryset in primary-key order, BATCH_SIZE rows at a time"""
+    last_pk = 0
+    while True:
+        chunk = list(queryset.filter(pk__gt=last_pk).order_by('pk')[:BATCH_SIZE])
+        if not chunk:
+            return
+        last_pk = chunk[-1].pk
+        yield chunk
+
+
+def backfill_credentials(apps, schema_editor):
+    """
+    Fill in branch_code/branch_name from the username and create missing
+    credentials rows, which the student pages used to do lazily on GET.
+    """
+    User = apps.get_model(*settings.AUTH_USER_MODEL.split('.'))
+    StudentCredentials = apps.get_model('core', 'StudentCredentials')
+
+    for chunk in _keyset_chunks(StudentCredentials.objects.filter(branch_name='').select_related('user')):
+        updated = []
+        for creds in chunk:
+            code, name = extract_branch_from_username(creds.user.username)
+            if name:
+                creds.branch_code = code
+                creds.branch_name = name
+                updated.append(creds)
+        StudentCredentials.objects.bulk_update(updated, ['branch_code', 'branch_name'])
+
+    for chunk in _keyset_chunks(User.objects.filter(studentcredentials__isnull=True)):
+        missing = []
+        for user in chunk:
+            code, name = extract_branch_from_username(user.username)
+            missing.append(StudentCredentials(
+                user=user,
+                wifi_username=user.username,
+                wifi_password=generate_wifi_password(),
+                library_id=f"LIB{user.id:05d}",
+                branch_code=code,
+                branch_name=name,
+            ))
+        StudentCredentials.objects.bulk_create(missing)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0005_todo_updated_at_deleted_at_and_indexes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_credentials, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,42 @@
+# Generated by Django 5.2.8 on 2026-10-18 11:20
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+def count_branches(apps, schema_editor):
+    """Seed BranchCount from the existing credentials rows"""
+    StudentCredentials = apps.get_model('core', 'StudentCredentials')
+    BranchCount = apps.get_model('core', 'BranchCount')
+    counts = (
+        StudentCredentials.objects.order_by()
+        .values_list('branch_code').annotate(n=models.Count('pk'))
+    )
+    BranchCount.objects.bulk_create([BranchCount(branch_code=code, students=n) for code, n in counts])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0006_backfill_student_credentials'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BranchCount',
+            fields=[
+                ('branch_code', models.CharField(max_length=3, primary_key=True, serialize=False)),
+                ('students', models.PositiveIntegerField(default=0)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='studentcredentials',
+            index=models.Index(fields=['branch_code', 'user'], name='creds_branch_user_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='studentcredentials',
+            index=models.Index(fields=['library_id'], name='creds_library_idx'),
+        ),
+        migrations.RunPython(count_branches, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.8 on 2026-10-18 12:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0007_branchcount_and_directory_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='studentcredentials',
+            name='wifi_rotated_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
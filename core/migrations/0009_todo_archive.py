@@ -0,0 +1,52 @@
+# Generated by Django 5.2.8 on 2026-10-18 13:40
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0008_studentcredentials_wifi_rotated_at'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchivedToDo',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('todo_id', models.BigIntegerField()),
+                ('text', models.CharField(max_length=255)),
+                ('created_at', models.DateTimeField()),
+                ('completed_at', models.DateTimeField()),
+                ('archived_at', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.RemoveIndex(
+            model_name='todo',
+            name='todo_user_created_idx',
+        ),
+        migrations.AddIndex(
+            model_name='todo',
+            index=models.Index(condition=models.Q(('deleted_at__isnull', True)), fields=['user', 'created_at', 'id'], name='todo_alive_user_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='todo',
+            index=models.Index(condition=models.Q(('deleted_at__isnull', True), ('is_done', True)), fields=['updated_at', 'id'], name='todo_done_updated_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='todo',
+            index=models.Index(condition=models.Q(('deleted_at__isnull', False)), fields=['deleted_at'], name='todo_tombstone_idx'),
+        ),
+        migrations.AddField(
+            model_name='archivedtodo',
+            name='user',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddIndex(
+            model_name='archivedtodo',
+            index=models.Index(fields=['user', 'created_at', 'id'], name='archived_user_created_idx'),
+        ),
+    ]
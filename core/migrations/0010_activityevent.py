@@ -0,0 +1,30 @@
+# Generated by Django 5.2.8 on 2026-10-18 15:02
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0009_todo_archive'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ActivityEvent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('action', models.PositiveSmallIntegerField(choices=[(1, 'Login'), (2, 'Login Failed'), (3, 'Logout'), (4, 'Credentials View'), (10, 'Todo Add'), (11, 'Todo Toggle'), (12, 'Todo Delete'), (13, 'Todo Batch')])),
+                ('created_at', models.DateTimeField()),
+                ('ip', models.GenericIPAddressField(null=True)),
+                ('detail', models.CharField(blank=True, max_length=255)),
+                ('user', models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['user', 'created_at'], name='activity_user_created_idx')],
+            },
+        ),
+    ]
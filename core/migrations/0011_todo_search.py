@@ -0,0 +1,69 @@
+# Generated by Django 5.2.8 on 2026-10-18 16:10
+
+from django.db import migrations
+
+# Contentless FTS5 index over live to-dos. "owner" holds a u<user_id> token
+# so a user's search only walks that user's postings. Triggers keep it in
+# step with core_todo, including soft deletes and archiving (deleted_at set).
+CREATE_SQL = [
+    """
+    CREATE VIRTUAL TABLE core_todo_fts USING fts5(
+        text, owner, content='', tokenize='unicode61 remove_diacritics 2', prefix='2 3'
+    )
+    """,
+    # Rank by the text column only
+    "INSERT INTO core_todo_fts(core_todo_fts, rank) VALUES ('rank', 'bm25(1.0, 0.0)')",
+    """
+    CREATE TRIGGER core_todo_fts_insert AFTER INSERT ON core_todo
+    WHEN new.deleted_at IS NULL BEGIN
+        INSERT INTO core_todo_fts(rowid, text, owner) VALUES (new.id, new.text, 'u' || new.user_id);
+    END
+    """,
+    """
+    CREATE TRIGGER core_todo_fts_update AFTER UPDATE OF text, user_id, deleted_at ON core_todo
+    WHEN old.text IS NOT new.text OR old.user_id IS NOT new.user_id OR old.deleted_at IS NOT new.deleted_at
+    BEGIN
+        INSERT INTO core_todo_fts(core_todo_fts, rowid, text, owner)
+            SELECT 'delete', old.id, old.text, 'u' || old.user_id WHERE old.deleted_at IS NULL;
+        INSERT INTO core_todo_fts(rowid, text, owner)
+            SELECT new.id, new.text, 'u' || new.user_id WHERE new.deleted_at IS NULL;
+    END
+    """,
+    """
+    CREATE TRIGGER core_todo_fts_delete AFTER DELETE ON core_todo
+    WHEN old.deleted_at IS NULL BEGIN
+        INSERT INTO core_todo_fts(core_todo_fts, rowid, text, owner) VALUES ('delete', old.id, old.text, 'u' || old.user_id);
+    END
+    """,
+    """
+    INSERT INTO core_todo_fts(rowid, text, owner)
+        SELECT id, text, 'u' || user_id FROM core_todo WHERE deleted_at IS NULL
+    """,
+]
+
+DROP_SQL = [
+    "DROP TRIGGER IF EXISTS core_todo_fts_insert",
+    "DROP TRIGGER IF EXISTS core_todo_fts_update",
+    "DROP TRIGGER IF EXISTS core_todo_fts_delete",
+    "DROP TABLE IF EXISTS core_todo_fts",
+]
+
+
+def _run(statements):
+    def run(apps, schema_editor):
+        if schema_editor.connection.vendor != 'sqlite':
+            return
+        for sql in statements:
+            schema_editor.execute(sql)
+    return run
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0010_activityevent'),
+    ]
+
+    operations = [
+        migrations.RunPython(_run(CREATE_SQL), _run(DROP_SQL)),
+    ]
@@ -0,0 +1,119 @@
+# Generated by Django 5.2.8 on 2026-10-18 17:05
+
+from django.conf import settings
+from django.db import migrations, models
+
+# Frozen copies of core.ranks and core.search as of this migration, so it
+# keeps running the same way when those modules change
+
+RANK_DIGITS = "0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz"
+RANK_BASE = len(RANK_DIGITS)
+
+TRIGGER_SQL = [
+    """
+    CREATE TRIGGER IF NOT EXISTS core_todo_fts_insert AFTER INSERT ON core_todo
+    WHEN new.deleted_at IS NULL BEGIN
+        INSERT INTO core_todo_fts(rowid, text, owner) VALUES (new.id, new.text, 'u' || new.user_id);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS core_todo_fts_update AFTER UPDATE OF text, user_id, deleted_at ON core_todo
+    WHEN old.text IS NOT new.text OR old.user_id IS NOT new.user_id OR old.deleted_at IS NOT new.deleted_at
+    BEGIN
+        INSERT INTO core_todo_fts(core_todo_fts, rowid, text, owner)
+            SELECT 'delete', old.id, old.text, 'u' || old.user_id WHERE old.deleted_at IS NULL;
+        INSERT INTO core_todo_fts(rowid, text, owner)
+            SELECT new.id, new.text, 'u' || new.user_id WHERE new.deleted_at IS NULL;
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS core_todo_fts_delete AFTER DELETE ON core_todo
+    WHEN old.deleted_at IS NULL BEGIN
+        INSERT INTO core_todo_fts(core_todo_fts, rowid, text, owner) VALUES ('delete', old.id, old.text, 'u' || old.user_id);
+    END
+    """,
+]
+
+REBUILD_SQL = [
+    "INSERT INTO core_todo_fts(core_todo_fts) VALUES ('delete-all')",
+    """
+    INSERT INTO core_todo_fts(rowid, text, owner)
+        SELECT id, text, 'u' || user_id FROM core_todo WHERE deleted_at IS NULL
+    """,
+    "INSERT INTO core_todo_fts(core_todo_fts) VALUES ('optimize')",
+]
+
+
+def evenly_spaced(count):
+    """count short rank keys spread evenly over the whole range"""
+    width = 1
+    while RANK_BASE ** width <= (count + 1) * RANK_BASE:
+        width += 1
+    gap = RANK_BASE ** width // (count + 1)
+    keys = []
+    for i in range(count):
+        value, digits = gap * (i + 1), []
+        for _ in range(width):
+            value, digit = divmod(value, RANK_BASE)
+            digits.append(RANK_DIGITS[digit])
+        keys.append("".join(reversed(digits)).rstrip("0"))
+    return keys
+
+
+def backfill_ranks(apps, schema_editor):
+    """Keep each user's list in creation order, with evenly spaced keys"""
+    ToDo = apps.get_model('core', 'ToDo')
+    user_ids = ToDo.objects.filter(deleted_at__isnull=True).order_by().values_list('user_id', flat=True).distinct()
+    for user_id in user_ids:
+        todos = list(
+            ToDo.objects.filter(user_id=user_id, deleted_at__isnull=True)
+            .order_by('created_at', 'id').only('id')
+        )
+        for todo, rank in zip(todos, evenly_spaced(len(todos))):
+            todo.rank = rank
+        ToDo.objects.bulk_update(todos, ['rank'], batch_size=1000)
+
+
+def restore_search_triggers(apps, schema_editor):
+    """
+    Adding rank (or removing it when unapplied) makes SQLite rebuild
+    core_todo, which drops the search triggers from 0011: put them back and
+    reindex what the table holds.
+    """
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    for sql in [*TRIGGER_SQL, *REBUILD_SQL]:
+        schema_editor.execute(sql)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0011_todo_search'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        # Runs last when the migration is unapplied
+        migrations.RunPython(migrations.RunPython.noop, restore_search_triggers),
+        migrations.AlterField(
+            model_name='activityevent',
+            name='action',
+            field=models.PositiveSmallIntegerField(choices=[(1, 'Login'), (2, 'Login Failed'), (3, 'Logout'), (4, 'Credentials View'), (10, 'Todo Add'), (11, 'Todo Toggle'), (12, 'Todo Delete'), (13, 'Todo Batch'), (14, 'Todo Move')]),
+        ),
+        migrations.AddField(
+            model_name='todo',
+            name='rank',
+            field=models.CharField(blank=True, default='', max_length=64),
+        ),
+        migrations.RunPython(backfill_ranks, migrations.RunPython.noop),
+        migrations.RemoveIndex(
+            model_name='todo',
+            name='todo_alive_user_created_idx',
+        ),
+        migrations.AddIndex(
+            model_name='todo',
+            index=models.Index(condition=models.Q(('deleted_at__isnull', True)), fields=['user', 'rank', 'id'], name='todo_alive_user_rank_idx'),
+        ),
+        migrations.RunPython(restore_search_triggers, migrations.RunPython.noop),
+    ]
@@ -1,9 +1,16 @@
 import secrets
 import string
-from django.db import models
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import models, router, transaction
+from django.db.models import F, Q
 from django.contrib.auth.models import User
-from django.db.models.signals import post_save
+from django.core.cache import caches
+from django.db.models.signals import post_delete, post_save
 from django.dispatch import receiver
+from django.utils import timezone
+
+from .ranks import rank_between
 
 BRANCH_CODE_MAP = {
     "BCE": "B.Tech in Computer Science and Engineering (Core)",
@@ -26,38 +33,273 @@ def extract_branch_from_username(username: str):
     return code if name else "", name
 
 
+class ToDoQuerySet(models.QuerySet):
+    def alive(self):
+        """Exclude deletion tombstones"""
+        return self.filter(deleted_at__isnull=True)
+
+    def soft_delete(self):
+        """
+        Replace rows with tombstones so delta sync can report the deletion.
+        Returns the number of rows affected.
+        """
+        # Stamped under the write lock, see ToDo.updated_at
+        with transaction.atomic(using=self._db or router.db_for_write(self.model)):
+            now = timezone.now()
+            return self.alive().update(deleted_at=now, updated_at=now)
+
+    async def asoft_delete(self):
+        return await sync_to_async(self.soft_delete)()
+
+    def last_rank(self, user_id):
+        """Rank of the user's last live todo, "" for an empty list"""
+        rank = self.alive().filter(user_id=user_id).order_by("-rank").values_list("rank", flat=True).first()
+        return rank or ""
+
+
 class ToDo(models.Model):
+    # Triggers on this table keep the search index (core/search.py) current.
+    # Schema changes that make SQLite rebuild the table drop them: migrations
+    # doing so must recreate them (see 0012), and post_migrate restores any
+    # still missing.
     user = models.ForeignKey(User, on_delete=models.CASCADE)
     text = models.CharField(max_length=255)
     is_done = models.BooleanField(default=False)
     created_at = models.DateTimeField(auto_now_add=True)
+    # Bumped on every change (including deletion) to drive delta sync, which
+    # needs it in commit order: stamp it inside transaction.atomic(), whose
+    # BEGIN IMMEDIATE takes the write lock first (not so under the stock
+    # DEFERRED profile).
+    updated_at = models.DateTimeField(auto_now=True)
+    # Set instead of deleting the row; see ToDoQuerySet.soft_delete
+    deleted_at = models.DateTimeField(null=True, blank=True)
+    # Position in the user's list; see core.ranks. Compared bytewise, which
+    # is SQLite's default collation (other backends need a "C" collation)
+    rank = models.CharField(max_length=64, blank=True, default="")
+
+    objects = ToDoQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            # The live list in the user's order, keyset paginated; tombstones stay out of it
+            models.Index(
+                fields=["user", "rank", "id"], condition=Q(deleted_at__isnull=True),
+                name="todo_alive_user_rank_idx",
+            ),
+            # Delta sync and ETag lookups: (user, updated_at, id)
+            models.Index(fields=["user", "updated_at", "id"], name="todo_user_updated_idx"),
+            # archive_todos: completed items, oldest first
+            models.Index(
+                fields=["updated_at", "id"], condition=Q(is_done=True, deleted_at__isnull=True),
+                name="todo_done_updated_idx",
+            ),
+            # archive_todos: tombstones due for purging
+            models.Index(
+                fields=["deleted_at"], condition=Q(deleted_at__isnull=False),
+                name="todo_tombstone_idx",
+            ),
+        ]
+
+    def save(self, *args, **kwargs):
+        # One transaction, so the rank and auto_now are read once this write
+        # holds the lock (see updated_at)
+        with transaction.atomic(using=kwargs.get("using") or router.db_for_write(ToDo, instance=self)):
+            # New todos go to the end of the list (bulk_create callers set rank themselves)
+            if self._state.adding and not self.rank:
+                self.rank = rank_between(ToDo.objects.last_rank(self.user_id), None)
+            super().save(*args, **kwargs)
+
+    def __str__(self):
+        return self.text
+
+
+class ArchivedToDo(models.Model):
+    """Completed to-do moved out of the hot ToDo table by archive_todos"""
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    todo_id = models.BigIntegerField()
+    text = models.CharField(max_length=255)
+    created_at = models.DateTimeField()
+    # updated_at of the ToDo when it was archived, i.e. roughly when it was ticked off
+    completed_at = models.DateTimeField()
+    archived_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["user", "created_at", "id"], name="archived_user_created_idx"),
+        ]
 
     def __str__(self):
         return self.text
+
+
+class ActivityEvent(models.Model):
+    """Audit record written in batches by core.activity"""
+
+    class Action(models.IntegerChoices):
+        LOGIN = 1
+        LOGIN_FAILED = 2
+        LOGOUT = 3
+        CREDENTIALS_VIEW = 4
+        TODO_ADD = 10
+        TODO_TOGGLE = 11
+        TODO_DELETE = 12
+        TODO_BATCH = 13
+        TODO_MOVE = 14
+
+    # Kept when the account goes; failed logins have no user
+    user = models.ForeignKey(User, null=True, on_delete=models.SET_NULL)
+    action = models.PositiveSmallIntegerField(choices=Action.choices)
+    created_at = models.DateTimeField()
+    ip = models.GenericIPAddressField(null=True)
+    # Short free-form context: to-do id, attempted username, ...
+    detail = models.CharField(max_length=255, blank=True)
+
+    class Meta:
+        indexes = [
+            # "last N events for user X", newest first
+            models.Index(fields=["user", "created_at"], name="activity_user_created_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.get_action_display()} by {self.user_id} at {self.created_at}"
+
+
 class StudentCredentials(models.Model):
     user = models.OneToOneField(User, on_delete=models.CASCADE)
 
     wifi_username = models.CharField(max_length=100, blank=True)
     wifi_password = models.CharField(max_length=100, blank=True)
+    # Last run of rotate_wifi_credentials that changed wifi_password
+    wifi_rotated_at = models.DateTimeField(null=True, blank=True)
     library_id = models.CharField(max_length=100, blank=True)
     # Branch information derived from username pattern (e.g. 00BCE00000)
     branch_code = models.CharField(max_length=3, blank=True)
     branch_name = models.CharField(max_length=150, blank=True)
 
+    class Meta:
+        indexes = [
+            # Staff directory: branch filter walked in user order
+            models.Index(fields=["branch_code", "user"], name="creds_branch_user_idx"),
+            models.Index(fields=["library_id"], name="creds_library_idx"),
+        ]
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remembered so a branch change can move the student between BranchCounts
+        instance._loaded_branch_code = instance.__dict__.get("branch_code")
+        return instance
+
     def __str__(self):
         return f"{self.user.username} Credentials"
+
+
+class BranchCount(models.Model):
+    """
+    Number of students per branch_code, kept up to date alongside
+    StudentCredentials so the directory never counts the whole table.
+    branch_code "" holds students whose username has no known branch.
+    """
+    branch_code = models.CharField(max_length=3, primary_key=True)
+    students = models.PositiveIntegerField(default=0)
+
+    @classmethod
+    def adjust(cls, deltas):
+        """Apply {branch_code: +/-n} to the counters"""
+        deltas = {code: delta for code, delta in deltas.items() if delta}
+        if not deltas:
+            return
+        cls.objects.bulk_create([cls(branch_code=code) for code in deltas], ignore_conflicts=True)
+        for code, delta in deltas.items():
+            cls.objects.filter(branch_code=code).update(students=F("students") + delta)
+
+    @classmethod
+    def rebuild(cls):
+        """Recount from StudentCredentials (after raw SQL or restores)"""
+        counts = (
+            StudentCredentials.objects.order_by()
+            .values_list("branch_code").annotate(n=models.Count("pk"))
+        )
+        with transaction.atomic():
+            cls.objects.all().delete()
+            cls.objects.bulk_create([cls(branch_code=code, students=n) for code, n in counts])
+
+    def __str__(self):
+        return f"{self.branch_code or '-'}: {self.students}"
+WIFI_PASSWORD_ALPHABET = string.ascii_letters + string.digits + "!@#$%^&*"
+
+# Byte -> password character, and the bytes to discard so every character
+# stays equally likely (256 is not a multiple of the alphabet size)
+_WIFI_TABLE = bytes(ord(WIFI_PASSWORD_ALPHABET[b % len(WIFI_PASSWORD_ALPHABET)]) for b in range(256))
+_WIFI_REJECT = bytes(range(256 - 256 % len(WIFI_PASSWORD_ALPHABET), 256))
+
+
+def generate_wifi_passwords(count, length=12):
+    """
+    count passwords from one secrets.token_bytes() draw, mapped onto the
+    alphabet with bytes.translate (topped up in the rare case too many
+    bytes were rejected).
+    """
+    needed = count * length
+    chars = b""
+    while len(chars) < needed:
+        missing = needed - len(chars)
+        # ~18% of bytes are rejected; overdraw so one round nearly always suffices
+        chars += secrets.token_bytes(missing * 5 // 4 + 16).translate(_WIFI_TABLE, _WIFI_REJECT)
+    text = chars[:needed].decode("ascii")
+    return [text[i:i + length] for i in range(0, needed, length)]
+
+
 def generate_wifi_password(length=12):
-    chars = string.ascii_letters + string.digits + "!@#$%^&*"
-    return ''.join(secrets.choice(chars) for _ in range(length))
+    return generate_wifi_passwords(1, length)[0]
+def build_credentials(user):
+    """Unsaved StudentCredentials with the defaults for a new student"""
+    branch_code, branch_name = extract_branch_from_username(user.username)
+    return StudentCredentials(
+        user=user,
+        wifi_username=user.username,
+        wifi_password=generate_wifi_password(),
+        library_id=f"LIB{user.id:05d}",  # Example auto ID
+        branch_code=branch_code,
+        branch_name=branch_name,
+    )
 @receiver(post_save, sender=User)
 def create_credentials(sender, instance, created, **kwargs):
     if created:
-        branch_code, branch_name = extract_branch_from_username(instance.username)
-        StudentCredentials.objects.create(
-            user=instance,
-            wifi_username=instance.username,  
-            wifi_password=generate_wifi_password(),  
-            library_id=f"LIB{instance.id:05d}",  # Example auto ID
-            branch_code=branch_code,
-            branch_name=branch_name,
-        )
\ No newline at end of file
+        build_credentials(instance).save()
+
+
+@receiver(post_save, sender=StudentCredentials)
+def count_branch_on_save(sender, instance, created, **kwargs):
+    if created:
+        BranchCount.adjust({instance.branch_code: 1})
+    else:
+        old = getattr(instance, "_loaded_branch_code", None)
+        if old is not None and old != instance.branch_code:
+            BranchCount.adjust({old: -1, instance.branch_code: 1})
+    instance._loaded_branch_code = instance.branch_code
+
+
+@receiver(post_delete, sender=StudentCredentials)
+def count_branch_on_delete(sender, instance, **kwargs):
+    BranchCount.adjust({instance.branch_code: -1})
+
+
+STUDENT_CACHE_ALIAS = getattr(settings, "STUDENT_CACHE_ALIAS", "students")
+
+
+def student_cache():
+    """Cache holding the StudentCredentials loaded by core.student"""
+    return caches[STUDENT_CACHE_ALIAS]
+
+
+def student_cache_key(user_id):
+    """Key of a student's entry in student_cache()"""
+    return f"student:{user_id}"
+
+
+@receiver([post_save, post_delete], sender=User)
+@receiver([post_save, post_delete], sender=StudentCredentials)
+def invalidate_student_cache(sender, instance, **kwargs):
+    user_id = instance.pk if sender is User else instance.user_id
+    student_cache().delete(student_cache_key(user_id))
@@ -0,0 +1,99 @@
+"""
+Lexicographic rank keys for ordering a user's to-dos.
+
+A key is a base-62 fraction written without the leading "0." and without
+trailing zeros ("V" is 0.5). The digits are in ASCII order, so comparing
+keys as strings (SQLite's BINARY collation) compares the fractions, and a
+key strictly between any two different keys always exists: moving an item
+only rewrites that item's key.
+
+Keys grow when the same gap is split over and over (about one character
+per six moves into the same spot). rebalance_todo_ranks rewrites a list
+with evenly spaced short keys once its keys get longer than
+TODO_RANK_REBALANCE_LENGTH.
+"""
+DIGITS = "0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz"
+BASE = len(DIGITS)
+
+# Appending at either end steps this digit, so a list can grow by
+# 62**3 / 2 items in each direction before keys get longer
+STEP_DIGITS = 3
+
+_VALUE = {digit: value for value, digit in enumerate(DIGITS)}
+
+
+def _midpoint(a, b):
+    # a < b (b None: the end), neither with trailing zeros; a may be ""
+    if b is not None:
+        n = 0
+        while n < len(b) and (a[n] if n < len(a) else "0") == b[n]:
+            n += 1
+        if n:
+            return b[:n] + _midpoint(a[n:], b[n:])
+    low = _VALUE[a[0]] if a else 0
+    high = _VALUE[b[0]] if b is not None else BASE
+    if high - low > 1:
+        return DIGITS[(low + high + 1) // 2]
+    # Adjacent first digits: go one digit deeper
+    if b is not None and len(b) > 1:
+        return b[0]
+    return DIGITS[low] + _midpoint(a[1:], None)
+
+
+def _to_digits(value, width):
+    out = []
+    for _ in range(width):
+        value, digit = divmod(value, BASE)
+        out.append(DIGITS[digit])
+    return "".join(reversed(out))
+
+
+def _step(key, delta):
+    # key truncated to STEP_DIGITS, plus delta in its last place; None if
+    # that runs off either end of (0, 1)
+    value = 0
+    for digit in key[:STEP_DIGITS].ljust(STEP_DIGITS, "0"):
+        value = value * BASE + _VALUE[digit]
+    value += delta
+    if not 0 < value < BASE ** STEP_DIGITS:
+        return None
+    return _to_digits(value, STEP_DIGITS).rstrip("0")
+
+
+def rank_between(before, after):
+    """
+    Key sorting after `before` and ahead of `after`. before "" is the start
+    of the list and after None its end. Returns None when there is no room,
+    i.e. before >= after (ties left by concurrent appends).
+    """
+    if after is None:
+        if not before:
+            return _midpoint("", None)
+        # Appending: step instead of halving the remaining space, which
+        # would add a character every few items
+        key = _step(before, 1)
+        return key if key is not None and key > before else _midpoint(before, None)
+    if before >= after:
+        return None
+    if not before:
+        key = _step(after, -1)
+        return key if key is not None and key < after else _midpoint("", after)
+    return _midpoint(before, after)
+
+
+def ranks_after(before, count):
+    """count increasing keys after `before`, for appending several items"""
+    keys = []
+    for _ in range(count):
+        before = rank_between(before, None)
+        keys.append(before)
+    return keys
+
+
+def evenly_spaced(count):
+    """count short keys spread evenly over the whole range"""
+    width = 1
+    while BASE ** width <= (count + 1) * BASE:
+        width += 1
+    gap = BASE ** width // (count + 1)
+    return [_to_digits(gap * (i + 1), width).rstrip("0") for i in range(count)]
@@ -0,0 +1,143 @@
+"""
+Read replicas with read-your-writes stickiness.
+
+settings.READ_REPLICAS lists database aliases holding copies of 'default'
+(locally: SQLite files refreshed by `manage.py sync_replicas`). During a
+request, PrimaryReplicaRouter sends reads to a random replica and every
+write to 'default'. Reads stay on the primary:
+
+- outside a request (management commands, the activity writer, shells)
+- for sessions, which are written on almost every request
+- inside transaction.atomic() blocks on the primary (read-then-write)
+- for the rest of a request that has written anything, and for the next
+  REPLICA_STICKY_SECONDS from that browser, flagged by a short-lived
+  cookie, so a student always sees the to-do or profile they just changed
+  however far behind the replicas are
+"""
+import contextvars
+import random
+import sqlite3
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections, router
+
+READ_REPLICAS = list(getattr(settings, "READ_REPLICAS", []))
+STICKY_SECONDS = getattr(settings, "REPLICA_STICKY_SECONDS", 5)
+STICKY_COOKIE = "vtop_primary"
+
+# Apps whose rows are read right after being written on every request
+PRIMARY_ONLY_APPS = {"sessions"}
+
+_routing = contextvars.ContextVar("replica_routing", default=None)
+
+
+class _RoutingState:
+    __slots__ = ("pinned", "wrote")
+
+    def __init__(self, pinned):
+        self.pinned = pinned
+        self.wrote = False
+
+
+class PrimaryReplicaRouter:
+    def db_for_read(self, model, **hints):
+        state = _routing.get()
+        if state is None or not READ_REPLICAS:
+            return None
+        if state.pinned or state.wrote or model._meta.app_label in PRIMARY_ONLY_APPS:
+            return "default"
+        if connections["default"].in_atomic_block:
+            return "default"
+        instance = hints.get("instance")
+        if instance is not None and instance._state.db:
+            return instance._state.db
+        return random.choice(READ_REPLICAS)
+
+    def db_for_write(self, model, **hints):
+        state = _routing.get()
+        if state is not None and model._meta.app_label not in PRIMARY_ONLY_APPS:
+            state.wrote = True
+        return "default"
+
+    def allow_relation(self, obj1, obj2, **hints):
+        dbs = {"default", *READ_REPLICAS}
+        if obj1._state.db in dbs and obj2._state.db in dbs:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # Replicas get the schema along with the data from sync_replicas
+        if db in READ_REPLICAS:
+            return False
+        return None
+
+
+def read_alias(model):
+    """
+    The database a read of model goes to right now. Pass it to .using() so
+    related reads see the same copy, and only cache what came from the
+    primary: a replica's rows can lag by more than REPLICA_STICKY_SECONDS,
+    and a cached copy would outlive the pin that hides that lag.
+    """
+    return router.db_for_read(model) or DEFAULT_DB_ALIAS
+
+
+def is_primary(alias):
+    return alias == DEFAULT_DB_ALIAS
+
+
+class ReplicaRoutingMiddleware:
+    """
+    Marks the request for PrimaryReplicaRouter and pins the browser to the
+    primary after a write. Goes before SessionMiddleware so the session
+    and user lookups are routed too.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        state = _RoutingState(STICKY_COOKIE in request.COOKIES)
+        token = _routing.set(state)
+        try:
+            response = self.get_response(request)
+        finally:
+            _routing.reset(token)
+        return self.pin(state, response)
+
+    async def __acall__(self, request):
+        state = _RoutingState(STICKY_COOKIE in request.COOKIES)
+        token = _routing.set(state)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _routing.reset(token)
+        return self.pin(state, response)
+
+    def pin(self, state, response):
+        if state.wrote and READ_REPLICAS:
+            response.set_cookie(STICKY_COOKIE, "1", max_age=STICKY_SECONDS, httponly=True, samesite="Lax")
+        return response
+
+
+def sync_replica(alias, source="default"):
+    """
+    Copy the primary SQLite database into a replica file with the online
+    backup API. Readers of the replica keep their snapshot until the copy
+    commits, and their connections stay valid (the file is not replaced).
+    """
+    src = sqlite3.connect(connections[source].settings_dict["NAME"])
+    dst = sqlite3.connect(connections[alias].settings_dict["NAME"], timeout=20)
+    try:
+        src.backup(dst)
+    finally:
+        dst.close()
+        src.close()
@@ -0,0 +1,164 @@
+"""
+Full-text search over a user's live to-dos.
+
+Backed by the core_todo_fts FTS5 table (migration 0011): contentless,
+trigger-maintained, with prefix indexes for 2 and 3 characters and an
+"owner" token per row so a search only intersects the user's own postings.
+Every word of the query is matched as a prefix ("lab rec" finds "Submit lab
+record"), results are ordered by bm25 relevance, and `manage.py
+rebuild_todo_search` rebuilds the index.
+
+bm25 scores depend on statistics over every user's rows, so they move
+whenever anyone's to-dos change and can't serve as a keyset cursor. Pages
+are offsets into the ranking instead, limited to the first
+SEARCH_MAX_RESULTS matches. The order of a user's own matches barely
+changes between requests, but paging is best-effort: a result may repeat
+or be skipped across pages when the scores shift in between.
+
+SQLite drops a table's triggers when a migration rebuilds the table (most
+AlterField/AddField operations on core_todo do), so install_triggers()
+runs after every migrate and puts back any that are missing.
+"""
+import logging
+import re
+
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+
+from .models import ToDo
+
+SEARCH_PAGE_SIZE = 20
+SEARCH_MAX_PAGE_SIZE = 100
+SEARCH_MAX_TERMS = 8
+# Deepest a client can page; refine the query to see more
+SEARCH_MAX_RESULTS = SEARCH_MAX_PAGE_SIZE * 5
+
+_WORD = re.compile(r"\w+")
+
+logger = logging.getLogger(__name__)
+
+SEARCH_SQL = """
+    SELECT t.id, t.text, t.is_done, t.created_at, t.updated_at
+    FROM core_todo_fts AS f JOIN core_todo AS t ON t.id = f.rowid
+    WHERE f.core_todo_fts MATCH %s AND t.user_id = %s
+    ORDER BY f.rank, f.rowid
+    LIMIT %s OFFSET %s
+"""
+
+# Same triggers as migration 0011, safe to run again
+TRIGGER_SQL = {
+    "core_todo_fts_insert": """
+    CREATE TRIGGER IF NOT EXISTS core_todo_fts_insert AFTER INSERT ON core_todo
+    WHEN new.deleted_at IS NULL BEGIN
+        INSERT INTO core_todo_fts(rowid, text, owner) VALUES (new.id, new.text, 'u' || new.user_id);
+    END
+    """,
+    "core_todo_fts_update": """
+    CREATE TRIGGER IF NOT EXISTS core_todo_fts_update AFTER UPDATE OF text, user_id, deleted_at ON core_todo
+    WHEN old.text IS NOT new.text OR old.user_id IS NOT new.user_id OR old.deleted_at IS NOT new.deleted_at
+    BEGIN
+        INSERT INTO core_todo_fts(core_todo_fts, rowid, text, owner)
+            SELECT 'delete', old.id, old.text, 'u' || old.user_id WHERE old.deleted_at IS NULL;
+        INSERT INTO core_todo_fts(rowid, text, owner)
+            SELECT new.id, new.text, 'u' || new.user_id WHERE new.deleted_at IS NULL;
+    END
+    """,
+    "core_todo_fts_delete": """
+    CREATE TRIGGER IF NOT EXISTS core_todo_fts_delete AFTER DELETE ON core_todo
+    WHEN old.deleted_at IS NULL BEGIN
+        INSERT INTO core_todo_fts(core_todo_fts, rowid, text, owner) VALUES ('delete', old.id, old.text, 'u' || old.user_id);
+    END
+    """,
+}
+
+REBUILD_SQL = [
+    "INSERT INTO core_todo_fts(core_todo_fts) VALUES ('delete-all')",
+    """
+    INSERT INTO core_todo_fts(rowid, text, owner)
+        SELECT id, text, 'u' || user_id FROM core_todo WHERE deleted_at IS NULL
+    """,
+    "INSERT INTO core_todo_fts(core_todo_fts) VALUES ('optimize')",
+]
+
+
+def match_expression(user_id, q):
+    """FTS5 query for q scoped to user_id; raises ValueError if q has no words"""
+    terms = _WORD.findall(q.lower())[:SEARCH_MAX_TERMS]
+    if not terms:
+        raise ValueError("q must contain at least one word")
+    # Quoted, so FTS5 operators typed by the user are searched as plain words
+    prefixes = " ".join(f'"{term}"*' for term in terms)
+    return f'owner:"u{user_id}" AND text:({prefixes})'
+
+
+def parse_search_params(params):
+    """(q, after, limit) from a QueryDict; raises ValueError"""
+    q = params.get("q", "").strip()
+    if not q:
+        raise ValueError("q is required")
+    limit = min(int(params.get("limit", SEARCH_PAGE_SIZE)), SEARCH_MAX_PAGE_SIZE)
+    if limit < 1:
+        raise ValueError("limit must be positive")
+    offset = int(params.get("after") or 0)
+    if not 0 <= offset < SEARCH_MAX_RESULTS:
+        raise ValueError("Invalid cursor")
+    return q, offset, min(limit, SEARCH_MAX_RESULTS - offset)
+
+
+def search_query(user_id, q, offset=0, limit=SEARCH_PAGE_SIZE):
+    """One page of matches plus one extra row to detect a next page"""
+    params = [match_expression(user_id, q), user_id, limit + 1, offset]
+    return ToDo.objects.raw(SEARCH_SQL, params)
+
+
+def search_payload(rows, offset, limit):
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        if offset + limit < SEARCH_MAX_RESULTS:
+            next_cursor = str(offset + limit)
+    return {
+        "items": [
+            {"id": todo.id, "text": todo.text, "is_done": todo.is_done,
+             "created_at": todo.created_at, "updated_at": todo.updated_at}
+            for todo in rows
+        ],
+        "next": next_cursor,
+    }
+
+
+def rebuild_index(using=DEFAULT_DB_ALIAS):
+    """Repopulate core_todo_fts from core_todo and merge its segments"""
+    with transaction.atomic(using):
+        with connections[using].cursor() as cursor:
+            for sql in REBUILD_SQL:
+                cursor.execute(sql)
+
+
+def missing_triggers(using=DEFAULT_DB_ALIAS):
+    """Names of the index triggers absent from core_todo (None: no index here)"""
+    connection = connections[using]
+    if connection.vendor != "sqlite":
+        return None
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT type, name FROM sqlite_master WHERE name = 'core_todo_fts' OR type = 'trigger'")
+        found = {name for _, name in cursor.fetchall()}
+    if "core_todo_fts" not in found:
+        return None
+    return [name for name in TRIGGER_SQL if name not in found]
+
+
+def install_triggers(using=DEFAULT_DB_ALIAS):
+    """
+    Create any missing index triggers and rebuild the index, since rows
+    written while they were gone were never indexed. Returns their names.
+    """
+    missing = missing_triggers(using)
+    if not missing:
+        return []
+    with transaction.atomic(using):
+        with connections[using].cursor() as cursor:
+            for name in missing:
+                cursor.execute(TRIGGER_SQL[name])
+        rebuild_index(using)
+    logger.warning("Recreated to-do search triggers %s and rebuilt the index", ", ".join(missing))
+    return missing
@@ -0,0 +1,11 @@
+"""
+Session engines that keep the sliding expiry of SESSION_SAVE_EVERY_REQUEST
+without writing the session row on every request.
+
+    SESSION_ENGINE = 'core.sessions.db'         # database only
+    SESSION_ENGINE = 'core.sessions.cached_db'  # cache first, database fallback
+
+A save is skipped when the data is unchanged and the stored expiry is still
+within SESSION_SAVE_SLACK seconds of a full SESSION_COOKIE_AGE, so the
+effective idle timeout lies between AGE - SLACK and AGE.
+"""
@@ -0,0 +1,58 @@
+from django.conf import settings
+from django.utils import timezone
+
+
+class CoalescingSaveMixin:
+    """
+    Skips redundant saves. Must come before a database-backed SessionStore
+    in the bases so it can see the expire_date that was loaded.
+    """
+
+    # expire_date of the row as last read from or written to storage
+    _stored_expiry = None
+
+    @property
+    def save_slack(self):
+        return getattr(settings, "SESSION_SAVE_SLACK", 60)
+
+    def _get_session_from_db(self):
+        s = super()._get_session_from_db()
+        self._stored_expiry = s.expire_date if s else None
+        return s
+
+    async def _aget_session_from_db(self):
+        s = await super()._aget_session_from_db()
+        self._stored_expiry = s.expire_date if s else None
+        return s
+
+    def _expiry_is_fresh(self):
+        if self._stored_expiry is None:
+            return False
+        remaining = (self._stored_expiry - timezone.now()).total_seconds()
+        return remaining > self.get_expiry_age() - self.save_slack
+
+    def _can_skip_save(self, must_create):
+        if must_create or self.session_key is None or self.modified:
+            return False
+        if not hasattr(self, "_session_cache"):
+            self._get_session()  # populates _stored_expiry
+        return self._expiry_is_fresh()
+
+    async def _acan_skip_save(self, must_create):
+        if must_create or self.session_key is None or self.modified:
+            return False
+        if not hasattr(self, "_session_cache"):
+            await self._aget_session()
+        return self._expiry_is_fresh()
+
+    def save(self, must_create=False):
+        if self._can_skip_save(must_create):
+            return
+        super().save(must_create=must_create)
+        self._stored_expiry = self.get_expiry_date()
+
+    async def asave(self, must_create=False):
+        if await self._acan_skip_save(must_create):
+            return
+        await super().asave(must_create=must_create)
+        self._stored_expiry = await self.aget_expiry_date()
@@ -0,0 +1,81 @@
+import logging
+
+from django.contrib.sessions.backends import cached_db
+from django.contrib.sessions.backends.db import SessionStore as DBStore
+
+from .base import CoalescingSaveMixin
+
+# Entries are (data, expire_date) tuples, unlike Django's cached_db
+KEY_PREFIX = "vtop.sessions.cached_db"
+
+logger = logging.getLogger("django.contrib.sessions")
+
+
+class SessionStore(CoalescingSaveMixin, cached_db.SessionStore):
+    """
+    Cache-first sessions with the database as fallback and source of truth.
+    The cached entry carries the row's expire_date so unchanged requests can
+    be answered and skipped without touching the database at all.
+    """
+
+    cache_key_prefix = KEY_PREFIX
+
+    def load(self):
+        try:
+            entry = self._cache.get(self.cache_key)
+        except Exception:
+            entry = None
+        if entry is not None:
+            data, self._stored_expiry = entry
+            return data
+
+        s = self._get_session_from_db()
+        if not s:
+            return {}
+        data = self.decode(s.session_data)
+        self._cache.set(self.cache_key, (data, s.expire_date), self.get_expiry_age(expiry=s.expire_date))
+        return data
+
+    async def aload(self):
+        try:
+            entry = await self._cache.aget(await self.acache_key())
+        except Exception:
+            entry = None
+        if entry is not None:
+            data, self._stored_expiry = entry
+            return data
+
+        s = await self._aget_session_from_db()
+        if not s:
+            return {}
+        data = self.decode(s.session_data)
+        await self._cache.aset(
+            await self.acache_key(),
+            (data, s.expire_date),
+            await self.aget_expiry_age(expiry=s.expire_date),
+        )
+        return data
+
+    def save(self, must_create=False):
+        if self._can_skip_save(must_create):
+            return
+        DBStore.save(self, must_create)
+        self._stored_expiry = self.get_expiry_date()
+        try:
+            self._cache.set(self.cache_key, (self._session, self._stored_expiry), self.get_expiry_age())
+        except Exception:
+            logger.exception("Error saving to cache (%s)", self._cache)
+
+    async def asave(self, must_create=False):
+        if await self._acan_skip_save(must_create):
+            return
+        await DBStore.asave(self, must_create)
+        self._stored_expiry = await self.aget_expiry_date()
+        try:
+            await self._cache.aset(
+                await self.acache_key(),
+                (self._session, self._stored_expiry),
+                await self.aget_expiry_age(),
+            )
+        except Exception:
+            logger.exception("Error saving to cache (%s)", self._cache)
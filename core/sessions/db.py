@@ -0,0 +1,7 @@
+from django.contrib.sessions.backends import db
+
+from .base import CoalescingSaveMixin
+
+
+class SessionStore(CoalescingSaveMixin, db.SessionStore):
+    """Database-backed sessions that only write when needed"""
@@ -0,0 +1,56 @@
+(function () {
+  // Injected by SingleSessionMiddleware as:
+  //   <script src=".../session.js" data-sid="..." data-new="true|false"></script>
+  const tag = document.currentScript;
+  if (!tag || !tag.dataset.sid) return;
+
+  const SID_KEY = "vtop_sid";
+  const stored = sessionStorage.getItem(SID_KEY);
+  const server = tag.dataset.sid;
+  const isNew = tag.dataset.new === "true";
+
+  if (isNew) {
+    // New login - save session ID
+    sessionStorage.setItem(SID_KEY, server);
+  } else if (!stored) {
+    // No stored ID = new tab without proper login
+    window.location.href = "/logout/";
+    return;
+  } else if (stored !== server) {
+    // Mismatched session = logout
+    window.location.href = "/logout/";
+    return;
+  }
+
+  // Hand the session ID to the server without touching URLs or bodies
+  // (see TAB_HEADER / TAB_COOKIE in core/middleware.py)
+
+  // 1. Navigations: a short-lived cookie set just before this tab leaves
+  //    the page. A tab opened later finds it expired (or already cleared).
+  function handOff() {
+    document.cookie =
+      "vtop_tab=" + encodeURIComponent(server) +
+      "; path=/; max-age=10; samesite=strict" +
+      (location.protocol === "https:" ? "; secure" : "");
+  }
+  document.addEventListener(
+    "click",
+    function (e) {
+      const link = e.target.closest && e.target.closest("a[href]");
+      if (link && link.origin === location.origin) handOff();
+    },
+    true
+  );
+  document.addEventListener("submit", handOff, true);
+  window.addEventListener("beforeunload", handOff);
+
+  // 2. AJAX/Fetch requests: a header on same-origin calls
+  const _fetch = window.fetch;
+  window.fetch = function (input, init) {
+    const url = new URL(input instanceof Request ? input.url : String(input), location.origin);
+    if (url.origin !== location.origin) return _fetch.call(this, input, init);
+    const headers = new Headers((init && init.headers) || (input instanceof Request ? input.headers : undefined));
+    headers.set("X-Tab-Session", server);
+    return _fetch.call(this, input, Object.assign({}, init, { headers: headers }));
+  };
+})();
@@ -5,25 +5,98 @@ document.addEventListener("DOMContentLoaded", function () {
   if (!todoList || !todoInput || !todoAddBtn) return;
   let tasks = [];
 
-  function loadTasks() {
-    fetch("/api/todos/")
+  function showPage(page) {
+    page.items.forEach(function (task) {
+      tasks.push(task);
+      addTaskToUI(task, true);
+    });
+    refreshTaskCount();
+    if (page.next) loadTasks(page.next);
+  }
+
+  // Follows the keyset "next" cursor until the whole list is loaded
+  function loadTasks(after) {
+    const url = after
+      ? "/api/todos/?after=" + encodeURIComponent(after)
+      : "/api/todos/";
+    fetch(url)
       .then(function (res) {
         if (!res.ok) throw new Error("Failed to fetch tasks");
         return res.json();
       })
-      .then(function (fetchedTasks) {
-        tasks = fetchedTasks;
-        tasks.forEach(function (task) {
-          addTaskToUI(task, true);
-        });
-        refreshTaskCount();
-      })
+      .then(showPage)
       .catch(function (err) {
         console.error("Error loading tasks:", err);
         showNotification("Failed to load tasks", "error");
       });
   }
-  loadTasks();
+
+  // The dashboard embeds the first page (json_script), so the widget fills
+  // in without a request; the API is only needed for further pages.
+  const initial = document.getElementById("todo-data");
+  if (initial) {
+    showPage(JSON.parse(initial.textContent));
+  } else {
+    loadTasks();
+  }
+
+  // Add/toggle/delete edits are queued briefly and sent together to
+  // /api/todos/batch/, so clearing a long list costs one request.
+  const BATCH_DELAY = 250;
+  let pendingOps = [];
+  let flushTimer = null;
+
+  function queueOp(op) {
+    return new Promise(function (resolve, reject) {
+      pendingOps.push({ op: op, resolve: resolve, reject: reject });
+      if (!flushTimer) {
+        flushTimer = setTimeout(flushOps, BATCH_DELAY);
+      }
+    });
+  }
+
+  function flushOps() {
+    clearTimeout(flushTimer);
+    flushTimer = null;
+    const batch = pendingOps;
+    pendingOps = [];
+    if (!batch.length) return;
+    fetch("/api/todos/batch/", {
+      method: "POST",
+      keepalive: true,
+      headers: {
+        "Content-Type": "application/json",
+        "X-CSRFToken": getCookie("csrftoken"),
+      },
+      body: JSON.stringify({
+        ops: batch.map(function (entry) {
+          return entry.op;
+        }),
+      }),
+    })
+      .then(function (res) {
+        if (!res.ok) throw new Error("Failed to save tasks");
+        return res.json();
+      })
+      .then(function (data) {
+        batch.forEach(function (entry, i) {
+          const result = data.results[i];
+          if (result && result.ok) {
+            entry.resolve(result);
+          } else {
+            entry.reject(new Error(result ? result.error : "No result"));
+          }
+        });
+      })
+      .catch(function (err) {
+        batch.forEach(function (entry) {
+          entry.reject(err);
+        });
+      });
+  }
+
+  // Don't lose queued edits when the student navigates away
+  window.addEventListener("pagehide", flushOps);
 
   function addTask() {
     const text = todoInput.value.trim();
@@ -36,19 +109,9 @@ document.addEventListener("DOMContentLoaded", function () {
     }
     todoAddBtn.disabled = true;
     todoAddBtn.textContent = "Adding...";
-    fetch("/api/todos/add/", {
-      method: "POST",
-      headers: {
-        "Content-Type": "application/json",
-        "X-CSRFToken": getCookie("csrftoken"),
-      },
-      body: JSON.stringify({ text: text }),
-    })
-      .then(function (res) {
-        if (!res.ok) throw new Error("Failed to add task");
-        return res.json();
-      })
-      .then(function (task) {
+    queueOp({ op: "add", text: text })
+      .then(function (result) {
+        const task = { id: result.id, text: result.text, is_done: result.is_done };
         tasks.push(task);
         addTaskToUI(task);
         todoInput.value = "";
@@ -77,6 +140,7 @@ document.addEventListener("DOMContentLoaded", function () {
     const li = document.createElement("li");
     li.dataset.id = task.id;
     li.classList.add("todo-item");
+    li.draggable = true;
     const taskText = document.createElement("span");
     taskText.className = task.is_done ? "todo-text done" : "todo-text";
     taskText.textContent = task.text;
@@ -103,19 +167,10 @@ document.addEventListener("DOMContentLoaded", function () {
     toggleBtn.addEventListener("click", function (e) {
       e.stopPropagation();
       toggleBtn.disabled = true;
-      fetch("/api/todos/toggle/" + task.id + "/", {
-        method: "POST",
-        headers: {
-          "X-CSRFToken": getCookie("csrftoken"),
-        },
-      })
-        .then(function (res) {
-          if (!res.ok) throw new Error("Failed to toggle task");
-          return res.json();
-        })
-        .then(function () {
-          taskText.classList.toggle("done");
-          task.is_done = !task.is_done;
+      queueOp({ op: "toggle", id: task.id })
+        .then(function (result) {
+          task.is_done = result.is_done;
+          taskText.classList.toggle("done", task.is_done);
           refreshTaskCount();
           if (task.is_done) {
             toggleBtn.style.transform = "scale(1.3)";
@@ -139,16 +194,7 @@ document.addEventListener("DOMContentLoaded", function () {
       li.style.opacity = "0";
       li.style.transform = "translateX(50px)";
       setTimeout(function () {
-        fetch("/api/todos/delete/" + task.id + "/", {
-          method: "POST",
-          headers: {
-            "X-CSRFToken": getCookie("csrftoken"),
-          },
-        })
-          .then(function (res) {
-            if (!res.ok) throw new Error("Failed to delete task");
-            return res.json();
-          })
+        queueOp({ op: "delete", id: task.id })
           .then(function () {
             li.remove();
             tasks = tasks.filter(function (t) {
@@ -168,6 +214,111 @@ document.addEventListener("DOMContentLoaded", function () {
     todoList.appendChild(li);
   }
 
+  // Drag to reorder. The item moves in the list straight away; the server
+  // then gives it a rank between its new neighbours (/api/todos/move/),
+  // which touches only that row. A failed move puts it back.
+  let dragged = null;
+  let dragOrigin = null;
+
+  todoList.addEventListener("dragstart", function (e) {
+    const li = e.target.closest(".todo-item");
+    if (!li) return;
+    dragged = li;
+    dragOrigin = li.nextElementSibling;
+    li.classList.add("dragging");
+    e.dataTransfer.effectAllowed = "move";
+    e.dataTransfer.setData("text/plain", li.dataset.id);
+  });
+
+  todoList.addEventListener("dragover", function (e) {
+    if (!dragged) return;
+    e.preventDefault();
+    const over = e.target.closest(".todo-item");
+    if (!over || over === dragged) return;
+    const box = over.getBoundingClientRect();
+    const below = e.clientY > box.top + box.height / 2;
+    todoList.insertBefore(dragged, below ? over.nextElementSibling : over);
+  });
+
+  todoList.addEventListener("drop", function (e) {
+    if (dragged) e.preventDefault();
+  });
+
+  todoList.addEventListener("dragend", function () {
+    const li = dragged;
+    const origin = dragOrigin;
+    dragged = dragOrigin = null;
+    if (!li) return;
+    li.classList.remove("dragging");
+    if (li.nextElementSibling === origin) return; // dropped where it was
+    const prev = li.previousElementSibling;
+    moveTask(li, prev ? Number(prev.dataset.id) : null, origin);
+  });
+
+  function moveTask(li, afterId, origin) {
+    fetch("/api/todos/move/" + li.dataset.id + "/", {
+      method: "POST",
+      headers: {
+        "Content-Type": "application/json",
+        "X-CSRFToken": getCookie("csrftoken"),
+      },
+      body: JSON.stringify({ after: afterId }),
+    })
+      .then(function (res) {
+        if (!res.ok) throw new Error("Failed to move task");
+      })
+      .catch(function (err) {
+        console.error("Error moving task:", err);
+        showNotification("Failed to move task", "error");
+        todoList.insertBefore(li, origin && origin.parentNode === todoList ? origin : null);
+      });
+  }
+
+  // Search runs on the server (/api/todos/search/, full-text with prefix
+  // matching); the widget shows the best matches and hides the rest.
+  const todoSearch = document.getElementById("todo-search");
+  const SEARCH_DELAY = 200;
+  const SEARCH_LIMIT = 100;
+  let searchTimer = null;
+  let searchSeq = 0;
+
+  function applySearch(ids) {
+    todoList.querySelectorAll(".todo-item").forEach(function (li) {
+      li.hidden = ids !== null && !ids.has(Number(li.dataset.id));
+    });
+  }
+
+  function runSearch() {
+    const q = todoSearch.value.trim();
+    const seq = ++searchSeq;
+    if (!q) {
+      applySearch(null);
+      return;
+    }
+    fetch("/api/todos/search/?limit=" + SEARCH_LIMIT + "&q=" + encodeURIComponent(q))
+      .then(function (res) {
+        if (!res.ok) throw new Error("Search failed");
+        return res.json();
+      })
+      .then(function (page) {
+        if (seq !== searchSeq) return; // a newer query is on its way
+        applySearch(new Set(page.items.map(function (t) { return t.id; })));
+        if (page.next) {
+          showNotification("Showing the " + SEARCH_LIMIT + " best matches", "info");
+        }
+      })
+      .catch(function (err) {
+        console.error("Error searching tasks:", err);
+      });
+  }
+
+  if (todoSearch) {
+    todoSearch.addEventListener("input", function () {
+      clearTimeout(searchTimer);
+      searchTimer = setTimeout(runSearch, SEARCH_DELAY);
+    });
+  }
+
   function getCookie(name) {
     let cookieValue = null;
     if (document.cookie && document.cookie !== "") {
@@ -0,0 +1,78 @@
+"""
+Request-scoped loader for the data behind the student pages
+(dashboard, profile, ID card, credentials).
+"""
+from typing import NamedTuple
+
+from django.conf import settings
+from django.contrib.auth.models import User
+
+from .models import StudentCredentials, student_cache, student_cache_key
+from .replicas import is_primary, read_alias
+
+# Seconds a loaded StudentCredentials row is reused across requests.
+# Entries are dropped as soon as the User or StudentCredentials is saved.
+STUDENT_CONTEXT_TTL = getattr(settings, "STUDENT_CONTEXT_TTL", 60)
+
+
+class StudentContext(NamedTuple):
+    user: User
+    creds: StudentCredentials
+
+
+def get_student_context(request):
+    """
+    User plus StudentCredentials for the logged-in student.
+
+    Loaded with a single select_related query, then memoized on the request
+    in the shared student cache for STUDENT_CONTEXT_TTL seconds (only rows
+    read from the primary, see replicas.read_alias). Never writes: students without a
+    credentials row get an empty, unsaved one.
+    """
+    context = getattr(request, "_student_context", None)
+    if context is not None:
+        return context
+
+    cache = student_cache()
+    key = student_cache_key(request.user.pk)
+    creds = cache.get(key)
+    if creds is None:
+        db = read_alias(StudentCredentials)
+        creds = (
+            StudentCredentials.objects.using(db).select_related("user")
+            .filter(user_id=request.user.pk)
+            .first()
+        )
+        if creds is None:
+            creds = StudentCredentials(user=request.user)
+        elif is_primary(db):
+            cache.set(key, creds, STUDENT_CONTEXT_TTL)
+
+    request._student_context = context = StudentContext(request.user, creds)
+    return context
+
+
+async def aget_student_context(request):
+    """Async variant of get_student_context for views served over ASGI"""
+    context = getattr(request, "_student_context", None)
+    if context is not None:
+        return context
+
+    user = await request.auser()
+    cache = student_cache()
+    key = student_cache_key(user.pk)
+    creds = await cache.aget(key)
+    if creds is None:
+        db = read_alias(StudentCredentials)
+        creds = await (
+            StudentCredentials.objects.using(db).select_related("user")
+            .filter(user_id=user.pk)
+            .afirst()
+        )
+        if creds is None:
+            creds = StudentCredentials(user=user)
+        elif is_primary(db):
+            await cache.aset(key, creds, STUDENT_CONTEXT_TTL)
+
+    request._student_context = context = StudentContext(user, creds)
+    return context
@@ -0,0 +1,11 @@
+from django import template
+
+from .. import assets
+
+register = template.Library()
+
+
+@register.simple_tag
+def asset_tags(name):
+    """<link>/<script> tags for a bundle declared in core.assets.BUNDLES"""
+    return assets.asset_tags(name)
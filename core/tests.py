@@ -1,3 +1,1263 @@
-from django.test import TestCase
+import csv
+import gzip
+import json
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+import zlib
+from datetime import timedelta
+from io import StringIO
+from unittest import mock, skipUnless
+from urllib.parse import urlencode
 
-# Create your tests here.
+from asgiref.sync import async_to_sync
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.contrib.sessions.models import Session
+from django.core.cache import cache, caches
+from django.core.cache.backends.filebased import FileBasedCache
+from django.core.cache.utils import make_template_fragment_key
+from django.core.management import CommandError, call_command
+from django.db import connection, connections, transaction
+from django.db.backends.sqlite3.base import DatabaseWrapper
+from django.db.migrations.executor import MigrationExecutor
+from django.http import HttpResponse
+from django.shortcuts import redirect
+from django.test import RequestFactory, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import include, path
+from django.utils import timezone
+
+from benchmarks.drivers import Response
+from benchmarks.flows import run_sync, student_flow
+from benchmarks.harness import Recorder, percentile
+
+from . import assets, async_views
+from .activity import ActivityLog, activity_log, recent_events
+from .exports import TODO_EXPORT_FIELDS
+from .id_cards import get_badge
+from .metrics import track_queries, untrack_queries
+from .login_admission import HashSlots, Rejected, throttle
+from .middleware import TAB_COOKIE, TAB_HEADER, _BodyCloseInjector, inject_before_body_close
+from .models import (
+    WIFI_PASSWORD_ALPHABET, ActivityEvent, BranchCount, StudentCredentials, ToDo, student_cache, student_cache_key,
+)
+from .replicas import STICKY_COOKIE, STICKY_SECONDS, PrimaryReplicaRouter, ReplicaRoutingMiddleware
+from .search import SEARCH_MAX_RESULTS, TRIGGER_SQL, install_triggers, missing_triggers
+from .sessions import cached_db as cached_db_sessions, db as db_sessions
+from .student import get_student_context
+from .todo_cache import todo_cache
+from .todos import MAX_BATCH_OPS, TODO_RANK_MAX_LENGTH, TODO_TOMBSTONE_DAYS, encode_cursor
+
+# The app's URLs plus a page that answers a POST with a redirect, and the
+# to-do API's async views (used under ASGI) mounted next to the sync ones
+urlpatterns = [
+    path("bounce/", lambda request: redirect("/dashboard/")),
+    path("api/async/todos/", include([
+        path("", async_views.get_todos),
+        path("add/", async_views.add_todo),
+        path("toggle/<int:todo_id>/", async_views.toggle_todo),
+        path("delete/<int:todo_id>/", async_views.delete_todo),
+        path("move/<int:todo_id>/", async_views.move_todo_view),
+        path("batch/", async_views.batch_todos),
+        path("search/", async_views.search_todos),
+    ])),
+    path("", include("vtopclone.urls")),
+]
+
+# The shared file caches get a directory of their own for the test run, so
+# tests never read or leave entries for the development server's users
+_cache_dir = tempfile.TemporaryDirectory()
+_test_caches = override_settings(CACHES={
+    **settings.CACHES,
+    **{alias: {**settings.CACHES[alias], "LOCATION": os.path.join(_cache_dir.name, alias)}
+       for alias in ("todos", "students", "throttle")},
+})
+
+
+def setUpModule():
+    _test_caches.enable()
+
+
+def tearDownModule():
+    _test_caches.disable()
+    _cache_dir.cleanup()
+
+
+class ToDoAPITestCase(TestCase):
+    """Logged-in student with helpers for the JSON endpoints"""
+
+    def setUp(self):
+        # The writer thread would race the test transaction for the database
+        patcher = mock.patch.object(activity_log, "enabled", False)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.user = User.objects.create_user("21BCE10001", password="pass-123456")
+        self.client.force_login(self.user)
+
+    def post_json(self, url, body):
+        return self.client.post(url, json.dumps(body), content_type="application/json")
+
+    def add(self, text):
+        return self.post_json("/api/todos/add/", {"text": text}).json()["id"]
+
+
+class SessionScriptTests(ToDoAPITestCase):
+    TAG = b'<script src="/s.js"></script>'
+
+    def test_injects_before_the_last_body_close(self):
+        page = b"<html><body><p>&lt;/body&gt;</p></body></html>"
+        self.assertEqual(inject_before_body_close(page, self.TAG),
+                         b"<html><body><p>&lt;/body&gt;</p>" + self.TAG + b"</body></html>")
+        self.assertEqual(inject_before_body_close(b"<p>no close</p>", self.TAG), b"<p>no close</p>")
+
+    def test_streamed_body_close_split_across_chunks(self):
+        injector = _BodyCloseInjector(self.TAG)
+        out = b"".join(injector.wrap([b"<html><body>hi</bo", b"dy></html>"]))
+        self.assertEqual(out, b"<html><body>hi" + self.TAG + b"</body></html>")
+
+    def test_dashboard_gets_the_validator_tag(self):
+        response = self.client.get("/dashboard/")
+        token = self.client.session["tab_session_id"]
+        self.assertContains(response, f'data-sid="{token}" data-new="true"')
+        self.assertContains(response, assets.asset_url("session.js"))
+        # JSON responses are left alone
+        self.assertNotIn(b"<script", self.client.get("/api/todos/").content)
+
+
+class BatchTests(ToDoAPITestCase):
+    def batch(self, ops):
+        return self.post_json("/api/todos/batch/", {"ops": ops})
+
+    def test_mixed_valid_and_invalid_ops(self):
+        keep, drop = self.add("Keep"), self.add("Drop")
+        other = ToDo.objects.create(user=User.objects.create_user("21BAI10009"), text="Not mine")
+        results = self.batch([
+            {"op": "add", "text": "New"},
+            {"op": "add", "text": "   "},
+            {"op": "toggle", "id": keep},
+            {"op": "delete", "id": drop},
+            {"op": "toggle", "id": other.id},
+            {"op": "delete", "id": 999999},
+            {"op": "toggle", "id": "x"},
+            {"op": "rename", "id": keep},
+        ]).json()["results"]
+
+        self.assertTrue(results[0]["ok"])
+        self.assertEqual(results[0]["text"], "New")
+        self.assertEqual(results[1], {"ok": False, "error": "Task cannot be empty"})
+        self.assertEqual(results[2], {"ok": True, "id": keep, "is_done": True})
+        self.assertEqual(results[3], {"ok": True, "id": drop})
+        self.assertEqual(results[4], {"ok": False, "error": "Todo not found"})
+        self.assertEqual(results[5], {"ok": False, "error": "Todo not found"})
+        self.assertEqual(results[6], {"ok": False, "error": "Invalid id"})
+        self.assertEqual(results[7], {"ok": False, "error": "Unknown operation"})
+
+        live = ToDo.objects.alive().filter(user=self.user).order_by("rank")
+        self.assertEqual([(t.text, t.is_done) for t in live], [("Keep", True), ("New", False)])
+        other.refresh_from_db()
+        self.assertFalse(other.is_done)
+
+    def test_toggling_twice_flips_back(self):
+        todo_id = self.add("Twice")
+        results = self.batch([{"op": "toggle", "id": todo_id}, {"op": "toggle", "id": todo_id}]).json()["results"]
+        self.assertEqual([r["is_done"] for r in results], [True, False])
+        self.assertFalse(ToDo.objects.get(id=todo_id).is_done)
+
+    def test_operations_apply_in_request_order(self):
+        first, second = self.add("First"), self.add("Second")
+        results = self.batch([
+            {"op": "delete", "id": first},
+            {"op": "toggle", "id": first},
+            {"op": "delete", "id": first},
+            {"op": "toggle", "id": second},
+            {"op": "delete", "id": second},
+        ]).json()["results"]
+        self.assertEqual([r["ok"] for r in results], [True, False, False, True, True])
+        self.assertEqual(results[1], {"ok": False, "error": "Todo not found"})
+        self.assertFalse(ToDo.objects.alive().exists())
+        self.assertFalse(ToDo.objects.get(id=first).is_done)
+
+    def test_rejects_wrongly_typed_fields(self):
+        todo_id = self.add("Typed")
+        results = self.batch([
+            {"op": "add", "text": None},
+            {"op": "add", "text": {"a": 1}},
+            {"op": "add"},
+            {"op": "toggle", "id": True},
+            {"op": "toggle", "id": str(todo_id)},
+            {"op": "delete", "id": 2 ** 63},
+        ]).json()["results"]
+        self.assertEqual([r["error"] for r in results[:3]], ["Text must be a string"] * 3)
+        self.assertEqual([r["error"] for r in results[3:]], ["Invalid id"] * 3)
+        self.assertEqual(list(ToDo.objects.values_list("text", "is_done")), [("Typed", False)])
+
+    def test_rejects_malformed_batches(self):
+        self.assertEqual(self.batch([]).status_code, 400)
+        self.assertEqual(self.batch([{"op": "add", "text": "x"}] * (MAX_BATCH_OPS + 1)).status_code, 400)
+        response = self.client.post("/api/todos/batch/", "{", content_type="application/json")
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(self.client.get("/api/todos/batch/").status_code, 405)
+
+
+class ImportStudentsTests(TestCase):
+    def import_csv(self, text, *args):
+        with tempfile.NamedTemporaryFile("w", suffix=".csv", delete=False, encoding="utf-8") as f:
+            f.write(text)
+        self.addCleanup(os.unlink, f.name)
+        out = StringIO()
+        call_command("import_students", f.name, "--workers", "1", *args, stdout=out)
+        return out.getvalue()
+
+    def test_creates_users_credentials_and_branch_counts(self):
+        User.objects.create_user("21BCE10001", password="x")
+        out = self.import_csv(
+            "username,password,first_name\n"
+            "21BCE10001,pw,Existing\n"
+            "21BCE10002,pw2,Asha\n"
+            "21BCE10002,pw2,Duplicate\n"
+            ",pw,Blank\n"
+            "22BAI10003,pw3,Ravi\n",
+            "--chunk-size", "2",
+        )
+        self.assertIn("Created 2 students, skipped 3", out)
+
+        asha = User.objects.get(username="21BCE10002")
+        self.assertEqual(asha.first_name, "Asha")
+        self.assertTrue(asha.check_password("pw2"))
+        creds = asha.studentcredentials
+        self.assertEqual((creds.branch_code, creds.library_id), ("BCE", f"LIB{asha.id:05d}"))
+        self.assertEqual(StudentCredentials.objects.count(), 3)
+        self.assertEqual(dict(BranchCount.objects.values_list("branch_code", "students")),
+                         {"BCE": 2, "BAI": 1})
+
+    def test_rejects_missing_columns(self):
+        with self.assertRaises(CommandError):
+            self.import_csv("username,email\n21BCE10002,a@b.c\n")
+
+
+class StudentContextTests(ToDoAPITestCase):
+    def setUp(self):
+        super().setUp()
+        student_cache().clear()
+        self.factory = RequestFactory()
+
+    def request(self, user=None):
+        request = self.factory.get("/")
+        request.user = user or self.user
+        return request
+
+    def test_one_query_then_memoized(self):
+        request = self.request()
+        with self.assertNumQueries(1):
+            context = get_student_context(request)
+            self.assertIs(get_student_context(request), context)
+        self.assertEqual(context.creds.branch_code, "BCE")
+        # Later requests reuse the cached row
+        with self.assertNumQueries(0):
+            self.assertEqual(get_student_context(self.request()).creds.pk, context.creds.pk)
+
+    def test_saving_drops_the_cached_row(self):
+        get_student_context(self.request())
+        creds = StudentCredentials.objects.get(user=self.user)
+        creds.wifi_password = "changed-password"
+        creds.save()
+        with self.assertNumQueries(1):
+            self.assertEqual(get_student_context(self.request()).creds.wifi_password, "changed-password")
+
+    def test_missing_credentials_are_not_created(self):
+        StudentCredentials.objects.filter(user=self.user).delete()
+        context = get_student_context(self.request())
+        self.assertIsNone(context.creds.pk)
+        self.assertFalse(StudentCredentials.objects.filter(user=self.user).exists())
+
+    def test_student_pages_render(self):
+        self.assertContains(self.client.get("/profile/"), "21BCE10001")
+        token = {TAB_HEADER: self.client.session["tab_session_id"]}
+        for url in ("/id-card/", "/credentials/"):
+            with self.subTest(url=url):
+                self.assertContains(self.client.get(url, headers=token), "21BCE10001")
+
+
+class SessionEngineTests(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def stores(self):
+        return (db_sessions.SessionStore, cached_db_sessions.SessionStore)
+
+    def saved(self, store_class):
+        store = store_class()
+        store["tab_session_id"] = "tab-1"
+        store.save(must_create=True)
+        return store.session_key
+
+    def test_unchanged_session_is_not_written(self):
+        for store_class in self.stores():
+            with self.subTest(engine=store_class.__module__):
+                key = self.saved(store_class)
+                store = store_class(key)
+                with CaptureQueriesContext(connection) as queries:
+                    self.assertEqual(store["tab_session_id"], "tab-1")
+                    store.save()
+                self.assertFalse([q for q in queries if not q["sql"].startswith("SELECT")])
+
+    def test_cached_engine_reads_without_the_database(self):
+        key = self.saved(cached_db_sessions.SessionStore)
+        with self.assertNumQueries(0):
+            store = cached_db_sessions.SessionStore(key)
+            self.assertEqual(store["tab_session_id"], "tab-1")
+            store.save()
+
+    def test_changes_and_stale_expiry_are_written(self):
+        for store_class in self.stores():
+            with self.subTest(engine=store_class.__module__):
+                key = self.saved(store_class)
+                store = store_class(key)
+                store["tab_session_id"] = "tab-2"
+                store.save()
+                self.assertEqual(store_class(key)["tab_session_id"], "tab-2")
+
+                cache.clear()
+                stale = timezone.now() + timedelta(seconds=settings.SESSION_COOKIE_AGE - settings.SESSION_SAVE_SLACK - 5)
+                Session.objects.filter(session_key=key).update(expire_date=stale)
+                store = store_class(key)
+                store.load()
+                store.save()
+                self.assertGreater(Session.objects.get(session_key=key).expire_date, stale)
+
+
+@skipUnless(settings.SQLITE_PROFILE == "concurrent", "needs the concurrent SQLite profile")
+class SqliteProfileTests(TestCase):
+    """The test database is in memory, so open the configured profile on a file"""
+
+    def open(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        wrapper = DatabaseWrapper({**connection.settings_dict, "NAME": f"{directory.name}/profile.sqlite3"}, "profile")
+        connections["profile"] = wrapper
+        self.addCleanup(connections.__delitem__, "profile")
+        self.addCleanup(wrapper.close)
+        return wrapper
+
+    def pragma(self, wrapper, name):
+        with wrapper.cursor() as cursor:
+            cursor.execute(f"PRAGMA {name}")
+            return cursor.fetchone()[0]
+
+    def test_connections_get_the_pragmas(self):
+        wrapper = self.open()
+        self.assertEqual(self.pragma(wrapper, "journal_mode"), "wal")
+        self.assertEqual(self.pragma(wrapper, "busy_timeout"), 20000)
+        self.assertEqual(self.pragma(wrapper, "synchronous"), 1)  # NORMAL
+
+    def test_transactions_take_the_write_lock_up_front(self):
+        wrapper = self.open()
+        wrapper.ensure_connection()
+        other = sqlite3.connect(wrapper.settings_dict["NAME"], timeout=0.05)
+        self.addCleanup(other.close)
+        with transaction.atomic(using="profile"):
+            # Nothing written yet, but a second writer already has to wait
+            with self.assertRaisesMessage(sqlite3.OperationalError, "locked"):
+                other.execute("BEGIN IMMEDIATE")
+        other.execute("BEGIN IMMEDIATE")
+        other.rollback()
+
+
+@override_settings(PASSWORD_HASHERS=["django.contrib.auth.hashers.MD5PasswordHasher"])
+class RotateWifiTests(TestCase):
+    def setUp(self):
+        student_cache().clear()
+        for username in ("21BCE10001", "21BCE10002", "21BAI10003"):
+            User.objects.create_user(username, password="x")
+        self.before = self.passwords()
+
+    def passwords(self):
+        return dict(StudentCredentials.objects.values_list("user__username", "wifi_password"))
+
+    def rotate(self, *args):
+        out = StringIO()
+        call_command("rotate_wifi_credentials", "--chunk-size", "2", *args, stdout=out)
+        return out.getvalue()
+
+    def test_rotates_once_per_day_and_resumes(self):
+        self.assertIn("Rotated 3 WiFi passwords", self.rotate())
+        after = self.passwords()
+        for username, password in after.items():
+            self.assertNotEqual(password, self.before[username])
+            self.assertEqual(len(password), 12)
+            self.assertTrue(set(password) <= set(WIFI_PASSWORD_ALPHABET))
+        self.assertFalse(StudentCredentials.objects.filter(wifi_rotated_at__isnull=True).exists())
+
+        self.assertIn("Rotated 0 WiFi passwords", self.rotate())
+        self.assertEqual(self.passwords(), after)
+        tomorrow = (timezone.localdate() + timedelta(days=1)).isoformat()
+        self.assertIn("Rotated 3 WiFi passwords", self.rotate("--not-since", tomorrow))
+
+    def test_branch_filter_and_cached_pages(self):
+        user = User.objects.get(username="21BAI10003")
+        request = RequestFactory().get("/")
+        request.user = user
+        get_student_context(request)
+        # Web workers read the same cache directory as the command
+        worker = FileBasedCache(settings.CACHES["students"]["LOCATION"], {})
+        self.assertIsNotNone(worker.get(student_cache_key(user.pk)))
+
+        self.assertIn("Rotated 1 WiFi passwords", self.rotate("--branch", "bai", "--length", "16"))
+        after = self.passwords()
+        self.assertEqual(after["21BCE10001"], self.before["21BCE10001"])
+        self.assertEqual(len(after["21BAI10003"]), 16)
+        self.assertIsNone(worker.get(student_cache_key(user.pk)))
+        request = RequestFactory().get("/")
+        request.user = user
+        self.assertEqual(get_student_context(request).creds.wifi_password, after["21BAI10003"])
+
+    def test_rejects_bad_arguments(self):
+        for args in (["--branch", "XYZ"], ["--length", "4"], ["--not-since", "tomorrow"]):
+            with self.subTest(args=args), self.assertRaises(CommandError):
+                self.rotate(*args)
+
+
+class ListingTests(ToDoAPITestCase):
+    def listing(self, **params):
+        return self.client.get("/api/todos/", params)
+
+    def test_pages_follow_the_next_cursor(self):
+        added = [self.add(f"Task {i}") for i in range(5)]
+        seen, params = [], {"limit": 2}
+        while True:
+            page = self.listing(**params).json()
+            seen += [item["id"] for item in page["items"]]
+            if not page["next"]:
+                break
+            params["after"] = page["next"]
+        self.assertEqual(seen, added)
+
+    def test_since_delta_reports_changes_and_deletes(self):
+        kept, toggled, deleted = self.add("Kept"), self.add("Toggled"), self.add("Deleted")
+        cursor = self.listing().json()["cursor"]
+        self.post_json(f"/api/todos/toggle/{toggled}/", {})
+        self.post_json(f"/api/todos/delete/{deleted}/", {})
+        added = self.add("Added")
+
+        delta = self.listing(since=cursor).json()
+        self.assertEqual({item["id"] for item in delta["items"]}, {toggled, added})
+        self.assertEqual(delta["deleted"], [deleted])
+        self.assertFalse(delta["has_more"])
+        self.assertNotIn(kept, {item["id"] for item in delta["items"]})
+
+        # Nothing changed since the new cursor
+        empty = self.listing(since=delta["cursor"]).json()
+        self.assertEqual((empty["items"], empty["deleted"], empty["cursor"]), ([], [], delta["cursor"]))
+
+    def test_unchanged_list_answers_304(self):
+        self.add("Cached")
+        first = self.listing()
+        etag = first["ETag"]
+        self.assertEqual(self.client.get("/api/todos/", headers={"If-None-Match": etag}).status_code, 304)
+        self.assertEqual(
+            self.client.get("/api/todos/", headers={"If-Modified-Since": first["Last-Modified"]}).status_code, 304)
+
+        self.add("Changed")
+        changed = self.client.get("/api/todos/", headers={"If-None-Match": etag})
+        self.assertEqual(changed.status_code, 200)
+        self.assertNotEqual(changed["ETag"], etag)
+        # Each page has its own validator
+        self.assertNotEqual(self.listing(limit=1)["ETag"], changed["ETag"])
+
+    def test_expired_and_bad_cursors(self):
+        old = encode_cursor(timezone.now() - timedelta(days=TODO_TOMBSTONE_DAYS + 1), 0)
+        self.assertEqual(self.listing(since=old).status_code, 410)
+        self.assertEqual(self.listing(since="nonsense").status_code, 400)
+        self.assertEqual(self.listing(limit=0).status_code, 400)
+        # Out of range for timedelta or for SQLite's integers
+        for cursor in ("99999999999999999999.1", "-99999999999999999999.1", f"0.{2 ** 63}"):
+            with self.subTest(cursor=cursor):
+                self.assertEqual(self.listing(since=cursor).status_code, 400)
+                self.assertEqual(self.client.get("/api/todos/archived/", {"after": cursor}).status_code, 400)
+        self.assertEqual(self.listing(after=f"V.{2 ** 63}").status_code, 400)
+
+
+@override_settings(ROOT_URLCONF="core.tests")
+class AsyncViewTests(ToDoAPITestCase):
+    """The async views answer exactly like their sync twins"""
+
+    def test_writes_and_listing_match_the_sync_views(self):
+        first = self.post_json("/api/async/todos/add/", {"text": "Async one"}).json()
+        second = self.post_json("/api/async/todos/add/", {"text": "Async two"}).json()
+        self.assertEqual(self.post_json(f"/api/async/todos/toggle/{first['id']}/", {}).json()["is_done"], True)
+        self.post_json(f"/api/async/todos/move/{second['id']}/", {"after": None})
+        batch = self.post_json("/api/async/todos/batch/", {"ops": [
+            {"op": "add", "text": "Async three"}, {"op": "toggle", "id": 999999},
+        ]}).json()
+        self.assertEqual([result["ok"] for result in batch["results"]], [True, False])
+
+        listing = self.client.get("/api/async/todos/")
+        self.assertEqual(listing.json(), self.client.get("/api/todos/").json())
+        self.assertEqual([item["text"] for item in listing.json()["items"]],
+                         ["Async two", "Async one", "Async three"])
+        etag = listing["ETag"]
+        self.assertEqual(self.client.get("/api/async/todos/", headers={"If-None-Match": etag}).status_code, 304)
+
+        cursor = listing.json()["cursor"]
+        self.post_json(f"/api/async/todos/delete/{first['id']}/", {})
+        delta = self.client.get("/api/async/todos/", {"since": cursor}).json()
+        self.assertEqual(delta, self.client.get("/api/todos/", {"since": cursor}).json())
+        self.assertEqual(delta["deleted"], [first["id"]])
+        self.assertEqual(self.client.get("/api/async/todos/search/", {"q": "two"}).json()["items"][0]["id"],
+                         second["id"])
+
+    def test_errors_match_the_sync_views(self):
+        for url, body in (("add/", {"text": ""}), ("move/999999/", {"after": None}), ("batch/", {})):
+            with self.subTest(url=url):
+                self.assertEqual(self.post_json(f"/api/async/todos/{url}", body).status_code,
+                                 self.post_json(f"/api/todos/{url}", body).status_code)
+        self.client.logout()
+        self.assertEqual(self.client.get("/api/async/todos/").status_code, 302)
+
+
+class BenchmarkFlowTests(ToDoAPITestCase):
+    """The benchmark's student session still matches the app"""
+
+    def request(self, req):
+        if req.json is not None:
+            data, content_type = json.dumps(req.json), "application/json"
+        else:
+            data, content_type = urlencode(req.form or {}), "application/x-www-form-urlencoded"
+        response = self.client.generic(req.method, req.path, data, content_type, headers=req.headers)
+        return Response(response.status_code, dict(response.headers), response.content)
+
+    def test_every_step_answers_as_expected(self):
+        self.client.logout()
+        recorder = Recorder()
+        run_sync(self, student_flow("21BCE10001", "pass-123456"), recorder)
+        report = recorder.report(1.0)
+        self.assertEqual(report["overall"]["errors"], 0)
+        self.assertIn("credentials", report["steps"])
+        self.assertEqual(report["steps"]["dashboard"]["requests"], 2)
+
+    def test_percentile(self):
+        samples = [5, 1, 4, 2, 3]
+        self.assertEqual([percentile(samples, p) for p in (0, 50, 95, 100)], [1, 3, 5, 5])
+        self.assertEqual(percentile([], 50), 0.0)
+
+
+class FragmentCacheTests(ToDoAPITestCase):
+    def setUp(self):
+        super().setUp()
+        caches["fragments"].clear()
+
+    def test_shared_fragments_are_rendered_once(self):
+        self.assertContains(self.client.get("/dashboard/"), "Spotlight")
+        for name in ("dashboard_sidebar", "dashboard_cards"):
+            self.assertIsNotNone(caches["fragments"].get(make_template_fragment_key(name)))
+
+        caches["fragments"].set(make_template_fragment_key("dashboard_cards"), "<p>cached cards</p>", None)
+        other = User.objects.create_user("21BCE10002", password="x")
+        self.client.force_login(other)
+        page = self.client.get("/dashboard/")
+        self.assertContains(page, "cached cards")
+        # The per-student parts are rendered outside the cached blocks
+        self.assertContains(page, "Welcome Back, 21BCE10002!")
+        self.assertNotContains(page, "21BCE10001")
+
+
+class InitialTodosTests(ToDoAPITestCase):
+    def setUp(self):
+        super().setUp()
+        todo_cache.invalidate(self.user.id)
+
+    def embedded(self, response):
+        start = response.content.index(b'id="todo-data"')
+        script = response.content[response.content.index(b">", start) + 1:]
+        return json.loads(script[:script.index(b"</script>")])
+
+    def test_dashboard_embeds_the_first_page(self):
+        self.add("First")
+        self.add("Second")
+        embedded = self.embedded(self.client.get("/dashboard/"))
+        self.assertEqual(embedded, self.client.get("/api/todos/").json())
+        self.assertEqual([item["text"] for item in embedded["items"]], ["First", "Second"])
+
+    def test_shares_the_listing_cache(self):
+        self.add("Cached")
+        self.client.get("/api/todos/")
+        with CaptureQueriesContext(connection) as queries:
+            page = self.client.get("/dashboard/")
+        self.assertEqual(self.embedded(page)["items"][0]["text"], "Cached")
+        self.assertFalse([q for q in queries if "core_todo" in q["sql"]])
+
+        # A write drops the entry, so the next page load sees it
+        self.add("Added")
+        token = {TAB_HEADER: self.client.session["tab_session_id"]}
+        page = self.client.get("/dashboard/", headers=token)
+        self.assertEqual([item["text"] for item in self.embedded(page)["items"]], ["Cached", "Added"])
+
+
+@override_settings(PASSWORD_HASHERS=["django.contrib.auth.hashers.MD5PasswordHasher"])
+class LoginAdmissionTests(ToDoAPITestCase):
+    def setUp(self):
+        super().setUp()
+        caches[settings.LOGIN_THROTTLE_ALIAS].clear()
+        self.client.logout()
+
+    def login(self, password, username="21BCE10001", ip="10.0.0.1"):
+        return self.client.post("/login/", {"username": username, "password": password}, REMOTE_ADDR=ip)
+
+    def test_failures_lock_the_username_from_that_address_only(self):
+        limit, window = settings.LOGIN_FAILURE_LIMIT
+        for _ in range(limit):
+            self.assertEqual(self.login("wrong").status_code, 200)
+        response = self.login("pass-123456")
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(response["Retry-After"], str(window))
+
+        # The student, from their own address, still gets in
+        self.assertEqual(self.login("pass-123456", ip="10.0.0.2").status_code, 302)
+        self.client.logout()
+        User.objects.create_user("21BCE10002", password="pass-123456")
+        self.assertEqual(self.login("pass-123456", "21BCE10002").status_code, 302)
+
+    def test_username_cap_across_addresses(self):
+        with mock.patch.object(throttle, "username_limit", (8, 300)):
+            for i in range(8):
+                self.login("wrong", ip=f"10.0.1.{i}")
+            self.assertEqual(self.login("pass-123456", ip="10.0.0.2").status_code, 429)
+
+    def test_success_resets_the_failure_count(self):
+        limit, _ = settings.LOGIN_FAILURE_LIMIT
+        for _ in range(limit - 1):
+            self.login("wrong")
+        self.assertEqual(self.login("pass-123456").status_code, 302)
+        self.client.logout()
+        self.assertEqual(self.login("wrong").status_code, 200)
+
+    def test_hash_slots_queue_then_reject(self):
+        slots = HashSlots(slots=1, queue_size=1, timeout=0.05, retry_after=5)
+        with slots.slot():
+            with self.assertRaises(Rejected) as raised:
+                with slots.slot():
+                    pass
+            self.assertEqual((raised.exception.reason, raised.exception.status), ("timeout", 503))
+
+            # A waiter fills the queue, so the next login is turned away at once
+            slots.timeout = 5
+            waiter = threading.Thread(target=slots._acquire)
+            waiter.start()
+            while not slots.waiting:
+                time.sleep(0.001)
+            with self.assertRaises(Rejected) as raised:
+                slots._acquire()
+            self.assertEqual(raised.exception.reason, "queue_full")
+        waiter.join()
+        self.assertEqual(slots.stats()["admitted"], 2)
+        self.assertEqual(slots.stats()["rejected"]["queue_full"], 1)
+
+
+@override_settings(PASSWORD_HASHERS=["django.contrib.auth.hashers.MD5PasswordHasher"])
+class StudentDirectoryTests(ToDoAPITestCase):
+    def setUp(self):
+        super().setUp()
+        for username in ("21BCE10002", "21BAI10003", "22BCE10004", "STAFF01"):
+            User.objects.create_user(username, password="x")
+        User.objects.filter(username="STAFF01").update(is_staff=True)
+        self.client.force_login(User.objects.get(username="STAFF01"))
+
+    def directory(self, **params):
+        return self.client.get("/api/students/", params)
+
+    def usernames(self, **params):
+        return [row["username"] for row in self.directory(**params).json()["items"]]
+
+    def counts(self):
+        return {branch["code"]: branch["students"] for branch in self.directory().json()["branches"]}
+
+    def test_filters(self):
+        self.assertEqual(self.usernames(branch="bce"), ["21BCE10001", "21BCE10002", "22BCE10004"])
+        self.assertEqual(self.usernames(prefix="21b"), ["21BAI10003", "21BCE10001", "21BCE10002"])
+        self.assertEqual(self.usernames(prefix="21", branch="BCE"), ["21BCE10001", "21BCE10002"])
+        library_id = StudentCredentials.objects.get(user__username="21BAI10003").library_id
+        self.assertEqual(self.usernames(library_id=library_id.lower()), ["21BAI10003"])
+        self.assertContains(self.client.get("/staff/students/", {"branch": "BAI"}), "21BAI10003")
+
+    def test_pages_follow_the_next_cursor(self):
+        for params in ({}, {"prefix": "2"}):
+            with self.subTest(**params):
+                seen, after = [], ""
+                while True:
+                    page = self.directory(limit=2, after=after, **params).json()
+                    seen += [row["username"] for row in page["items"]]
+                    if not page["next"]:
+                        break
+                    after = page["next"]
+                self.assertEqual(sorted(seen), sorted(self.usernames(limit=200, **params)))
+                self.assertEqual(len(seen), len(set(seen)))
+
+    def test_branch_counts_follow_changes(self):
+        self.assertEqual(self.counts(), {"": 1, "BAI": 1, "BCE": 3})
+        creds = StudentCredentials.objects.get(user__username="22BCE10004")
+        creds.branch_code = "BCY"
+        creds.save()
+        User.objects.filter(username="21BAI10003").delete()
+        self.assertEqual(self.counts(), {"": 1, "BAI": 0, "BCE": 2, "BCY": 1})
+
+    def test_rejects_bad_input_and_non_staff(self):
+        self.assertEqual(self.directory(branch="XYZ").status_code, 400)
+        self.assertEqual(self.directory(after="nonsense").status_code, 400)
+        self.assertEqual(self.directory(after=str(2 ** 64)).status_code, 400)
+        self.assertEqual(self.directory(limit=0).status_code, 400)
+        self.client.force_login(self.user)
+        self.assertEqual(self.directory().status_code, 302)
+
+
+class ArchiveTodosTests(ToDoAPITestCase):
+    def archive(self, *args):
+        out = StringIO()
+        call_command("archive_todos", "--chunk-size", "2", *args, stdout=out)
+        return out.getvalue()
+
+    def test_archives_old_completed_todos_as_tombstones(self):
+        old = [self.add(f"Old {i}") for i in range(3)]
+        recent, open_ = self.add("Recent"), self.add("Open")
+        ToDo.objects.filter(id__in=old + [recent]).update(is_done=True)
+        ToDo.objects.filter(id__in=old + [open_]).update(updated_at=timezone.now() - timedelta(days=40))
+        cursor = self.client.get("/api/todos/").json()["cursor"]
+
+        self.assertIn("Archived 3 to-dos and purged 0 tombstones", self.archive("--older-than", "30"))
+        self.assertEqual([item["id"] for item in self.client.get("/api/todos/").json()["items"]], [recent, open_])
+        self.assertEqual(sorted(self.client.get("/api/todos/", {"since": cursor}).json()["deleted"]), old)
+
+        archived = self.client.get("/api/todos/archived/", {"limit": 2}).json()
+        rest = self.client.get("/api/todos/archived/", {"after": archived["next"]}).json()
+        items = archived["items"] + rest["items"]
+        self.assertEqual([item["todo_id"] for item in items], old)
+        self.assertEqual(items[0]["text"], "Old 0")
+        self.assertEqual(ToDo.objects.filter(id__in=old, text="").count(), 3)
+
+    def test_purges_expired_tombstones(self):
+        gone, fresh = self.add("Gone"), self.add("Fresh")
+        self.post_json(f"/api/todos/delete/{gone}/", {})
+        self.post_json(f"/api/todos/delete/{fresh}/", {})
+        ToDo.objects.filter(id=gone).update(deleted_at=timezone.now() - timedelta(days=TODO_TOMBSTONE_DAYS + 1))
+        self.assertIn("purged 1 tombstones", self.archive())
+        self.assertEqual(list(ToDo.objects.values_list("id", flat=True)), [fresh])
+
+    def test_invalidation_reaches_other_processes(self):
+        # A web worker process reads the same cache directory
+        worker = FileBasedCache(settings.CACHES["todos"]["LOCATION"], {})
+        done = self.add("Done")
+        ToDo.objects.filter(id=done).update(is_done=True, updated_at=timezone.now() - timedelta(days=40))
+        self.client.get("/api/todos/")
+        generation, _, _ = worker.get(todo_cache.key(self.user.id))
+
+        self.archive()
+        self.assertNotEqual(worker.get(todo_cache.generation_key(self.user.id)), generation)
+
+
+class ExportTests(ToDoAPITestCase):
+    def export(self, url, **params):
+        response = self.client.get(url, params)
+        self.assertTrue(response.streaming)
+        return response, list(response.streaming_content)
+
+    def test_todos_as_csv_and_ndjson(self):
+        first, second, deleted = self.add("Lab, record"), self.add("Viva"), self.add("Gone")
+        self.post_json(f"/api/todos/delete/{deleted}/", {})
+        self.post_json(f"/api/todos/move/{second}/", {"after": None})
+
+        response, pieces = self.export("/api/todos/export/")
+        self.assertEqual(response["Content-Disposition"], 'attachment; filename="todos.csv"')
+        rows = list(csv.reader(b"".join(pieces).decode().splitlines()))
+        self.assertEqual(rows[0], list(TODO_EXPORT_FIELDS))
+        self.assertEqual([(row[0], row[1]) for row in rows[1:]], [(str(second), "Viva"), (str(first), "Lab, record")])
+
+        _, pieces = self.export("/api/todos/export/", format="ndjson")
+        lines = [json.loads(line) for line in b"".join(pieces).decode().splitlines()]
+        self.assertEqual([line["text"] for line in lines], ["Viva", "Lab, record"])
+
+    def test_gzip_pieces_decode_as_they_arrive(self):
+        for i in range(50):
+            self.add(f"Task number {i}")
+        with mock.patch("core.exports.EXPORT_PIECE_BYTES", 256):
+            response, pieces = self.export("/api/todos/export/", gzip="1")
+        self.assertEqual(response["Content-Type"], "application/gzip")
+        self.assertGreater(len(pieces), 3)
+        decoder = zlib.decompressobj(31)
+        # Each piece ends on a flush, so it decodes to whole CSV lines
+        for piece in pieces[:-1]:
+            self.assertTrue(decoder.decompress(piece).endswith(b"\r\n"))
+        self.assertEqual(gzip.decompress(b"".join(pieces)).count(b"Task number"), 50)
+
+    def test_credentials_are_staff_only_and_filter_by_branch(self):
+        User.objects.create_user("21BAI10002", password="x")
+        self.assertEqual(self.client.get("/api/students/export/").status_code, 302)
+        User.objects.filter(pk=self.user.pk).update(is_staff=True)
+
+        _, pieces = self.export("/api/students/export/", branch="BAI")
+        rows = list(csv.DictReader(b"".join(pieces).decode().splitlines()))
+        self.assertEqual([(row["username"], row["branch_code"]) for row in rows], [("21BAI10002", "BAI")])
+        self.assertEqual(self.client.get("/api/students/export/", {"format": "xml"}).status_code, 400)
+        self.assertEqual(self.client.get("/api/students/export/", {"branch": "XYZ"}).status_code, 400)
+
+
+@mock.patch("core.replicas.READ_REPLICAS", ["replica1"])
+class ReplicaRoutingTests(TransactionTestCase):
+    """Outside TestCase's wrapping transaction, which keeps reads on the primary"""
+
+    def setUp(self):
+        self.router = PrimaryReplicaRouter()
+
+    def routed(self, cookies=None, view=None):
+        """(read aliases before and after view ran, response) for one request"""
+        reads = []
+
+        def get_response(request):
+            reads.append(self.router.db_for_read(ToDo))
+            if view:
+                view()
+            reads.append(self.router.db_for_read(ToDo))
+            return HttpResponse()
+
+        request = RequestFactory().get("/")
+        request.COOKIES.update(cookies or {})
+        response = ReplicaRoutingMiddleware(get_response)(request)
+        return reads, response
+
+    def test_reads_go_to_replicas_until_a_write(self):
+        reads, response = self.routed()
+        self.assertEqual(reads, ["replica1", "replica1"])
+        self.assertNotIn(STICKY_COOKIE, response.cookies)
+
+        reads, response = self.routed(view=lambda: self.router.db_for_write(ToDo))
+        self.assertEqual(reads, ["replica1", "default"])
+        self.assertEqual(response.cookies[STICKY_COOKIE]["max-age"], STICKY_SECONDS)
+
+        # The next request from that browser reads its own write
+        reads, _ = self.routed(cookies={STICKY_COOKIE: "1"})
+        self.assertEqual(reads, ["default", "default"])
+
+    def test_primary_only_cases(self):
+        self.assertIsNone(self.router.db_for_read(ToDo))  # outside a request
+        self.assertEqual(self.routed(view=lambda: self.router.db_for_write(Session))[0], ["replica1", "replica1"])
+
+        def reads_in_request():
+            self.assertEqual(self.router.db_for_read(Session), "default")
+            with transaction.atomic():
+                self.assertEqual(self.router.db_for_read(ToDo), "default")
+        self.routed(view=reads_in_request)
+        self.assertFalse(self.router.allow_migrate("replica1", "core"))
+
+
+# Every read counts as a replica read
+@mock.patch("core.replicas.DEFAULT_DB_ALIAS", "primary")
+@override_settings(ROOT_URLCONF="core.tests")
+class ReplicaCacheTests(ToDoAPITestCase):
+    def test_replica_reads_are_not_cached(self):
+        student_cache().clear()
+        self.add("From a replica")
+        for url in ("/api/todos/", "/api/async/todos/"):
+            self.assertEqual(len(self.client.get(url).json()["items"]), 1)
+        self.client.get("/dashboard/")
+        self.assertIsNone(todo_cache.get(self.user.id)[0])
+        self.assertIsNone(student_cache().get(student_cache_key(self.user.id)))
+
+
+class MetricsTests(ToDoAPITestCase):
+    def test_outer_stats_see_the_request_queries(self):
+        outer, token = track_queries()
+        try:
+            self.client.get("/api/todos/")
+        finally:
+            untrack_queries(token)
+        self.assertGreater(outer.queries, 0)
+        self.assertGreater(outer.db_seconds, 0)
+
+    def test_metrics_page_is_staff_only(self):
+        self.client.get("/api/todos/")
+        self.assertEqual(self.client.get("/metrics/").status_code, 302)
+        self.user.is_staff = True
+        self.user.save()
+        body = self.client.get("/metrics/").content.decode()
+        self.assertIn('vtop_request_db_queries_total{view="get_todos"}', body)
+
+
+class AssetTests(TestCase):
+    def setUp(self):
+        root = tempfile.TemporaryDirectory()
+        self.addCleanup(root.cleanup)
+        settings_patch = override_settings(ASSETS_ROOT=root.name)
+        settings_patch.enable()
+        self.addCleanup(settings_patch.disable)
+        self.addCleanup(assets._manifest.clear)
+
+    def build(self, source):
+        return assets.build_all(bundles={"session.js": [source]})[0][1]
+
+    def test_previous_build_is_still_served(self):
+        old = self.build("core/js/session.js")
+        new = self.build("core/js/darkmode.js")
+        self.assertNotEqual(old, new)
+        self.assertEqual(assets.load_manifest(), {"session.js": new})
+        for filename in (old, new):
+            response = self.client.get(f"/assets/{filename}", headers={"Accept-Encoding": "gzip"})
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response["Content-Encoding"], "gzip")
+            self.assertEqual(response["Cache-Control"], assets.IMMUTABLE)
+
+    def test_only_hashed_bundles_are_served(self):
+        self.build("core/js/session.js")
+        for filename in ("manifest.json", "session.0123456789ab.js", "session.js"):
+            self.assertEqual(self.client.get(f"/assets/{filename}").status_code, 404)
+
+
+class IdCardTests(ToDoAPITestCase):
+    def test_badge_follows_edits_without_invalidation(self):
+        # No signals involved, as when another worker process made the edit
+        creds = StudentCredentials.objects.get(user=self.user)
+        self.user.first_name = "Asha"
+        self.assertIn("Asha", get_badge(self.user, creds))
+        self.user.first_name = "Ravi"
+        creds.branch_name = "B.Tech in Computer Science and Engineering (AI/ML)"
+        badge = get_badge(self.user, creds)
+        self.assertIn("Ravi", badge)
+        self.assertIn("(AI/ML)", badge)
+
+    def test_page_shows_saved_changes(self):
+        self.assertContains(self.client.get("/id-card/"), "21BCE10001")
+        token = {TAB_HEADER: self.client.session["tab_session_id"]}
+        self.user.first_name = "Meera"
+        self.user.save()
+        self.assertContains(self.client.get("/id-card/", headers=token), "Meera")
+
+
+class TodoCacheTests(ToDoAPITestCase):
+    def setUp(self):
+        super().setUp()
+        todo_cache.backend.clear()
+
+    def test_listing_is_cached_until_a_write(self):
+        self.add("Buy stamps")
+        self.client.get("/api/todos/")
+        self.assertIsNotNone(todo_cache.get(self.user.id)[0])
+
+        self.add("Post letter")
+        self.assertIsNone(todo_cache.get(self.user.id)[0])
+        texts = [item["text"] for item in self.client.get("/api/todos/").json()["items"]]
+        self.assertEqual(texts, ["Buy stamps", "Post letter"])
+
+    def test_entry_read_before_a_write_is_never_served(self):
+        # A reader misses, a write lands and invalidates, then the reader stores
+        cached, generation = todo_cache.get(self.user.id)
+        self.assertIsNone(cached)
+        todo_cache.invalidate(self.user.id)
+        todo_cache.set(self.user.id, generation, None, b'{"items": []}')
+        self.assertIsNone(todo_cache.get(self.user.id)[0])
+
+        cached, generation = todo_cache.get(self.user.id)
+        todo_cache.set(self.user.id, generation, None, b'{"items": []}')
+        self.assertEqual(todo_cache.get(self.user.id)[0], (None, b'{"items": []}'))
+
+    def test_lost_counter_invalidates_old_entries(self):
+        _, generation = todo_cache.get(self.user.id)
+        todo_cache.set(self.user.id, generation, None, b"{}")
+        todo_cache.backend.delete(todo_cache.generation_key(self.user.id))
+        self.assertIsNone(todo_cache.get(self.user.id)[0])
+
+    def test_stats_count_hits_and_misses(self):
+        before = todo_cache.stats()
+        self.add("Counted")
+        for _ in range(3):
+            self.client.get("/api/todos/")
+        self.client.get("/api/todos/", {"limit": 1})  # not the default listing
+        stats = todo_cache.stats()
+        self.assertEqual(stats["misses"] - before["misses"], 1)
+        self.assertEqual(stats["hits"] - before["hits"], 2)
+        self.assertGreaterEqual(stats["invalidations"] - before["invalidations"], 1)
+
+        self.assertEqual(self.client.get("/api/todos/cache-stats/").status_code, 302)
+        User.objects.filter(pk=self.user.pk).update(is_staff=True)
+        self.assertEqual(set(self.client.get("/api/todos/cache-stats/").json()), set(stats))
+
+
+class SearchTests(ToDoAPITestCase):
+    def search(self, q, **params):
+        return self.client.get("/api/todos/search/", {"q": q, **params}).json()
+
+    def ids(self, q):
+        return [item["id"] for item in self.search(q)["items"]]
+
+    def test_finds_added_todo_by_word_prefixes(self):
+        todo_id = self.add("Submit lab record")
+        self.add("Pay hostel fee")
+        self.assertEqual(self.ids("lab rec"), [todo_id])
+        self.assertEqual(self.ids("zebra"), [])
+
+    def test_follows_edits_and_deletes(self):
+        todo_id = self.add("Return library book")
+        ToDo.objects.filter(id=todo_id).update(text="Renew library card")
+        self.assertEqual(self.ids("book"), [])
+        self.assertEqual(self.ids("card"), [todo_id])
+        self.post_json(f"/api/todos/delete/{todo_id}/", {})
+        self.assertEqual(self.ids("library"), [])
+
+    def test_only_searches_own_todos(self):
+        other = User.objects.create_user("21BAI10002", password="pass-123456")
+        ToDo.objects.create(user=other, text="Physics viva")
+        self.assertEqual(self.ids("viva"), [])
+
+    def test_pages_with_cursor(self):
+        added = {self.add(f"Chapter {i} notes") for i in range(5)}
+        first = self.search("notes", limit=3)
+        second = self.search("notes", limit=3, after=first["next"])
+        self.assertIsNone(second["next"])
+        self.assertEqual({item["id"] for item in first["items"] + second["items"]}, added)
+
+    def test_pages_survive_other_users_changes(self):
+        added = [self.add(f"Chapter {i} notes " + "filler " * i) for i in range(6)]
+        first = self.search("notes", limit=3)
+        # Shifts every bm25 score between the two requests
+        other = User.objects.create_user("21BAI10002", password="pass-123456")
+        ToDo.objects.bulk_create([ToDo(user=other, text="notes notes", rank="V") for _ in range(20)])
+        second = self.search("notes", limit=3, after=first["next"])
+        self.assertEqual(sorted(item["id"] for item in first["items"] + second["items"]), added)
+
+    def test_paging_stops_at_the_result_cap(self):
+        self.add("Capped notes")
+        last = str(SEARCH_MAX_RESULTS - 1)
+        self.assertEqual(self.search("notes", after=last)["items"], [])
+        for cursor in (str(SEARCH_MAX_RESULTS), "-1", "0.5:3"):
+            with self.subTest(cursor=cursor):
+                response = self.client.get("/api/todos/search/", {"q": "notes", "after": cursor})
+                self.assertEqual(response.status_code, 400)
+
+    def test_requires_a_word(self):
+        self.assertEqual(self.client.get("/api/todos/search/", {"q": "  "}).status_code, 400)
+
+    def test_install_triggers_restores_and_reindexes(self):
+        self.assertEqual(missing_triggers(), [])
+        with connection.cursor() as cursor:
+            for name in TRIGGER_SQL:
+                cursor.execute(f"DROP TRIGGER {name}")
+        todo_id = self.add("Written while unindexed")
+        self.assertEqual(self.ids("unindexed"), [])
+
+        with self.assertLogs("core.search", "WARNING"):
+            self.assertEqual(install_triggers(), list(TRIGGER_SQL))
+        self.assertEqual(missing_triggers(), [])
+        self.assertEqual(self.ids("unindexed"), [todo_id])
+
+
+@override_settings(ROOT_URLCONF="core.tests")
+class TabSessionTests(ToDoAPITestCase):
+    def setUp(self):
+        super().setUp()
+        # The first page after login issues the tab token
+        self.client.get("/dashboard/")
+        self.token = self.client.session["tab_session_id"]
+
+    def test_page_without_token_logs_out(self):
+        response = self.client.get("/dashboard/")
+        self.assertRedirects(response, "/login/", fetch_redirect_response=False)
+        self.assertNotIn("_auth_user_id", self.client.session)
+
+    def test_header_token_is_accepted(self):
+        response = self.client.get("/dashboard/", headers={TAB_HEADER: self.token})
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, f'data-sid="{self.token}"')
+
+    def test_hand_off_cookie_survives_redirect(self):
+        self.client.cookies[TAB_COOKIE] = self.token
+        response = self.client.post("/bounce/")
+        self.assertRedirects(response, "/dashboard/", fetch_redirect_response=False)
+        self.assertNotIn(TAB_COOKIE, response.cookies)
+
+        # The followed request still proves the tab; that page then clears the cookie
+        response = self.client.get(response["Location"])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.cookies[TAB_COOKIE]["max-age"], 0)
+
+
+class MoveTests(ToDoAPITestCase):
+    def setUp(self):
+        super().setUp()
+        self.a, self.b, self.c, self.d = (self.add(text) for text in "ABCD")
+
+    def order(self):
+        return [item["id"] for item in self.client.get("/api/todos/").json()["items"]]
+
+    def move(self, todo_id, after):
+        return self.post_json(f"/api/todos/move/{todo_id}/", {"after": after})
+
+    def test_move_to_top_middle_and_end(self):
+        self.assertEqual(self.move(self.c, None).status_code, 200)
+        self.assertEqual(self.order(), [self.c, self.a, self.b, self.d])
+
+        self.move(self.d, self.a)
+        self.assertEqual(self.order(), [self.c, self.a, self.d, self.b])
+
+        self.move(self.c, self.b)
+        self.assertEqual(self.order(), [self.a, self.d, self.b, self.c])
+
+    def test_only_the_moved_row_changes(self):
+        before = dict(ToDo.objects.values_list("id", "rank"))
+        response = self.move(self.a, self.c).json()
+        after = dict(ToDo.objects.values_list("id", "rank"))
+        self.assertEqual(response, {"id": self.a, "rank": after[self.a]})
+        self.assertEqual({pk for pk in after if after[pk] != before[pk]}, {self.a})
+
+    def test_repeated_moves_into_one_gap_keep_order(self):
+        for _ in range(40):
+            self.move(self.a, self.c)
+            self.move(self.a, self.b)
+        self.assertEqual(self.order(), [self.b, self.a, self.c, self.d])
+        self.assertLessEqual(max(len(r) for r in ToDo.objects.values_list("rank", flat=True)),
+                             TODO_RANK_MAX_LENGTH)
+
+    def test_tied_ranks_are_rebalanced(self):
+        ToDo.objects.filter(id__in=[self.b, self.c]).update(rank="V")
+        ToDo.objects.filter(id=self.d).update(rank="W")
+        self.assertEqual(self.move(self.d, self.b).status_code, 200)
+        self.assertEqual(self.order(), [self.a, self.b, self.d, self.c])
+        self.assertEqual(len(set(ToDo.objects.values_list("rank", flat=True))), 4)
+
+    def test_errors(self):
+        self.assertEqual(self.move(self.a, 999999).status_code, 404)
+        self.assertEqual(self.move(999999, None).status_code, 404)
+        self.assertEqual(self.post_json(f"/api/todos/move/{self.a}/", {}).status_code, 400)
+        self.assertEqual(self.move(self.a, "B").status_code, 400)
+        self.assertEqual(self.move(self.a, True).status_code, 400)
+        other = User.objects.create_user("21BCE10002", password="x")
+        theirs = ToDo.objects.create(user=other, text="Theirs").id
+        self.assertEqual(self.move(theirs, None).status_code, 404)
+        self.assertEqual(self.move(self.a, theirs).status_code, 404)
+
+    def test_rebalance_command_shortens_long_keys(self):
+        ToDo.objects.filter(id=self.b).update(rank="U" + "z" * 30)
+        order = self.order()
+        # Web workers read the same cache directory as the command
+        worker = FileBasedCache(settings.CACHES["todos"]["LOCATION"], {})
+        generation = worker.get(todo_cache.generation_key(self.user.id))
+        out = StringIO()
+        call_command("rebalance_todo_ranks", "--max-length", "8", stdout=out)
+        self.assertIn("Rebalanced 1 lists (4 to-dos)", out.getvalue())
+        self.assertNotEqual(worker.get(todo_cache.generation_key(self.user.id)), generation)
+        self.assertEqual(self.order(), order)
+        self.assertTrue(all(len(r) <= 8 for r in ToDo.objects.values_list("rank", flat=True)))
+
+
+class ActivityLogTests(TransactionTestCase):
+    """The writer thread uses its own connection, so rows must be committed"""
+
+    def log(self, **kwargs):
+        log = ActivityLog(**{"queue_size": 100, "batch_size": 3, "flush_interval": 60, **kwargs})
+        self.addCleanup(log.close)
+        return log
+
+    def test_events_are_written_in_batches(self):
+        user = User.objects.create_user("21BCE10001", password="pass-123456")
+        log = self.log()
+        for i in range(4):
+            log.record(ActivityEvent.Action.TODO_ADD, user.id, "127.0.0.1", str(i))
+        log.record(ActivityEvent.Action.LOGIN_FAILED, detail="x" * 300)
+        self.assertTrue(log.flush())
+
+        stats = log.stats()
+        self.assertEqual((stats["recorded"], stats["written"], stats["batches"], stats["queued"]), (5, 5, 2, 0))
+        self.assertEqual([event.detail for event in recent_events(user.id)], ["3", "2", "1", "0"])
+        self.assertEqual(len(ActivityEvent.objects.get(user=None).detail), 255)
+
+    def test_full_queue_drops_instead_of_waiting(self):
+        log = self.log(queue_size=2, batch_size=100)
+        # No writer thread, so nothing drains the queue
+        with mock.patch.object(ActivityLog, "_ensure_writer"):
+            for _ in range(5):
+                log.record(ActivityEvent.Action.LOGOUT)
+        self.assertEqual((log.stats()["recorded"], log.stats()["dropped"]), (2, 3))
+
+    def test_views_log_their_events(self):
+        User.objects.create_user("21BCE10001", password="pass-123456")
+        with mock.patch.object(activity_log, "record") as record:
+            self.client.post("/login/", {"username": "21BCE10001", "password": "wrong"})
+            self.client.post("/login/", {"username": "21BCE10001", "password": "pass-123456"})
+            todo_id = self.client.post("/api/todos/add/", {"text": "Logged"}, content_type="application/json").json()["id"]
+            self.client.get("/credentials/")
+        self.assertEqual([c.args[0] for c in record.call_args_list], [
+            ActivityEvent.Action.LOGIN_FAILED, ActivityEvent.Action.LOGIN,
+            ActivityEvent.Action.TODO_ADD, ActivityEvent.Action.CREDENTIALS_VIEW,
+        ])
+        self.assertEqual(record.call_args_list[2].args[3], str(todo_id))
+
+    def test_disabled_log_records_nothing(self):
+        log = self.log(enabled=False)
+        log.record(ActivityEvent.Action.LOGOUT)
+        self.assertTrue(log.flush())
+        self.assertEqual(log.stats()["recorded"], 0)
+        self.assertFalse(ActivityEvent.objects.exists())
+
+
+class ChangeStampTests(TransactionTestCase):
+    """updated_at is taken inside the write's transaction, i.e. under the lock"""
+
+    def stamped(self, write):
+        seen = []
+        now = timezone.now
+
+        def recording_now():
+            seen.append(connection.in_atomic_block)
+            return now()
+
+        with mock.patch("django.utils.timezone.now", recording_now):
+            write()
+        self.assertTrue(seen)
+        return all(seen)
+
+    def test_single_item_writes_stamp_under_the_lock(self):
+        user = User.objects.create_user("21BCE10001", password="pass-123456")
+        todo = ToDo(user=user, text="Stamped")
+        self.assertTrue(self.stamped(todo.save))
+        todo.is_done = True
+        self.assertTrue(self.stamped(todo.save))
+        self.assertTrue(self.stamped(async_to_sync(ToDo(user=user, text="Async").asave)))
+        self.assertTrue(self.stamped(ToDo.objects.filter(id=todo.id).soft_delete))
+        other = ToDo.objects.create(user=user, text="Async delete")
+        self.assertTrue(self.stamped(async_to_sync(ToDo.objects.filter(id=other.id).asoft_delete)))
+        self.assertEqual(ToDo.objects.alive().count(), 1)
+
+
+class RankMigrationTests(TransactionTestCase):
+    """0012 rebuilds core_todo on SQLite; run it without post_migrate's help"""
+
+    def migrate(self, targets):
+        executor = MigrationExecutor(connection)
+        executor.migrate(targets)
+        return executor
+
+    def tearDown(self):
+        executor = MigrationExecutor(connection)
+        self.migrate(executor.loader.graph.leaf_nodes())
+
+    def test_keeps_search_triggers_and_backfills_ranks(self):
+        user = User.objects.create_user("21BCE10003", password="pass-123456")
+        self.migrate([("core", "0011_todo_search")])
+        self.assertEqual(missing_triggers(), [])
+        with connection.cursor() as cursor:
+            for text, created in [("second", "2026-01-02"), ("first", "2026-01-01")]:
+                cursor.execute(
+                    "INSERT INTO core_todo (user_id, text, is_done, created_at, updated_at) VALUES (%s, %s, 0, %s, %s)",
+                    [user.id, text, created, created],
+                )
+
+        self.migrate([("core", "0012_todo_rank")])
+        self.assertEqual(missing_triggers(), [])
+        ordered = ToDo.objects.filter(user=user).order_by("rank", "id").values_list("text", flat=True)
+        self.assertEqual(list(ordered), ["first", "second"])
+
+        with mock.patch.object(activity_log, "enabled", False):
+            self.client.force_login(user)
+            self.client.post("/api/todos/add/", json.dumps({"text": "Added after migrating"}),
+                             content_type="application/json")
+            found = self.client.get("/api/todos/search/", {"q": "migrating"}).json()["items"]
+        self.assertEqual([item["text"] for item in found], ["Added after migrating"])
+        self.assertEqual(len(self.client.get("/api/todos/search/", {"q": "second"}).json()["items"]), 1)
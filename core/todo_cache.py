@@ -0,0 +1,128 @@
+"""
+Per-user cache for the default /api/todos/ response.
+The list only changes through the to-do API views, which invalidate the
+user's entry after writing, so reads can skip the database entirely.
+
+Invalidation bumps a per-user generation counter kept in the same backend
+instead of deleting the entry. Readers take the generation before querying
+the database and store it with the entry, and an entry only counts when it
+still matches. So a response built from rows read just before a concurrent
+write can be stored but is never served.
+
+The counter and entries only exist in the configured backend, so it has
+to be shared between processes (the file backend on a single host, Redis
+or Memcached across hosts). With a per-process backend a write handled by
+one worker, or a management command, leaves the others serving their old
+lists until TODO_CACHE_TIMEOUT.
+"""
+from collections import OrderedDict
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+
+
+class TodoCache:
+    """
+    Stores the serialized first page of a user's to-dos together with the
+    (updated_at, id) state used for ETag/Last-Modified.
+
+    Data lives in the Django cache named by TODO_CACHE_ALIAS (the file
+    backend by default). Keys are additionally tracked in a bounded LRU so this
+    process evicts the least recently used users itself and can count it.
+    """
+
+    def __init__(self, alias, max_entries, timeout):
+        self.alias = alias
+        self.max_entries = max_entries
+        self.timeout = timeout
+        self._lru = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    @property
+    def backend(self):
+        return caches[self.alias]
+
+    @staticmethod
+    def key(user_id):
+        return f"todos:{user_id}"
+
+    @staticmethod
+    def generation_key(user_id):
+        return f"todos:{user_id}:gen"
+
+    def get(self, user_id):
+        """
+        ((state, body) or None, generation). After a miss, pass generation
+        to set() along with what was read from the database.
+        """
+        key, generation_key = self.key(user_id), self.generation_key(user_id)
+        found = self.backend.get_many([key, generation_key])
+        generation = found.get(generation_key)
+        if generation is None:
+            # New or evicted counter: start above any value an old entry holds
+            self.backend.add(generation_key, time.time_ns(), None)
+            generation = self.backend.get(generation_key)
+        entry = found.get(key)
+        if entry is not None and entry[0] != generation:
+            entry = None
+        with self._lock:
+            if entry is None:
+                self.misses += 1
+                self._lru.pop(key, None)
+            else:
+                self.hits += 1
+                self._lru[key] = None
+                self._lru.move_to_end(key)
+        return (entry[1:] if entry is not None else None), generation
+
+    def set(self, user_id, generation, state, body):
+        if generation is None:
+            return
+        key = self.key(user_id)
+        evicted = []
+        with self._lock:
+            self._lru[key] = None
+            self._lru.move_to_end(key)
+            while len(self._lru) > self.max_entries:
+                evicted.append(self._lru.popitem(last=False)[0])
+                self.evictions += 1
+        if evicted:
+            self.backend.delete_many(evicted)
+        self.backend.set(key, (generation, state, body), self.timeout)
+
+    def invalidate(self, user_id):
+        key = self.key(user_id)
+        with self._lock:
+            self._lru.pop(key, None)
+            self.invalidations += 1
+        try:
+            self.backend.incr(self.generation_key(user_id))
+        except ValueError:
+            # No counter yet, so nothing cached for the user can match
+            pass
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+                "entries": len(self._lru),
+                "max_entries": self.max_entries,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            }
+
+
+todo_cache = TodoCache(
+    alias=getattr(settings, "TODO_CACHE_ALIAS", "todos"),
+    max_entries=getattr(settings, "TODO_CACHE_MAX_ENTRIES", 5000),
+    timeout=getattr(settings, "TODO_CACHE_TIMEOUT", 300),
+)
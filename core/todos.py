@@ -0,0 +1,331 @@
+"""
+To-do API helpers shared by the sync views (core/views.py) and their async
+variants (core/async_views.py). Query builders here return lazy querysets so
+each caller can evaluate them with the sync or async ORM.
+"""
+from datetime import datetime, timedelta, timezone as dt_timezone
+import json
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import ArchivedToDo, ToDo
+from .ranks import evenly_spaced, rank_between, ranks_after
+
+TODO_FIELDS = ("id", "text", "is_done", "rank")
+TODO_PAGE_SIZE = 200
+TODO_MAX_PAGE_SIZE = 500
+
+# Upper bound on operations accepted by a single batch request
+MAX_BATCH_OPS = 200
+
+# archive_todos purges tombstones after this many days, so older delta
+# cursors can no longer see every deletion
+TODO_TOMBSTONE_DAYS = getattr(settings, "TODO_TOMBSTONE_DAYS", 7)
+
+# rebalance_todo_ranks rewrites lists with keys longer than this; a move
+# that would need a key past the column size rebalances the list itself
+TODO_RANK_REBALANCE_LENGTH = getattr(settings, "TODO_RANK_REBALANCE_LENGTH", 16)
+TODO_RANK_MAX_LENGTH = ToDo._meta.get_field("rank").max_length
+
+ARCHIVED_FIELDS = ("id", "todo_id", "text", "created_at", "completed_at", "archived_at")
+
+_EPOCH = datetime(1970, 1, 1, tzinfo=dt_timezone.utc)
+
+# Largest integer SQLite binds; bigger cursor ids would fail in the query
+_MAX_ID = 2 ** 63 - 1
+
+
+def encode_cursor(ts, pk):
+    """Opaque cursor for a (timestamp, id) keyset position"""
+    micros = (ts - _EPOCH) // timedelta(microseconds=1)
+    return f"{micros}.{pk}"
+
+
+def _cursor_id(value):
+    pk = int(value)
+    if not 0 <= pk <= _MAX_ID:
+        raise ValueError("cursor id out of range")
+    return pk
+
+
+def decode_cursor(cursor):
+    """(timestamp, id) back from encode_cursor; raises ValueError"""
+    micros, pk = cursor.split(".")
+    try:
+        ts = _EPOCH + timedelta(microseconds=int(micros))
+    except OverflowError:
+        raise ValueError("cursor timestamp out of range") from None
+    return ts, _cursor_id(pk)
+
+
+def encode_rank_cursor(rank, pk):
+    """Opaque cursor for a (rank, id) keyset position"""
+    return f"{rank}.{pk}"
+
+
+def decode_rank_cursor(cursor):
+    """(rank, id) back from encode_rank_cursor; raises ValueError"""
+    rank, pk = cursor.split(".")
+    return rank, _cursor_id(pk)
+
+
+def is_default_listing(request):
+    """Plain first-page request (the dashboard load), which is what gets cached"""
+    return not request.GET
+
+
+def parse_list_params(request, decode_after=decode_cursor):
+    """(limit, since, after) from the query string; raises ValueError"""
+    limit = min(int(request.GET.get("limit", TODO_PAGE_SIZE)), TODO_MAX_PAGE_SIZE)
+    if limit < 1:
+        raise ValueError("limit must be positive")
+    since = request.GET.get("since")
+    after = request.GET.get("after")
+    return (
+        limit,
+        decode_cursor(since) if since else None,
+        decode_after(after) if after else None,
+    )
+
+
+def state_query(user_id):
+    """
+    Latest (updated_at, id) across the user's todos, tombstones included.
+    Any add/toggle/delete moves it, so it backs both ETag and Last-Modified.
+    """
+    return (
+        ToDo.objects.filter(user_id=user_id)
+        .order_by("-updated_at", "-id")
+        .values_list("updated_at", "id")
+    )
+
+
+def etag_for(state, request):
+    version = encode_cursor(*state) if state else "0"
+    # Different pages/deltas of the same list must not share a validator
+    return f"{version}:{request.GET.urlencode()}"
+
+
+def cursor_expired(since):
+    """True if deletions after since may already have been purged"""
+    return since[0] < timezone.now() - timedelta(days=TODO_TOMBSTONE_DAYS)
+
+
+def delta_query(user_id, since, limit):
+    """Rows changed after the since cursor, one extra to detect has_more"""
+    ts, pk = since
+    return (
+        ToDo.objects.filter(user_id=user_id)
+        .filter(Q(updated_at__gt=ts) | Q(updated_at=ts, id__gt=pk))
+        .order_by("updated_at", "id")
+        .values(*TODO_FIELDS, "updated_at", "deleted_at")[:limit + 1]
+    )
+
+
+def delta_payload(rows, limit, since_cursor):
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    return {
+        "items": [
+            {field: row[field] for field in TODO_FIELDS}
+            for row in rows if row["deleted_at"] is None
+        ],
+        "deleted": [row["id"] for row in rows if row["deleted_at"] is not None],
+        "cursor": encode_cursor(rows[-1]["updated_at"], rows[-1]["id"]) if rows else since_cursor,
+        "has_more": has_more,
+    }
+
+
+def after_position(rank, pk):
+    """Rows after (rank, pk) in list order"""
+    return Q(rank__gt=rank) | Q(rank=rank, id__gt=pk)
+
+
+def page_query(user_id, after, limit):
+    """One keyset page of live todos in list order, one extra row to detect a next page"""
+    todos = ToDo.objects.alive().filter(user_id=user_id)
+    if after:
+        todos = todos.filter(after_position(*after))
+    return todos.order_by("rank", "id").values(*TODO_FIELDS)[:limit + 1]
+
+
+def page_payload(rows, limit, state):
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_rank_cursor(rows[-1]["rank"], rows[-1]["id"])
+    return {
+        "items": [{field: row[field] for field in TODO_FIELDS} for row in rows],
+        "next": next_cursor,
+        "cursor": encode_cursor(*state) if state else None,
+    }
+
+
+def archived_query(user_id, after, limit):
+    """One keyset page of archived todos, one extra row to detect a next page"""
+    archived = ArchivedToDo.objects.filter(user_id=user_id)
+    if after:
+        ts, pk = after
+        archived = archived.filter(Q(created_at__gt=ts) | Q(created_at=ts, id__gt=pk))
+    return archived.order_by("created_at", "id").values(*ARCHIVED_FIELDS)[:limit + 1]
+
+
+def archived_payload(rows, limit):
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(rows[-1]["created_at"], rows[-1]["id"])
+    return {"items": rows, "next": next_cursor}
+
+
+def listing_body(payload):
+    """Serialized default listing, byte-identical to the JsonResponse body"""
+    return json.dumps(payload, cls=DjangoJSONEncoder).encode()
+
+
+def _valid_id(value):
+    return isinstance(value, int) and not isinstance(value, bool) and 0 < value <= _MAX_ID
+
+
+def parse_batch(data, user):
+    """
+    Validate a batch body and split off its adds.
+
+    Returns (results, adds, changes) where results already holds the
+    per-operation errors and changes lists the toggles and deletes as
+    (index, kind, todo id) in request order; raises ValueError for a
+    malformed batch.
+    """
+    ops = data.get("ops") if isinstance(data, dict) else None
+    if not isinstance(ops, list) or not ops:
+        raise ValueError("No operations given")
+    if len(ops) > MAX_BATCH_OPS:
+        raise ValueError(f"At most {MAX_BATCH_OPS} operations per batch")
+
+    results = [None] * len(ops)
+    adds = []          # (index, ToDo)
+    changes = []       # (index, "toggle" | "delete", todo id)
+
+    for i, op in enumerate(ops):
+        kind = op.get("op") if isinstance(op, dict) else None
+        if kind == "add":
+            text = op.get("text")
+            if not isinstance(text, str):
+                results[i] = {"ok": False, "error": "Text must be a string"}
+            elif not text.strip():
+                results[i] = {"ok": False, "error": "Task cannot be empty"}
+            else:
+                adds.append((i, ToDo(user=user, text=text.strip()[:255])))
+        elif kind in ("toggle", "delete"):
+            if not _valid_id(op.get("id")):
+                results[i] = {"ok": False, "error": "Invalid id"}
+            else:
+                changes.append((i, kind, op["id"]))
+        else:
+            results[i] = {"ok": False, "error": "Unknown operation"}
+
+    return results, adds, changes
+
+
+def parse_move(data):
+    """after_id (None: move to the top) from a move body; raises ValueError"""
+    if not isinstance(data, dict) or "after" not in data:
+        raise ValueError("after is required")
+    after_id = data["after"]
+    if after_id is None:
+        return None
+    if isinstance(after_id, bool) or not isinstance(after_id, int):
+        raise ValueError("after must be a todo id or null")
+    return after_id
+
+
+def apply_batch(user, results, adds, changes):
+    """
+    Apply a parsed batch in one transaction and fill in results.
+
+    Toggles and deletes take effect in request order, as if sent one by
+    one: toggling an item twice flips it back, and an operation on an item
+    deleted earlier in the batch fails with "Todo not found". Adds can't be
+    referred to by later operations (their ids don't exist yet). Each kind
+    of write is still issued as one statement.
+    """
+    with transaction.atomic():
+        if adds:
+            # bulk_create skips ToDo.save, so append them to the list here
+            ranks = ranks_after(ToDo.objects.last_rank(user.id), len(adds))
+            for (_, todo), rank in zip(adds, ranks):
+                todo.rank = rank
+            created = ToDo.objects.bulk_create([todo for _, todo in adds])
+            for (i, _), todo in zip(adds, created):
+                results[i] = {"ok": True, "id": todo.id, "text": todo.text, "is_done": todo.is_done, "rank": todo.rank}
+
+        if changes:
+            live = ToDo.objects.alive().filter(user=user).in_bulk({todo_id for _, _, todo_id in changes})
+            toggled, deleted = {}, set()
+            for i, kind, todo_id in changes:
+                todo = live.get(todo_id)
+                if todo is None:
+                    results[i] = {"ok": False, "error": "Todo not found"}
+                elif kind == "toggle":
+                    todo.is_done = not todo.is_done
+                    toggled[todo_id] = todo
+                    results[i] = {"ok": True, "id": todo_id, "is_done": todo.is_done}
+                else:
+                    del live[todo_id]
+                    toggled.pop(todo_id, None)
+                    deleted.add(todo_id)
+                    results[i] = {"ok": True, "id": todo_id}
+
+            if toggled:
+                now = timezone.now()
+                for todo in toggled.values():
+                    # bulk_update skips auto_now, so bump it explicitly
+                    todo.updated_at = now
+                ToDo.objects.bulk_update(toggled.values(), ["is_done", "updated_at"])
+            if deleted:
+                ToDo.objects.filter(user=user, id__in=deleted).soft_delete()
+    return results
+
+
+def move_todo(user_id, todo_id, after_id):
+    """
+    Place a todo right after the todo after_id (None: at the top) by giving
+    it a key between that todo and the next one. Only the moved row is
+    written, unless the list has to be rebalanced first. Returns the new
+    rank; raises ToDo.DoesNotExist for either id.
+    """
+    with transaction.atomic():
+        todos = ToDo.objects.alive().filter(user_id=user_id)
+        if not todos.filter(id=todo_id).exists():
+            raise ToDo.DoesNotExist
+        others = todos.exclude(id=todo_id).order_by("rank", "id").values_list("rank", "id")
+        if after_id is None:
+            before = ""
+            following = others.first()
+        else:
+            before, pk = others.get(id=after_id)
+            following = others.filter(after_position(before, pk)).first()
+        rank = rank_between(before, following[0] if following else None)
+        if rank is None or len(rank) > TODO_RANK_MAX_LENGTH:
+            # Tied keys (concurrent appends) or a gap split too often
+            rebalance_ranks(user_id)
+            return move_todo(user_id, todo_id, after_id)
+        ToDo.objects.filter(id=todo_id).update(rank=rank, updated_at=timezone.now())
+    return rank
+
+
+def rebalance_ranks(user_id):
+    """Rewrite a user's live todos with evenly spaced keys, keeping their order"""
+    with transaction.atomic():
+        todos = list(ToDo.objects.alive().filter(user_id=user_id).order_by("rank", "id").only("id", "rank"))
+        # Bumped so delta sync hands the new keys to other devices
+        now = timezone.now()
+        for todo, rank in zip(todos, evenly_spaced(len(todos))):
+            todo.rank = rank
+            todo.updated_at = now
+        ToDo.objects.bulk_update(todos, ["rank", "updated_at"], batch_size=500)
+    return len(todos)
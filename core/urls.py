@@ -1,16 +1,35 @@
+from django.conf import settings
 from django.urls import path
-from . import views
+from . import assets, views
+
+# Under ASGI the authenticated pages and to-do API use their async variants;
+# everything else is shared.
+if settings.ASYNC_VIEWS:
+    from . import async_views as student_views
+else:
+    student_views = views
 
 urlpatterns = [
     path('', views.index, name='index'),
     path('login/', views.login_page, name='login'),
     path('logout/', views.logout_view, name='logout'),
-    path('dashboard/', views.dashboard, name='dashboard'),
-    path("api/todos/", views.get_todos, name="get_todos"),
-    path("api/todos/add/", views.add_todo, name="add_todo"),
-    path("api/todos/toggle/<int:todo_id>/", views.toggle_todo, name="toggle_todo"),
-    path("api/todos/delete/<int:todo_id>/", views.delete_todo, name="delete_todo"),
-    path("profile/", views.profile_view, name="profile"),
-    path("id-card/", views.id_card, name="id_card"),
-    path("credentials/", views.credentials_view, name="credentials"),
+    path('dashboard/', student_views.dashboard, name='dashboard'),
+    path("api/todos/", student_views.get_todos, name="get_todos"),
+    path("api/todos/add/", student_views.add_todo, name="add_todo"),
+    path("api/todos/toggle/<int:todo_id>/", student_views.toggle_todo, name="toggle_todo"),
+    path("api/todos/delete/<int:todo_id>/", student_views.delete_todo, name="delete_todo"),
+    path("api/todos/move/<int:todo_id>/", student_views.move_todo_view, name="move_todo"),
+    path("api/todos/batch/", student_views.batch_todos, name="batch_todos"),
+    path("api/todos/archived/", student_views.archived_todos, name="archived_todos"),
+    path("api/todos/search/", student_views.search_todos, name="search_todos"),
+    path("api/todos/export/", student_views.export_todos, name="export_todos"),
+    path("api/todos/cache-stats/", views.todo_cache_stats, name="todo_cache_stats"),
+    path("metrics/", views.metrics_view, name="metrics"),
+    path("api/students/", views.student_directory_api, name="student_directory_api"),
+    path("api/students/export/", student_views.export_credentials, name="export_credentials"),
+    path("staff/students/", views.student_directory, name="student_directory"),
+    path("assets/<str:filename>", assets.serve_asset, name="asset"),
+    path("profile/", student_views.profile_view, name="profile"),
+    path("id-card/", student_views.id_card, name="id_card"),
+    path("credentials/", student_views.credentials_view, name="credentials"),
 ]
@@ -2,9 +2,30 @@ from django.shortcuts import render, redirect
 from django.contrib.auth import authenticate, login, logout
 from django.contrib import messages
 from django.contrib.auth.decorators import login_required
-from django.http import JsonResponse
+from django.http import HttpResponse, JsonResponse
+from django.contrib.admin.views.decorators import staff_member_required
 from django.views.decorators.csrf import csrf_exempt
-from .models import ToDo, StudentCredentials, extract_branch_from_username
+from django.views.decorators.http import condition
+from .activity import log_event
+from .exports import (
+    CREDENTIALS_EXPORT_FIELDS, EXPORT_CHUNK_ROWS, TODO_EXPORT_FIELDS, ExportEncoder,
+    credentials_export_query, export_response, parse_export_params, stream, todo_export_query,
+)
+from .directory import directory_payload, directory_query, parse_directory_params
+from .id_cards import get_badge
+from .login_admission import Rejected, admit, throttle
+from .metrics import registry
+from .models import BRANCH_CODE_MAP, ActivityEvent, ToDo
+from .replicas import is_primary, read_alias
+from .search import parse_search_params, search_payload, search_query
+from .student import get_student_context
+from .todo_cache import todo_cache
+from .todos import (
+    TODO_PAGE_SIZE, apply_batch, archived_payload, archived_query, cursor_expired,
+    decode_rank_cursor, delta_payload, delta_query, etag_for, is_default_listing,
+    listing_body, move_todo, page_payload, page_query, parse_batch, parse_list_params,
+    parse_move, state_query,
+)
 import json
 
 
@@ -25,12 +46,28 @@ def login_page(request):
         username = request.POST.get('username', '').strip()
         password = request.POST.get('password', '')
         
-        user = authenticate(request, username=username, password=password)
+        # Hashing is the expensive part: throttle and bound it first
+        ip = request.META.get('REMOTE_ADDR', '')
+        try:
+            with admit(username, ip):
+                user = authenticate(request, username=username, password=password)
+        except Rejected as exc:
+            if exc.status == 429:
+                messages.error(request, "Too many login attempts. Please try again later.")
+            else:
+                messages.error(request, "The portal is busy. Please try again in a few seconds.")
+            response = render(request, 'core/login.html', status=exc.status)
+            response['Retry-After'] = str(exc.retry_after)
+            return response
         
         if user is not None:
+            throttle.succeeded(username, ip)
             login(request, user)
+            log_event(request, ActivityEvent.Action.LOGIN)
             return redirect('dashboard')
         else:
+            throttle.failed(username, ip)
+            log_event(request, ActivityEvent.Action.LOGIN_FAILED, username)
             messages.error(request, "Invalid username or password.")
     
     return render(request, 'core/login.html')
@@ -38,6 +75,8 @@ def login_page(request):
 
 def logout_view(request):
     """Logout - silent redirect to login page"""
+    if request.user.is_authenticated:
+        log_event(request, ActivityEvent.Action.LOGOUT)
     request.session.flush()
     logout(request)
     response = redirect('login')
@@ -50,56 +89,243 @@ def logout_view(request):
 @login_required(login_url='login')
 def dashboard(request):
     """Main dashboard page"""
-    return render(request, 'core/dashboard.html', {'user': request.user})
+    student = get_student_context(request)
+    return render(request, 'core/dashboard.html', {
+        'user': student.user,
+        'creds': student.creds,
+        'todos': _initial_todos(request.user.id),
+    })
+
+
+def _initial_todos(user_id):
+    """
+    First page of the user's to-dos in the GET /api/todos/ shape, embedded
+    in the dashboard so the widget renders without a follow-up request.
+    Shares the per-user listing cache with get_todos.
+    """
+    cached, generation = todo_cache.get(user_id)
+    if cached is not None:
+        return json.loads(cached[1])
+    db = read_alias(ToDo)
+    state = state_query(user_id).using(db).first()
+    payload = page_payload(list(page_query(user_id, None, TODO_PAGE_SIZE).using(db)), TODO_PAGE_SIZE, state)
+    if is_primary(db):
+        todo_cache.set(user_id, generation, state, listing_body(payload))
+    return payload
 
 
 @login_required
 def profile_view(request):
     """User profile page"""
-    return render(request, "core/profile.html")
+    student = get_student_context(request)
+    return render(request, "core/profile.html", {"user": student.user, "creds": student.creds})
 
 
 @login_required
 def id_card(request):
     """Student ID card page"""
-    creds, _ = StudentCredentials.objects.get_or_create(user=request.user)
-    
-    if not creds.branch_name:
-        code, name = extract_branch_from_username(request.user.username)
-        if name:
-            creds.branch_code = code
-            creds.branch_name = name
-            creds.save()
-    
+    student = get_student_context(request)
     return render(request, "core/id_card.html", {
-        "user": request.user,
-        "creds": creds,
+        "user": student.user,
+        "creds": student.creds,
+        "badge": get_badge(student.user, student.creds),
     })
 
 
 @login_required
 def credentials_view(request):
     """Student credentials page"""
-    creds, _ = StudentCredentials.objects.get_or_create(user=request.user)
-    
-    if not creds.branch_name:
-        code, name = extract_branch_from_username(request.user.username)
-        if name:
-            creds.branch_code = code
-            creds.branch_name = name
-            creds.save()
-    
-    return render(request, "core/credentials.html", {"creds": creds})
+    student = get_student_context(request)
+    log_event(request, ActivityEvent.Action.CREDENTIALS_VIEW)
+    return render(request, "core/credentials.html", {"creds": student.creds})
 
 
 # ==================== TODO API ENDPOINTS ====================
 
+def _todo_state(request):
+    """
+    Memoized todos.state_query() result so the conditional checks share one
+    query; for the default listing it comes from the per-user cache when
+    possible.
+    """
+    if hasattr(request, "_todo_state"):
+        return request._todo_state
+    cached = request._todo_generation = None
+    if is_default_listing(request):
+        cached, request._todo_generation = todo_cache.get(request.user.id)
+    if cached is not None:
+        request._todo_state, request._todo_body = cached
+    else:
+        # The page is read from the same copy as its validators
+        request._todo_db = read_alias(ToDo)
+        request._todo_state = state_query(request.user.id).using(request._todo_db).first()
+    return request._todo_state
+
+
+def _todos_etag(request):
+    return etag_for(_todo_state(request), request)
+
+
+def _todos_last_modified(request):
+    state = _todo_state(request)
+    return state[0] if state else None
+
+
 @csrf_exempt
 @login_required
+@condition(etag_func=_todos_etag, last_modified_func=_todos_last_modified)
 def get_todos(request):
-    """Get all todos for current user"""
-    todos = ToDo.objects.filter(user=request.user).values("id", "text", "is_done")
-    return JsonResponse(list(todos), safe=False)
+    """
+    Get todos for current user.
+
+    Full list in the user's order (keyset paginated on rank, id):
+        GET /api/todos/?limit=200&after=<next>
+        -> {"items": [...], "next": <cursor|null>, "cursor": <sync cursor>}
+    Delta since an earlier sync cursor:
+        GET /api/todos/?since=<cursor>
+        -> {"items": [changed], "deleted": [ids], "cursor": ..., "has_more": bool}
+        (410 once the cursor is older than the tombstone retention)
+    Unchanged lists answer 304 via ETag/Last-Modified.
+    """
+    try:
+        limit, since, after = parse_list_params(request, decode_after=decode_rank_cursor)
+    except ValueError:
+        return JsonResponse({"error": "Invalid cursor or limit"}, status=400)
+    if since and cursor_expired(since):
+        return JsonResponse({"error": "Sync cursor expired, reload the full list"}, status=410)
+
+    cached_body = getattr(request, "_todo_body", None)
+    if cached_body is not None:
+        return HttpResponse(cached_body, content_type="application/json")
+
+    if since:
+        rows = list(delta_query(request.user.id, since, limit))
+        return JsonResponse(delta_payload(rows, limit, request.GET["since"]))
+
+    state = _todo_state(request)
+    rows = list(page_query(request.user.id, after, limit).using(request._todo_db))
+    response = JsonResponse(page_payload(rows, limit, state))
+    if is_default_listing(request) and is_primary(request._todo_db):
+        todo_cache.set(request.user.id, request._todo_generation, state, response.content)
+    return response
+
+
+@login_required
+def archived_todos(request):
+    """
+    Completed todos moved out by archive_todos, oldest first.
+
+        GET /api/todos/archived/?limit=200&after=<next>
+        -> {"items": [...], "next": <cursor|null>}
+    """
+    try:
+        limit, _, after = parse_list_params(request)
+    except ValueError:
+        return JsonResponse({"error": "Invalid cursor or limit"}, status=400)
+    rows = list(archived_query(request.user.id, after, limit))
+    return JsonResponse(archived_payload(rows, limit))
+
+
+@login_required
+def search_todos(request):
+    """
+    Full-text search over the user's todos, best match first.
+
+        GET /api/todos/search/?q=lab rec&limit=20&after=<next>
+        -> {"items": [...], "next": <cursor|null>}
+
+    Pages are best-effort offsets into the ranking (see core.search).
+    """
+    try:
+        q, offset, limit = parse_search_params(request.GET)
+        rows = list(search_query(request.user.id, q, offset, limit))
+    except ValueError as e:
+        return JsonResponse({"error": str(e)}, status=400)
+    return JsonResponse(search_payload(rows, offset, limit))
+
+
+@login_required
+def export_todos(request):
+    """
+    Download the user's todos.
+
+        GET /api/todos/export/?format=csv|ndjson&gzip=1
+    """
+    try:
+        fmt, gzip = parse_export_params(request.GET)
+    except ValueError as e:
+        return JsonResponse({"error": str(e)}, status=400)
+    rows = todo_export_query(request.user.id).iterator(chunk_size=EXPORT_CHUNK_ROWS)
+    return export_response(stream(rows, ExportEncoder(fmt, TODO_EXPORT_FIELDS, gzip)), "todos", fmt, gzip)
+
+
+@staff_member_required
+def todo_cache_stats(request):
+    """Hit/miss/eviction counters of this process's to-do cache"""
+    return JsonResponse(todo_cache.stats())
+
+
+@staff_member_required
+def student_directory_api(request):
+    """
+    Staff search over students.
+
+        GET /api/students/?branch=BCE&prefix=21BCE&library_id=LIB00012&limit=50&after=<next>
+        -> {"items": [...], "next": <cursor|null>, "branches": [{code, name, students}]}
+    """
+    try:
+        params = parse_directory_params(request.GET)
+        rows = list(directory_query(**params))
+    except ValueError:
+        return JsonResponse({"error": "Invalid branch, cursor or limit"}, status=400)
+    return JsonResponse(directory_payload(rows, params["limit"], params["prefix"]))
+
+
+@staff_member_required
+def export_credentials(request):
+    """
+    Staff download of every student's credentials joined with their account.
+
+        GET /api/students/export/?format=csv|ndjson&gzip=1&branch=BCE
+    """
+    try:
+        fmt, gzip = parse_export_params(request.GET)
+        branch = parse_directory_params(request.GET)["branch"]
+    except ValueError as e:
+        return JsonResponse({"error": str(e)}, status=400)
+    rows = credentials_export_query(branch).iterator(chunk_size=EXPORT_CHUNK_ROWS)
+    encoder = ExportEncoder(fmt, CREDENTIALS_EXPORT_FIELDS, gzip)
+    return export_response(stream(rows, encoder), "student_credentials", fmt, gzip)
+
+
+@staff_member_required
+def student_directory(request):
+    """Staff student directory page"""
+    try:
+        params = parse_directory_params(request.GET)
+        rows = list(directory_query(**params))
+    except ValueError:
+        params = parse_directory_params({})
+        rows = list(directory_query(**params))
+        messages.error(request, "Unknown branch, cursor or page size.")
+    page = directory_payload(rows, params["limit"], params["prefix"])
+    next_query = None
+    if page["next"]:
+        query = request.GET.copy()
+        query["after"] = page["next"]
+        next_query = query.urlencode()
+    return render(request, "core/student_directory.html", {
+        "page": page,
+        "params": params,
+        "branches": BRANCH_CODE_MAP.items(),
+        "next_query": next_query,
+    })
+
+
+@staff_member_required
+def metrics_view(request):
+    """Request metrics of this process in Prometheus text format"""
+    return HttpResponse(registry.render(), content_type="text/plain; version=0.0.4; charset=utf-8")
 
 
 @csrf_exempt
@@ -117,11 +343,14 @@ def add_todo(request):
             return JsonResponse({"error": "Task cannot be empty"}, status=400)
         
         todo = ToDo.objects.create(user=request.user, text=task_text)
+        todo_cache.invalidate(request.user.id)
+        log_event(request, ActivityEvent.Action.TODO_ADD, str(todo.id))
         
         return JsonResponse({
             "id": todo.id,
             "text": todo.text,
-            "is_done": todo.is_done
+            "is_done": todo.is_done,
+            "rank": todo.rank
         })
     
     except json.JSONDecodeError:
@@ -138,9 +367,11 @@ def toggle_todo(request, todo_id):
         return JsonResponse({"error": "Method not allowed"}, status=405)
     
     try:
-        todo = ToDo.objects.get(id=todo_id, user=request.user)
+        todo = ToDo.objects.alive().get(id=todo_id, user=request.user)
         todo.is_done = not todo.is_done
         todo.save()
+        todo_cache.invalidate(request.user.id)
+        log_event(request, ActivityEvent.Action.TODO_TOGGLE, str(todo.id))
         
         return JsonResponse({
             "status": "updated",
@@ -161,12 +392,79 @@ def delete_todo(request, todo_id):
         return JsonResponse({"error": "Method not allowed"}, status=405)
     
     try:
-        deleted = ToDo.objects.filter(id=todo_id, user=request.user).delete()[0]
+        deleted = ToDo.objects.filter(id=todo_id, user=request.user).soft_delete()
+        todo_cache.invalidate(request.user.id)
         
         if deleted == 0:
             return JsonResponse({"error": "Todo not found"}, status=404)
         
+        log_event(request, ActivityEvent.Action.TODO_DELETE, str(todo_id))
         return JsonResponse({"status": "deleted"})
     
     except Exception as e:
-        return JsonResponse({"error": str(e)}, status=500)
\ No newline at end of file
+        return JsonResponse({"error": str(e)}, status=500)
+
+
+@csrf_exempt
+@login_required
+def move_todo_view(request, todo_id):
+    """
+    Move a todo within the list (drag to reorder).
+
+    Body: {"after": <id of the todo it now follows, null for the top>}
+    Returns {"id": ..., "rank": <new rank>}; only the moved todo changes.
+    """
+    if request.method != 'POST':
+        return JsonResponse({"error": "Method not allowed"}, status=405)
+
+    try:
+        after_id = parse_move(json.loads(request.body))
+    except json.JSONDecodeError:
+        return JsonResponse({"error": "Invalid JSON"}, status=400)
+    except ValueError as e:
+        return JsonResponse({"error": str(e)}, status=400)
+
+    try:
+        rank = move_todo(request.user.id, todo_id, after_id)
+    except ToDo.DoesNotExist:
+        return JsonResponse({"error": "Todo not found"}, status=404)
+    except Exception as e:
+        return JsonResponse({"error": str(e)}, status=500)
+
+    todo_cache.invalidate(request.user.id)
+    log_event(request, ActivityEvent.Action.TODO_MOVE, str(todo_id))
+    return JsonResponse({"id": todo_id, "rank": rank})
+
+
+@csrf_exempt
+@login_required
+def batch_todos(request):
+    """
+    Apply a list of add/toggle/delete operations in one transaction.
+
+    Body: {"ops": [{"op": "add", "text": "..."},
+                   {"op": "toggle", "id": 1},
+                   {"op": "delete", "id": 2}]}
+    Returns {"results": [...]} with one entry per operation, in order.
+    Operations take effect in request order (see todos.apply_batch), so one
+    on an item deleted earlier in the batch fails.
+    """
+    if request.method != 'POST':
+        return JsonResponse({"error": "Method not allowed"}, status=405)
+
+    try:
+        batch = parse_batch(json.loads(request.body), request.user)
+    except json.JSONDecodeError:
+        return JsonResponse({"error": "Invalid JSON"}, status=400)
+    except ValueError as e:
+        return JsonResponse({"error": str(e)}, status=400)
+
+    try:
+        results = apply_batch(request.user, *batch)
+    except Exception as e:
+        return JsonResponse({"error": str(e)}, status=500)
+    finally:
+        todo_cache.invalidate(request.user.id)
+
+    log_event(request, ActivityEvent.Action.TODO_BATCH, f"{len(results)} ops")
+    return JsonResponse({"results": results})
@@ -12,5 +12,7 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'vtopclone.settings')
+# Use the native async views (core/async_views.py) when served over ASGI
+os.environ.setdefault('VTOP_ASYNC_VIEWS', '1')
 
 application = get_asgi_application()
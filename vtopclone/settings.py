@@ -10,6 +10,8 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
+import os
+import tempfile
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -41,6 +43,10 @@ INSTALLED_APPS = [
 ]
 LOGIN_URL = '/login/'
 MIDDLEWARE = [
+    # Outermost so it can time every middleware below it (served at /metrics/)
+    'core.metrics.MetricsMiddleware',
+    # Before sessions and auth so their lookups are routed as well
+    'core.replicas.ReplicaRoutingMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -57,19 +63,31 @@ TEMPLATES = [
     {
         'BACKEND': 'django.template.backends.django.DjangoTemplates',
         'DIRS': [],
-        'APP_DIRS': True,
         'OPTIONS': {
             'context_processors': [
                 'django.template.context_processors.request',
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
             ],
+            # Compile each template once per process. Listed explicitly (it
+            # is otherwise only implied when DEBUG is off); with DEBUG on,
+            # the autoreloader still resets it when a template changes.
+            'loaders': [
+                ('django.template.loaders.cached.Loader', [
+                    'django.template.loaders.filesystem.Loader',
+                    'django.template.loaders.app_directories.Loader',
+                ]),
+            ],
         },
     },
 ]
 
 WSGI_APPLICATION = 'vtopclone.wsgi.application'
 
+# Serve the student pages and to-do API from core/async_views.py.
+# vtopclone/asgi.py turns this on; set VTOP_ASYNC_VIEWS=0 to opt out.
+ASYNC_VIEWS = os.environ.get('VTOP_ASYNC_VIEWS', '0') == '1'
+
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
@@ -77,6 +95,156 @@ DATABASES = {
     }
 }
 
+# High-concurrency SQLite profile. WAL lets readers run alongside the single
+# writer, IMMEDIATE transactions take the write lock up front instead of
+# failing on a lock upgrade, and the busy timeout makes writers queue rather
+# than raise "database is locked". Set VTOP_SQLITE_PROFILE=default for
+# Django's stock rollback-journal behaviour (used as the stress-test baseline).
+SQLITE_PROFILE = os.environ.get('VTOP_SQLITE_PROFILE', 'concurrent')
+
+SQLITE_PRAGMAS = [
+    'PRAGMA journal_mode=WAL',
+    'PRAGMA synchronous=NORMAL',
+    'PRAGMA busy_timeout=20000',
+    'PRAGMA cache_size=-20000',       # ~20 MB page cache per connection
+    'PRAGMA mmap_size=134217728',     # 128 MB memory-mapped reads
+    'PRAGMA temp_store=MEMORY',
+]
+
+if SQLITE_PROFILE == 'concurrent':
+    DATABASES['default'].update({
+        # Persistent connections keep the pragmas and page cache warm. Under
+        # ASGI, connections are opened in worker threads that don't follow
+        # the request lifecycle, so they stay per-request there.
+        'CONN_MAX_AGE': 0 if ASYNC_VIEWS else 600,
+        'CONN_HEALTH_CHECKS': True,
+        'OPTIONS': {
+            'timeout': 20,
+            'transaction_mode': 'IMMEDIATE',
+            'init_command': ';'.join(SQLITE_PRAGMAS),
+        },
+    })
+
+# Read replicas (core/replicas.py). VTOP_READ_REPLICAS is a comma-separated
+# list of SQLite files standing in for replicas of the primary; refresh them
+# with `python manage.py sync_replicas`. Requests read from a random replica
+# and write to 'default'; a browser that changed something reads from the
+# primary for REPLICA_STICKY_SECONDS so it always sees its own writes.
+READ_REPLICAS = []
+for _number, _path in enumerate(filter(None, os.environ.get('VTOP_READ_REPLICAS', '').split(',')), 1):
+    DATABASES[f'replica{_number}'] = {
+        **DATABASES['default'],
+        'NAME': _path.strip(),
+        # The test runner points replicas at the test primary
+        'TEST': {'MIRROR': 'default'},
+    }
+    READ_REPLICAS.append(f'replica{_number}')
+
+DATABASE_ROUTERS = ['core.replicas.PrimaryReplicaRouter']
+REPLICA_STICKY_SECONDS = 5
+
+# Caches
+# https://docs.djangoproject.com/en/5.2/topics/cache/
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    # Per-user /api/todos/ payloads (core/todo_cache.py). File-based so an
+    # invalidation from one worker, or from archive_todos and
+    # rebalance_todo_ranks run as separate processes, reaches every worker
+    # on the host; use Redis or Memcached when running on several hosts.
+    'todos': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.path.join(tempfile.gettempdir(), 'vtop-todos'),
+        'TIMEOUT': 300,
+        'OPTIONS': {'MAX_ENTRIES': 10000},
+    },
+    # StudentCredentials behind the student pages (core/student.py). Shared
+    # for the same reason: saves in one worker and rotate_wifi_credentials
+    # drop entries that every other process must stop serving.
+    'students': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.path.join(tempfile.gettempdir(), 'vtop-students'),
+        'TIMEOUT': 60,
+        'OPTIONS': {'MAX_ENTRIES': 10000},
+    },
+    # Rendered template fragments that are the same for every student
+    # ({% cache %} blocks in dashboard.html). They only change with the
+    # templates, so they never expire; locmem starts empty after each
+    # deploy. With a shared backend, bump VERSION on deploy instead.
+    'fragments': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'vtop-fragments',
+        'TIMEOUT': None,
+        'VERSION': 1,
+    },
+    # Rendered ID card badges (core/id_cards.py), keyed by a digest of the
+    # fields they show so edits take effect in every process; the TTL only
+    # clears out superseded badges. Bump VERSION when id_card_badge.html
+    # changes and the backend outlives a deploy.
+    'id_cards': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'vtop-id-cards',
+        'TIMEOUT': 24 * 60 * 60,
+        'VERSION': 1,
+        'OPTIONS': {'MAX_ENTRIES': 10000},
+    },
+    # Login throttle counters (core/login_admission.py). File-based so every
+    # worker process on the host sees the same counts; use Redis or
+    # Memcached when running on several hosts.
+    'throttle': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.path.join(tempfile.gettempdir(), 'vtop-login-throttle'),
+        'TIMEOUT': 600,
+    },
+}
+
+# Activity log (core/activity.py): events are queued in memory and written
+# by a background thread in batches of ACTIVITY_LOG_BATCH_SIZE, or after
+# ACTIVITY_LOG_FLUSH_INTERVAL seconds. Events beyond ACTIVITY_LOG_QUEUE_SIZE
+# waiting to be written are dropped (and counted on /metrics/).
+ACTIVITY_LOG_ENABLED = True
+ACTIVITY_LOG_QUEUE_SIZE = 10000
+ACTIVITY_LOG_BATCH_SIZE = 500
+ACTIVITY_LOG_FLUSH_INTERVAL = 1.0
+
+TODO_CACHE_ALIAS = 'todos'
+STUDENT_CACHE_ALIAS = 'students'
+ID_CARD_CACHE_ALIAS = 'id_cards'
+TODO_CACHE_MAX_ENTRIES = 5000
+TODO_CACHE_TIMEOUT = 300
+
+# archive_todos: completed to-dos untouched for this many days move to the
+# archive table; deletion tombstones are purged after TODO_TOMBSTONE_DAYS
+# (delta-sync cursors older than that get a 410 and must reload).
+TODO_ARCHIVE_AFTER_DAYS = 30
+TODO_TOMBSTONE_DAYS = 7
+
+# rebalance_todo_ranks re-spaces a user's list once a rank key (core/ranks.py)
+# is longer than this; keys grow by about one character per six moves into
+# the same gap.
+TODO_RANK_REBALANCE_LENGTH = 16
+
+# Login admission control (core/login_admission.py). Password hashes running
+# at once per process, how many logins may queue for one and for how long;
+# beyond that logins get a 503 with Retry-After instead of tying up workers.
+LOGIN_HASH_SLOTS = max(1, (os.cpu_count() or 2) // 2)
+LOGIN_QUEUE_SIZE = 16
+LOGIN_QUEUE_TIMEOUT = 2.0
+LOGIN_RETRY_AFTER = 5
+
+# Throttling: (count, window in seconds) for failed logins per username from
+# one client IP, for failed logins per username from anywhere (high, so bad
+# passwords sent for someone else's username can't lock them out), and for
+# all login attempts per client IP (kept generous: campus NAT puts many
+# students behind one address). Counters live in this cache alias; point it
+# at a shared backend so limits hold across worker processes.
+LOGIN_THROTTLE_ALIAS = 'throttle'
+LOGIN_FAILURE_LIMIT = (5, 300)
+LOGIN_USERNAME_LIMIT = (100, 300)
+LOGIN_IP_LIMIT = (300, 60)
+
 AUTH_PASSWORD_VALIDATORS = [
     {
         'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator',
@@ -110,6 +278,10 @@ USE_TZ = True
 
 STATIC_URL = 'static/'
 
+# Fingerprinted bundles written by `manage.py build_assets` (see core/assets.py)
+# and served from /assets/ with far-future immutable caching.
+ASSETS_ROOT = BASE_DIR / 'assets'
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 
@@ -125,4 +297,9 @@ SESSION_COOKIE_SAMESITE = 'Lax'
 SESSION_COOKIE_SECURE = True
 SESSION_COOKIE_HTTPONLY = True
 
-SESSION_ENGINE = 'django.contrib.sessions.backends.db'
\ No newline at end of file
+# Database sessions that skip the per-request write unless the data changed
+# or the sliding expiry is more than SESSION_SAVE_SLACK seconds stale.
+# 'core.sessions.cached_db' serves reads from the cache with DB fallback.
+SESSION_ENGINE = 'core.sessions.db'
+
+SESSION_SAVE_SLACK = 60
\ No newline at end of file